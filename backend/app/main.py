@@ -1,24 +1,49 @@
 from fastapi import FastAPI, HTTPException, Request, Depends, Header, UploadFile, File, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional, List, Dict, Any
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional, List, Dict, Any, AsyncIterator
+from contextlib import asynccontextmanager
 import os
+import json
 from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
-from app.services.supabase_service import SupabaseService
+from app.services.supabase_service import SupabaseService, StockAdjustmentError, MedicineNotFoundError
 from app.services.ai_service import AIService
 from app.services.vector_db_service import VectorDBService
+from app.services.upload_spool import spool_upload, iter_text
+from app.services.body_stream import iter_body_lines, iter_csv_records
+from app.services.pagination import decode_cursor
+from app.services.chat_history_writer import ChatHistoryWriter
+from app.services.response_cache import SemanticResponseCache
+from app.services.summary_cache import SummaryCache
+from app.services.single_flight import SingleFlight
+from app.services.file_lock import KeyedFileLock
+from app.services.patient_dashboard import PatientDashboardService
+from app.services.token_verifier import TokenVerifier
+from app.services.cache import LRUCache
+from app.services.document_extraction import DocumentExtractionService, DocumentExtractionError, ExtractionTimeoutError
 import jwt
 import aiofiles
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Flush queued chat history and release pooled clients and worker processes on shutdown."""
+    yield
+    await chat_history_writer.stop()
+    await ai_service.close()
+    await supabase_service.close()
+    extraction_service.shutdown()
+
 app = FastAPI(
     title="Dermatology API",
     description="Dermatology patient management system with AI-powered medical document understanding and chatbot",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Update CORS settings to allow requests from your frontend
@@ -28,12 +53,74 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],  # Lets the browser read patient list cursors
 )
 
 # Initialize services
 supabase_service = SupabaseService()
 vector_db_service = VectorDBService()
-ai_service = AIService(vector_db_service, os.getenv("ANTHROPIC_API_KEY", ""))
+chat_history_writer = ChatHistoryWriter(
+    vector_db_service,
+    max_batch_size=int(os.getenv("CHAT_WRITE_BATCH_SIZE", "64")),
+    flush_interval_ms=float(os.getenv("CHAT_WRITE_FLUSH_MS", "250")),
+    max_queue_size=int(os.getenv("CHAT_WRITE_MAX_QUEUE", "10000")),
+    max_retries=int(os.getenv("CHAT_WRITE_MAX_RETRIES", "3")),
+    retry_backoff_ms=float(os.getenv("CHAT_WRITE_RETRY_BACKOFF_MS", "200")),
+    dead_letter_path=os.getenv("CHAT_WRITE_DEAD_LETTER_PATH", "./chat_history_dead_letter.ndjson")
+)
+response_cache = SemanticResponseCache(
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+) if os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true" else None
+summary_cache = SummaryCache(
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1024")),
+    load_persisted=supabase_service.get_plan_summary,
+    save_persisted=supabase_service.save_plan_summary
+)
+# Patient listing page sizes; NDJSON exports read the table in pages of the maximum size
+PATIENT_PAGE_SIZE = int(os.getenv("PATIENT_PAGE_SIZE", "100"))
+PATIENT_PAGE_SIZE_MAX = int(os.getenv("PATIENT_PAGE_SIZE_MAX", "500"))
+# Upper bound on IDs per batch-get, keeping the `in` filter within URL limits
+BATCH_GET_MAX_IDS = int(os.getenv("BATCH_GET_MAX_IDS", "200"))
+# Treatment info is generated at most once per item: per key within a worker, and under a lock file across workers
+treatment_info_flight = SingleFlight()
+treatment_info_lock = KeyedFileLock(
+    lock_dir=os.getenv("LOCK_DIR") or None,
+    timeout_seconds=float(os.getenv("TREATMENT_INFO_LOCK_TIMEOUT_SECONDS", "60"))
+)
+patient_dashboard = PatientDashboardService(
+    supabase_service,
+    vector_db_service,
+    ttl_seconds=float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "15")),
+    max_entries=int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "1024"))
+)
+# Signed-in users' tokens are verified once per token and their profiles cached briefly.
+# Startup fails here if neither a JWT secret nor a Supabase URL to fetch keys from is configured.
+SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
+token_verifier = TokenVerifier(
+    jwt_secret=os.getenv("SUPABASE_JWT_SECRET") or None,
+    jwks_url=os.getenv("SUPABASE_JWKS_URL") or (f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None),
+    max_entries=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+)
+profile_cache = LRUCache(
+    max_entries=int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "30"))
+)
+ai_service = AIService(
+    vector_db_service,
+    os.getenv("ANTHROPIC_API_KEY", ""),
+    history_writer=chat_history_writer,
+    response_cache=response_cache,
+    summary_cache=summary_cache
+)
+extraction_service = DocumentExtractionService(
+    max_workers=int(os.getenv("EXTRACTION_WORKERS", "2")),
+    timeout_seconds=float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "60")),
+    pages_per_task=int(os.getenv("EXTRACTION_PAGES_PER_TASK", "10")),
+    cache_dir=os.getenv("EXTRACTION_CACHE_DIR", "./extraction_cache"),
+    cache_max_bytes=int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+)
 
 # Request/Response Models
 class PatientCreate(BaseModel):
@@ -93,6 +180,16 @@ class MedicineUpdate(BaseModel):
 class StockUpdate(BaseModel):
     quantity: int
 
+class StockAdjustment(BaseModel):
+    medicine_id: str
+    quantity: int
+
+class StockBatchUpdate(BaseModel):
+    adjustments: List[StockAdjustment]
+
+class BatchGetRequest(BaseModel):
+    ids: List[str]
+
 class DoctorCreate(BaseModel):
     name: str
     email: Optional[str] = None
@@ -147,7 +244,9 @@ async def health_check():
                 "supabase": "running",
                 "vector_db": "running" if "error" not in vector_stats else "error"
             },
-            "vector_db_stats": vector_stats
+            "vector_db_stats": vector_stats,
+            "catalog_cache_stats": supabase_service.catalog_cache.get_stats(),
+            "dashboard_cache_stats": patient_dashboard.get_stats()
         }
     except Exception as e:
         return {
@@ -160,28 +259,29 @@ async def health_check():
         }
 
 # Patient Endpoints
-@app.get("/api/patients/profile")
-async def get_patient_profile(Authorization: Optional[str] = Header(None)):
+async def current_user_claims(Authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Verify the bearer token and return its claims."""
+    if not Authorization:
+        raise HTTPException(status_code=401, detail="Authorization header required")
     try:
-        if not Authorization:
-            raise HTTPException(status_code=401, detail="Authorization header required")
-        
-        print(f"Authorization header: {Authorization}")  # Debug log
-        token = Authorization.split(" ")[-1]
-        print(f"Extracted token: {token}")  # Debug log
-        decoded = jwt.decode(token, options={"verify_signature": False})
-        print(f"Decoded JWT: {decoded}")  # Debug log
-        user_id = decoded.get("sub")
-        print(f"Extracted user_id: {user_id}")  # Debug log
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token: no user id")
+        return await token_verifier.verify(Authorization.split(" ")[-1])
+    except jwt.PyJWKClientError as e:
+        # The identity provider's keys are unreachable; the token itself may be fine
+        raise HTTPException(status_code=503, detail=f"Token verification unavailable: {str(e)}")
+    except jwt.PyJWTError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+
+@app.get("/api/patients/profile")
+async def get_patient_profile(claims: Dict[str, Any] = Depends(current_user_claims)):
+    """Get the signed-in patient's profile, served from a short-lived cache."""
+    user_id = claims["sub"]
+    patient = profile_cache.get(user_id)
+    if patient is None:
         patient = await supabase_service.get_patient(user_id)
         if not patient:
             raise HTTPException(status_code=404, detail="Patient not found")
-        return patient
-    except Exception as e:
-        print(f"Exception in get_patient_profile: {e}")  # Debug log
-        raise HTTPException(status_code=401, detail=f"Could not get patient profile: {str(e)}")
+        profile_cache.set(user_id, patient)
+    return patient
 
 @app.get("/api/patients/{identifier}")
 async def get_patient(identifier: str):
@@ -192,13 +292,29 @@ async def get_patient(identifier: str):
     return patient
 
 @app.get("/api/patients")
-async def get_all_patients():
-    """Get all patients."""
+async def get_all_patients(limit: int = PATIENT_PAGE_SIZE, cursor: Optional[str] = None, format: str = "json"):
+    """List patients newest first, a page at a time, or stream them all as NDJSON with format=ndjson."""
+    if format == "ndjson":
+        # Check the cursor before the response starts, since a streamed body can no longer become a 400
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        async def stream_patients() -> AsyncIterator[str]:
+            async for patient in supabase_service.iter_patients(PATIENT_PAGE_SIZE_MAX, cursor):
+                yield json.dumps(patient, default=str) + "\n"
+        return StreamingResponse(stream_patients(), media_type="application/x-ndjson")
+    
     try:
-        patients = await supabase_service.get_all_patients()
-        return patients
+        patients, next_cursor = await supabase_service.get_patients_page(max(1, min(limit, PATIENT_PAGE_SIZE_MAX)), cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    # The body stays a plain array; the next page's cursor travels in a header
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return JSONResponse(content=patients, headers=headers)
 
 @app.post("/api/patients")
 async def create_patient(patient: PatientCreate):
@@ -208,12 +324,76 @@ async def create_patient(patient: PatientCreate):
         raise HTTPException(status_code=500, detail="Failed to create patient")
     return {"id": result["id"]}
 
+PATIENT_IMPORT_BATCH_SIZE = int(os.getenv("PATIENT_IMPORT_BATCH_SIZE", "500"))
+
+async def _import_patient_window(window: List[tuple], results: List[Dict[str, Any]]):
+    """Insert one window of validated patients, recording per-row results."""
+    try:
+        created = await supabase_service.import_patients([patient.dict() for _, patient in window])
+        for (index, _), patient in zip(window, created):
+            if patient:
+                results.append({"index": index, "status": "created", "patient_id": patient["id"]})
+            else:
+                results.append({"index": index, "status": "exists"})
+    except Exception as e:
+        results.extend({"index": index, "error": str(e)} for index, _ in window)
+
+@app.post("/api/patients/bulk")
+async def import_patients(request: Request):
+    """Import patients from a streamed CSV (with a header row) or NDJSON body; existing emails are skipped."""
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        rows = iter_csv_records(request.stream())
+    elif "ndjson" in content_type or "jsonlines" in content_type:
+        rows = iter_body_lines(request.stream())
+    else:
+        raise HTTPException(status_code=415, detail="Expected a text/csv or application/x-ndjson body")
+    
+    try:
+        results = []
+        window = []
+        index = 0
+        async for row in rows:
+            try:
+                if isinstance(row, bytes):
+                    row = json.loads(row)
+                # Blank CSV cells mean "not given"
+                row = {key: (value.strip() or None) if isinstance(value, str) else value for key, value in row.items()}
+                window.append((index, PatientCreate(**row)))
+            except (ValueError, TypeError, AttributeError, ValidationError) as e:
+                results.append({"index": index, "error": f"Invalid patient: {str(e)}"})
+            index += 1
+            
+            if len(window) >= PATIENT_IMPORT_BATCH_SIZE:
+                await _import_patient_window(window, results)
+                window = []
+        
+        if window:
+            await _import_patient_window(window, results)
+        
+        results.sort(key=lambda result: result["index"])
+        failed = sum(1 for result in results if "error" in result)
+        return {
+            "status": "success" if not failed else "partial",
+            "total": index,
+            "succeeded": index - failed,
+            "failed": failed,
+            "results": results
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing patients: {str(e)}")
+
 @app.put("/api/patients/{patient_id}")
 async def update_patient(patient_id: str, patient_data: dict):
     """Update a patient's data."""
     result = await supabase_service.update_patient(patient_id, patient_data)
     if not result:
         raise HTTPException(status_code=404, detail="Patient not found")
+    patient_dashboard.invalidate(patient_id)
+    profile_cache.pop(patient_id)
     return result
 
 @app.delete("/api/patients/{patient_id}")
@@ -222,6 +402,8 @@ async def delete_patient(patient_id: str):
     result = await supabase_service.delete_patient(patient_id)
     if not result:
         raise HTTPException(status_code=404, detail="Patient not found")
+    patient_dashboard.invalidate(patient_id)
+    profile_cache.pop(patient_id)
     return {"success": True}
 
 # Report Endpoints
@@ -229,6 +411,7 @@ async def delete_patient(patient_id: str):
 async def create_report(report: Report):
     """Create a new report."""
     result = await supabase_service.create_report(report.dict())
+    patient_dashboard.invalidate(report.patientId)
     return {"id": result}
 
 @app.get("/api/reports/{report_id}")
@@ -240,9 +423,26 @@ async def get_report(report_id: str):
     return report
 
 @app.get("/api/patients/{patient_id}/reports")
-async def get_patient_reports(patient_id: str):
-    """Get all reports for a specific patient."""
-    return await supabase_service.get_patient_reports(patient_id)
+async def get_patient_reports(patient_id: str, expand: Optional[str] = None):
+    """Get all reports for a specific patient; expand=items attaches the treatments and medicines they reference."""
+    reports = await supabase_service.get_patient_reports(patient_id)
+    if expand == "items":
+        try:
+            reports = await supabase_service.expand_report_items(reports)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    return reports
+
+@app.get("/api/patients/{patient_id}/dashboard")
+async def get_patient_dashboard(patient_id: str, fields: Optional[str] = None):
+    """Get a patient's profile, reports, treatment info and chat history in one call; fields=a,b limits the sections."""
+    try:
+        dashboard = await patient_dashboard.get_dashboard(patient_id, fields.split(",") if fields else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return dashboard
 
 # Treatment Endpoints
 @app.post("/api/treatments")
@@ -251,6 +451,18 @@ async def create_treatment(treatment: TreatmentCreate):
     result = await supabase_service.create_treatment(treatment.dict())
     return result
 
+@app.post("/api/treatments:batchGet")
+async def batch_get_treatments(request: BatchGetRequest):
+    """Get several treatments by ID in one call."""
+    if len(request.ids) > BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_GET_MAX_IDS} IDs per request")
+    try:
+        treatments = await supabase_service.get_treatments_by_ids(request.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    found = {treatment['id'] for treatment in treatments}
+    return {"treatments": treatments, "missing": [item_id for item_id in request.ids if item_id not in found]}
+
 @app.get("/api/treatments/{treatment_id}")
 async def get_treatment(treatment_id: str):
     """Get a treatment by ID."""
@@ -287,6 +499,18 @@ async def create_medicine(medicine: MedicineCreate):
     result = await supabase_service.create_medicine(medicine.dict())
     return result
 
+@app.post("/api/medicines:batchGet")
+async def batch_get_medicines(request: BatchGetRequest):
+    """Get several medicines by ID in one call."""
+    if len(request.ids) > BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_GET_MAX_IDS} IDs per request")
+    try:
+        medicines = await supabase_service.get_medicines_by_ids(request.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    found = {medicine['id'] for medicine in medicines}
+    return {"medicines": medicines, "missing": [item_id for item_id in request.ids if item_id not in found]}
+
 @app.get("/api/medicines/{medicine_id}")
 async def get_medicine(medicine_id: str):
     """Get a medicine by ID."""
@@ -300,6 +524,22 @@ async def get_all_medicines():
     """Get all active medicines."""
     return await supabase_service.get_all_medicines()
 
+# Registered before /api/medicines/{medicine_id} so "stock:batch" is not taken for a medicine ID
+@app.put("/api/medicines/stock:batch")
+async def update_medicine_stock_batch(batch: StockBatchUpdate):
+    """Apply many stock adjustments at once; either all of them apply or none do."""
+    if not batch.adjustments:
+        raise HTTPException(status_code=400, detail="No stock adjustments given")
+    try:
+        stock = await supabase_service.update_medicine_stock_batch([adjustment.dict() for adjustment in batch.adjustments])
+    except MedicineNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except StockAdjustmentError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "stock": stock}
+
 @app.put("/api/medicines/{medicine_id}")
 async def update_medicine(medicine_id: str, medicine: MedicineUpdate):
     """Update a medicine."""
@@ -319,10 +559,15 @@ async def delete_medicine(medicine_id: str):
 @app.put("/api/medicines/{medicine_id}/stock")
 async def update_medicine_stock(medicine_id: str, stock_update: StockUpdate):
     """Update medicine stock."""
-    success = await supabase_service.update_medicine_stock(medicine_id, stock_update.quantity)
-    if not success:
+    try:
+        stock = await supabase_service.update_medicine_stock(medicine_id, stock_update.quantity)
+    except MedicineNotFoundError:
         raise HTTPException(status_code=404, detail="Medicine not found")
-    return {"success": True}
+    except StockAdjustmentError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "stock": stock}
 
 @app.post("/api/hospitals/{hospital_id}/doctors")
 async def create_doctor(hospital_id: str, doctor: DoctorCreate):
@@ -336,6 +581,42 @@ async def get_all_doctors(hospital_id: str):
     return await supabase_service.get_all_doctors(hospital_id)
 
 # Treatment Info Endpoints
+async def _load_catalog_item(item_type: str, item_id: str) -> Dict[str, Any]:
+    """Load the treatment or medicine that treatment info describes."""
+    if item_type == 'treatment':
+        item = await supabase_service.get_treatment(item_id)
+        if not item:
+            raise HTTPException(status_code=404, detail="Treatment not found")
+    else:
+        item = await supabase_service.get_medicine(item_id)
+        if not item:
+            raise HTTPException(status_code=404, detail="Medicine not found")
+    return item
+
+async def _generate_and_store_treatment_info(item_type: str, item_id: str) -> Dict[str, Any]:
+    """Generate an explanation for an item and upsert it."""
+    item = await _load_catalog_item(item_type, item_id)
+    if item_type == 'treatment':
+        explanation = await ai_service.generate_treatment_explanation(item)
+    else:
+        explanation = await ai_service.generate_medicine_explanation(item)
+    
+    # Store the generated explanation
+    return await supabase_service.upsert_treatment_info({
+        'item_type': item_type,
+        'item_id': item_id,
+        'item_name': item['name'],
+        'explanation': explanation
+    })
+
+async def _generate_missing_treatment_info(item_type: str, item_id: str) -> Dict[str, Any]:
+    """Generate treatment info once across workers, unless another worker already has."""
+    async with treatment_info_lock.hold(f"treatment-info:{item_type}:{item_id}"):
+        existing_info = await supabase_service.get_treatment_info(item_type, item_id)
+        if existing_info:
+            return existing_info
+        return await _generate_and_store_treatment_info(item_type, item_id)
+
 @app.get("/api/treatment-info/{item_type}/{item_id}")
 async def get_treatment_info(item_type: str, item_id: str):
     """Get educational content for a treatment or medicine."""
@@ -350,42 +631,11 @@ async def get_treatment_info(item_type: str, item_id: str):
         if existing_info:
             return existing_info
         
-        # If no existing info, generate it
-        if item_type == 'treatment':
-            treatment = await supabase_service.get_treatment(item_id)
-            if not treatment:
-                raise HTTPException(status_code=404, detail="Treatment not found")
-            
-            explanation = await ai_service.generate_treatment_explanation(treatment)
-            
-            # Store the generated explanation
-            treatment_info_data = {
-                'item_type': item_type,
-                'item_id': item_id,
-                'item_name': treatment['name'],
-                'explanation': explanation
-            }
-            
-            result = await supabase_service.create_treatment_info(treatment_info_data)
-            return result
-            
-        elif item_type == 'medicine':
-            medicine = await supabase_service.get_medicine(item_id)
-            if not medicine:
-                raise HTTPException(status_code=404, detail="Medicine not found")
-            
-            explanation = await ai_service.generate_medicine_explanation(medicine)
-            
-            # Store the generated explanation
-            treatment_info_data = {
-                'item_type': item_type,
-                'item_id': item_id,
-                'item_name': medicine['name'],
-                'explanation': explanation
-            }
-            
-            result = await supabase_service.create_treatment_info(treatment_info_data)
-            return result
+        # If no existing info, generate it; concurrent misses for the same item share one generation
+        return await treatment_info_flight.do(
+            (item_type, item_id),
+            lambda: _generate_missing_treatment_info(item_type, item_id)
+        )
             
     except HTTPException:
         raise
@@ -400,55 +650,9 @@ async def generate_treatment_info(request: TreatmentInfoRequest):
         if request.item_type not in ['treatment', 'medicine']:
             raise HTTPException(status_code=400, detail="Invalid item_type. Must be 'treatment' or 'medicine'")
         
-        if request.item_type == 'treatment':
-            treatment = await supabase_service.get_treatment(request.item_id)
-            if not treatment:
-                raise HTTPException(status_code=404, detail="Treatment not found")
-            
-            explanation = await ai_service.generate_treatment_explanation(treatment)
-            
-            # Check if info already exists
-            existing_info = await supabase_service.get_treatment_info(request.item_type, request.item_id)
-            
-            if existing_info:
-                # Update existing info
-                result = await supabase_service.update_treatment_info(request.item_type, request.item_id, explanation)
-            else:
-                # Create new info
-                treatment_info_data = {
-                    'item_type': request.item_type,
-                    'item_id': request.item_id,
-                    'item_name': treatment['name'],
-                    'explanation': explanation
-                }
-                result = await supabase_service.create_treatment_info(treatment_info_data)
-            
-            return result
-            
-        elif request.item_type == 'medicine':
-            medicine = await supabase_service.get_medicine(request.item_id)
-            if not medicine:
-                raise HTTPException(status_code=404, detail="Medicine not found")
-            
-            explanation = await ai_service.generate_medicine_explanation(medicine)
-            
-            # Check if info already exists
-            existing_info = await supabase_service.get_treatment_info(request.item_type, request.item_id)
-            
-            if existing_info:
-                # Update existing info
-                result = await supabase_service.update_treatment_info(request.item_type, request.item_id, explanation)
-            else:
-                # Create new info
-                treatment_info_data = {
-                    'item_type': request.item_type,
-                    'item_id': request.item_id,
-                    'item_name': medicine['name'],
-                    'explanation': explanation
-                }
-                result = await supabase_service.create_treatment_info(treatment_info_data)
-            
-            return result
+        # Regenerate and replace any existing info in one upsert
+        async with treatment_info_lock.hold(f"treatment-info:{request.item_type}:{request.item_id}"):
+            return await _generate_and_store_treatment_info(request.item_type, request.item_id)
             
     except HTTPException:
         raise
@@ -460,17 +664,10 @@ async def generate_treatment_info(request: TreatmentInfoRequest):
 async def add_medical_document(request: MedicalDocumentRequest):
     """Add a medical document to the vector database."""
     try:
-        # Prepare metadata
-        metadata = request.metadata or {}
-        if request.patient_id:
-            metadata['patient_id'] = request.patient_id
-        if request.doctor_id:
-            metadata['doctor_id'] = request.doctor_id
-        
         # Add document to vector database
         doc_id = await ai_service.add_medical_document(
             content=request.content,
-            metadata=metadata
+            metadata=_document_metadata(request)
         )
         
         return {
@@ -482,13 +679,101 @@ async def add_medical_document(request: MedicalDocumentRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding document: {str(e)}")
 
+# Documents are validated, embedded and written in windows of this size during bulk ingestion
+BULK_INGEST_WINDOW = int(os.getenv("BULK_INGEST_WINDOW", "256"))
+
+def _document_metadata(request: MedicalDocumentRequest) -> Dict[str, Any]:
+    """Build vector DB metadata for a document request."""
+    metadata = request.metadata or {}
+    if request.patient_id:
+        metadata['patient_id'] = request.patient_id
+    if request.doctor_id:
+        metadata['doctor_id'] = request.doctor_id
+    return metadata
+
+async def _iter_bulk_documents(request: Request) -> AsyncIterator[Any]:
+    """Yield raw bulk items from a JSON array body or, incrementally, from an NDJSON stream."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        async for line in iter_body_lines(request.stream()):
+            yield line
+        return
+
+    try:
+        body = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+    if isinstance(body, dict):
+        body = body.get("documents")
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of documents or an NDJSON stream")
+    for item in body:
+        yield item
+
+async def _ingest_window(window: List[tuple], results: List[Dict[str, Any]]):
+    """Embed and store one window of validated documents, recording per-item results."""
+    try:
+        doc_ids = await ai_service.vector_db.add_documents([
+            {
+                "content": doc.content,
+                "metadata": _document_metadata(doc),
+                "document_type": doc.document_type
+            }
+            for _, doc in window
+        ])
+        results.extend({"index": index, "document_id": doc_id} for (index, _), doc_id in zip(window, doc_ids))
+    except Exception as e:
+        results.extend({"index": index, "error": str(e)} for index, _ in window)
+
+@app.post("/api/documents/bulk")
+async def add_medical_documents_bulk(request: Request):
+    """Add many medical documents from a JSON array or NDJSON stream."""
+    try:
+        results = []
+        window = []
+        index = 0
+        async for item in _iter_bulk_documents(request):
+            try:
+                if isinstance(item, (bytes, str)):
+                    item = json.loads(item)
+                window.append((index, MedicalDocumentRequest(**item)))
+            except (ValueError, TypeError, ValidationError) as e:
+                results.append({"index": index, "error": f"Invalid document: {str(e)}"})
+            index += 1
+            
+            if len(window) >= BULK_INGEST_WINDOW:
+                await _ingest_window(window, results)
+                window = []
+        
+        if window:
+            await _ingest_window(window, results)
+        
+        results.sort(key=lambda result: result["index"])
+        failed = sum(1 for result in results if "error" in result)
+        return {
+            "status": "success" if not failed else "partial",
+            "total": index,
+            "succeeded": index - failed,
+            "failed": failed,
+            "results": results
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error adding documents: {str(e)}")
+
 @app.get("/api/documents/search")
-async def search_medical_documents(query: str, n_results: int = 5):
-    """Search for medical documents based on query."""
+async def search_medical_documents(query: str, n_results: int = 5, collapse: bool = False):
+    """Search for medical documents based on query.
+    
+    Returns the best matching chunks, or whole parent documents with `collapse=true`.
+    """
     try:
         results = await ai_service.vector_db.search_documents(
             query=query,
-            n_results=n_results
+            n_results=n_results,
+            collapse=collapse
         )
         
         return {
@@ -535,27 +820,35 @@ async def delete_medical_document(document_id: str):
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
 
 # Chatbot Endpoints
+async def _get_patient_context(patient_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Load the patient details passed to the assistant as context."""
+    if not patient_id:
+        return None
+    patient = await supabase_service.get_patient(patient_id)
+    if not patient:
+        return None
+    return {
+        "name": patient.get("name"),
+        "condition": patient.get("condition"),
+        "medications": []  # Could be populated from patient's current medications
+    }
+
+def _patient_loader(patient_id: Optional[str]):
+    """Return a loader for the patient context, or None when no patient is given."""
+    if not patient_id:
+        return None
+    return lambda: _get_patient_context(patient_id)
+
 @app.post("/api/chat")
 async def chat_with_medical_assistant(request: ChatRequest):
     """Chat with the medical assistant using context from vector database."""
     try:
-        # Get patient context if patient_id is provided
-        patient_context = None
-        if request.patient_id:
-            patient = await supabase_service.get_patient(request.patient_id)
-            if patient:
-                patient_context = {
-                    "name": patient.get("name"),
-                    "condition": patient.get("condition"),
-                    "medications": []  # Could be populated from patient's current medications
-                }
-        
-        # Get chat response with medical context
+        # Get chat response with medical context; patient details are fetched alongside retrieval
         response = await ai_service.chat_with_medical_context(
             user_message=request.message,
             user_id=request.user_id,
             session_id=request.session_id,
-            patient_context=patient_context
+            patient_loader=_patient_loader(request.patient_id)
         )
         
         return response
@@ -563,6 +856,36 @@ async def chat_with_medical_assistant(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def stream_chat_with_medical_assistant(request: ChatRequest):
+    """Chat with the medical assistant, streaming the reply as server-sent events."""
+    completed: Dict[str, Any] = {}
+    
+    async def event_stream():
+        async for event in ai_service.stream_chat_with_medical_context(
+            user_message=request.message,
+            user_id=request.user_id,
+            session_id=request.session_id,
+            patient_loader=_patient_loader(request.patient_id)
+        ):
+            if event["event"] == "done":
+                completed["response"] = event["data"]["response"]
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    async def persist_exchange():
+        # Runs after the stream has closed, and only if the reply finished
+        if "response" in completed:
+            await ai_service.save_chat_message(
+                request.user_id, request.message, completed["response"], request.session_id
+            )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist_exchange)
+    )
+
 @app.get("/api/chat/history/{user_id}")
 async def get_chat_history(user_id: str, session_id: Optional[str] = None, limit: int = 10):
     """Get chat history for a user."""
@@ -583,6 +906,25 @@ async def get_chat_history(user_id: str, session_id: Optional[str] = None, limit
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting chat history: {str(e)}")
 
+@app.get("/api/chat/cache/audit")
+async def get_response_cache_audit():
+    """List recent semantic cache hits with their similarity, for spotting false hits."""
+    if not response_cache:
+        raise HTTPException(status_code=404, detail="Response cache is disabled")
+    return {
+        "stats": response_cache.get_stats(),
+        "recent_hits": response_cache.get_audit()
+    }
+
+@app.post("/api/chat/cache/{entry_id}/false-hit")
+async def report_response_cache_false_hit(entry_id: str):
+    """Report that a cached reply did not answer the question; the entry is evicted."""
+    if not response_cache:
+        raise HTTPException(status_code=404, detail="Response cache is disabled")
+    if not response_cache.report_false_hit(entry_id):
+        raise HTTPException(status_code=404, detail="Cache entry not found")
+    return {"status": "success", "message": "Cache entry evicted"}
+
 @app.get("/api/vector-db/stats")
 async def get_vector_database_stats():
     """Get statistics about the vector database."""
@@ -612,34 +954,51 @@ async def upload_medical_document(
                 detail=f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}"
             )
         
-        # Read file content
-        content = await file.read()
-        
-        # For now, handle text files only (PDF processing would require additional libraries)
-        if file_extension == '.txt':
-            document_content = content.decode('utf-8')
-        else:
-            # For other file types, return a placeholder message
-            document_content = f"Document content from {file.filename} - processing not yet implemented for {file_extension} files."
-        
-        # Prepare metadata
-        metadata = {
-            "filename": file.filename,
-            "file_size": len(content),
-            "file_type": file_extension,
-            "uploaded_at": datetime.now().isoformat()
-        }
-        
-        if patient_id:
-            metadata['patient_id'] = patient_id
-        if doctor_id:
-            metadata['doctor_id'] = doctor_id
+        # Spool the upload to disk in fixed-size blocks rather than holding it in memory
+        upload = await spool_upload(file)
         
-        # Add to vector database
-        doc_id = await ai_service.add_medical_document(
-            content=document_content,
-            metadata=metadata
-        )
+        try:
+            # Prepare metadata
+            metadata = {
+                "filename": file.filename,
+                "file_size": upload.size,
+                "file_type": file_extension,
+                "uploaded_at": datetime.now().isoformat()
+            }
+            
+            if patient_id:
+                metadata['patient_id'] = patient_id
+            if doctor_id:
+                metadata['doctor_id'] = doctor_id
+            
+            if file_extension == '.txt':
+                # Decode, chunk, embed and store the text as it is read back from the spool
+                doc_id = await ai_service.vector_db.add_document_stream(
+                    iter_text(upload.path),
+                    metadata=metadata,
+                    document_type=document_type
+                )
+            elif extraction_service.supports(file_extension):
+                # Parse in the extraction process pool, streaming text (page by page for PDFs) into the store
+                doc_id = await ai_service.vector_db.add_document_stream(
+                    extraction_service.extract(upload.path, file_extension, upload.sha256),
+                    metadata=metadata,
+                    document_type=document_type
+                )
+            else:
+                # Legacy .doc files have no offline parser, so store a placeholder message
+                doc_id = await ai_service.add_medical_document(
+                    content=f"Document content from {file.filename} - processing not yet implemented for {file_extension} files.",
+                    metadata=metadata
+                )
+        except UnicodeDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"File is not valid UTF-8 text: {str(e)}")
+        except ExtractionTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except DocumentExtractionError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        finally:
+            await upload.remove()
         
         return {
             "document_id": doc_id,
@@ -678,13 +1037,9 @@ async def schedule_reminder(data: Dict[str, Any] = Body(...)):
     """Schedule a reminder for a patient (store in Supabase)."""
     # Example: {patient_id, reminder_time, message}
     try:
-        reminder = {
-            **data,
-            "created_at": datetime.now().isoformat()
-        }
         # Store in Supabase (assume a 'reminders' table exists)
-        result = supabase_service.supabase.table('reminders').insert(reminder).execute()
-        return {"success": True, "reminder_id": result.data[0]["id"]}
+        reminder = await supabase_service.create_reminder(data)
+        return {"success": True, "reminder_id": reminder["id"]}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -1,23 +1,78 @@
 import os
+import asyncio
 import logging
-from typing import Dict, Any, Optional, List
+import time
+from typing import Dict, Any, Optional, List, AsyncIterator, Tuple, Callable, Awaitable
 from datetime import datetime
-import httpx
-import anthropic
+from app.services.response_cache import SHARED_SCOPE
+from app.services.context_assembler import ContextAssembler
+from app.services.cache import LRUCache
+from app.services.llm_backends import USAGE_FIELDS, create_llm_backend
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Marks the end of a prompt prefix the provider may cache and reuse across requests
+CACHE_CONTROL = {"type": "ephemeral"}
+
+CHAT_SYSTEM_PROMPT = """You are a helpful medical assistant for a dermatology clinic. You can help answer questions about skin conditions, treatments, and general dermatological information. Always be professional, accurate, and encourage patients to consult with their healthcare provider for specific medical advice."""
+
+SUMMARY_SYSTEM_PROMPT = """You are a medical assistant helping to create clear, patient-friendly summaries of dermatology treatment plans. Your summaries should be:
+1. Easy to understand for patients
+2. Professional and accurate
+3. Include all important information
+4. Encourage follow-up with healthcare providers
+5. Written in a caring, supportive tone"""
+
 class AIService:
-    def __init__(self, vector_db_service, anthropic_api_key: str):
+    def __init__(self, vector_db_service, anthropic_api_key: str, history_writer=None, response_cache=None, summary_cache=None,
+                 llm_backend=None):
         self.vector_db = vector_db_service
         self.anthropic_api_key = anthropic_api_key
-        if anthropic_api_key:
-            self.client = anthropic.Anthropic(api_key=anthropic_api_key)
-        else:
-            self.client = None
-        logging.info("AIService initialized with real vector DB and Anthropic integration (Claude API key set: %s)" % bool(anthropic_api_key))
+        # Optional write-behind queue; without it chat turns are persisted inline
+        self.history_writer = history_writer
+        # Optional semantic cache of chat replies; without it every turn calls Claude
+        self.response_cache = response_cache
+        # Optional memo of treatment-plan summaries keyed by the plan's canonical hash
+        self.summary_cache = summary_cache
+        
+        # Per-call timeouts (seconds) for the two kinds of Claude requests
+        self.chat_timeout = float(os.getenv("ANTHROPIC_CHAT_TIMEOUT_SECONDS", "60"))
+        self.summary_timeout = float(os.getenv("ANTHROPIC_SUMMARY_TIMEOUT_SECONDS", "30"))
+        
+        # Token budgets for the documents and history placed in each chat prompt
+        self.context_assembler = ContextAssembler(
+            document_tokens=int(os.getenv("PROMPT_DOCUMENT_TOKENS", "1500")),
+            history_tokens=int(os.getenv("PROMPT_HISTORY_TOKENS", "500")),
+            history_turns=int(os.getenv("PROMPT_HISTORY_TURNS", "5")),
+            duplicate_threshold=float(os.getenv("PROMPT_DUPLICATE_THRESHOLD", "0.8"))
+        )
+        
+        # Passages pinned per chat session, repeated unchanged each turn so the provider can cache them
+        self.pinned_documents = LRUCache(
+            max_entries=int(os.getenv("PINNED_SESSIONS_MAX", "1000")),
+            ttl_seconds=float(os.getenv("PINNED_SESSION_TTL_SECONDS", "3600"))
+        )
+        # Token usage totals across Claude calls, including prompt cache reads and writes
+        self.llm_usage = {"requests": 0, **{field: 0 for field in USAGE_FIELDS}}
+        
+        # Per-source timeouts (seconds) for the chat context fan-out
+        self.source_timeouts = {
+            "documents": float(os.getenv("CHAT_DOCUMENTS_TIMEOUT_SECONDS", "3")),
+            "history": float(os.getenv("CHAT_HISTORY_TIMEOUT_SECONDS", "2")),
+            "patient": float(os.getenv("CHAT_PATIENT_TIMEOUT_SECONDS", "2"))
+        }
+        
+        # Model backend selected by LLM_BACKEND; None when Claude is not configured
+        self.llm = llm_backend or create_llm_backend(anthropic_api_key, self.chat_timeout)
+        logging.info("AIService initialized with real vector DB and Anthropic integration (Claude API key set: %s, LLM backend: %s)"
+                     % (bool(anthropic_api_key), self.llm.name if self.llm else "none"))
+
+    async def close(self):
+        """Close the model backend's pooled connections."""
+        if self.llm:
+            await self.llm.close()
 
     async def generate_treatment_explanation(self, treatment_data: Dict[str, Any]) -> str:
         """Generate educational content for a treatment."""
@@ -81,22 +136,211 @@ class AIService:
             logger.error(f"Error adding medical document: {str(e)}")
             raise e
 
+    async def save_chat_message(self, user_id: str, message: str, response: str, session_id: Optional[str] = None) -> str:
+        """Persist a chat exchange, through the write-behind queue when one is configured."""
+        if self.history_writer:
+            return await self.history_writer.enqueue(user_id, message, response, session_id)
+        return await self.vector_db.add_chat_message(user_id, message, response, session_id)
+
+    async def _timed_source(self, name: str, source: Awaitable[Any], default: Any) -> Tuple[Any, float, Optional[str]]:
+        """Await one context source under its timeout; failures yield the default instead of raising."""
+        started = time.perf_counter()
+        try:
+            value = await asyncio.wait_for(source, self.source_timeouts[name])
+            error = None
+        except asyncio.TimeoutError:
+            value, error = default, "timeout"
+        except Exception as e:
+            value, error = default, str(e)
+        if error:
+            logger.warning(f"Chat context source '{name}' degraded: {error}")
+        return value, round((time.perf_counter() - started) * 1000, 2), error
+
+    async def _gather_context(self,
+                              user_message: str,
+                              user_id: str,
+                              session_id: Optional[str],
+                              patient_context: Optional[Dict[str, Any]],
+                              patient_loader: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]]) -> Dict[str, Any]:
+        """Fetch documents, history and patient details concurrently.
+        
+        The documents and history are also fitted to the prompt token budget
+        as `prompt_context`. A slow or failing source is replaced by an empty default and reported in
+        `degraded_sources`, so it weakens the context instead of failing the reply.
+        """
+        sources = {
+            "documents": (self.vector_db.search_documents(user_message), []),
+            "history": (self.vector_db.get_chat_history(user_id, session_id), [])
+        }
+        if patient_loader and patient_context is None:
+            sources["patient"] = (patient_loader(), None)
+        
+        results = await asyncio.gather(*[
+            self._timed_source(name, source, default) for name, (source, default) in sources.items()
+        ])
+        context = dict(zip(sources, (value for value, _, _ in results)))
+        return {
+            "documents": context["documents"],
+            "history": context["history"],
+            "prompt_context": self._pin_documents(
+                user_id, session_id, self.context_assembler.assemble(context["documents"], context["history"])
+            ),
+            "patient_context": context.get("patient", patient_context),
+            "timings": {f"{name}_ms": elapsed for name, (_, elapsed, _) in zip(sources, results)},
+            "degraded_sources": [
+                {"source": name, "error": error} for name, (_, _, error) in zip(sources, results) if error
+            ]
+        }
+
+    def _pin_documents(self, user_id: str, session_id: Optional[str], prompt_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Split the prompt's passages into the session's pinned passages and ones new to this turn.
+        
+        The first turn of a session pins its passages; later turns repeat them
+        verbatim right after the system prompt, so that prefix is a provider
+        cache hit, and only passages not already pinned vary per turn. Pinned
+        passages count against the document budget, and new ones fill what is left.
+        """
+        pinned = []
+        if session_id:
+            key = (user_id, session_id)
+            pinned = self.pinned_documents.get(key) or []
+            if not pinned and prompt_context["documents"]:
+                pinned = prompt_context["documents"]
+                self.pinned_documents.set(key, pinned)
+        
+        assembler = self.context_assembler
+        pinned_tokens = sum(assembler.count_tokens(passage) for passage in pinned)
+        remaining = assembler.document_tokens - pinned_tokens
+        fresh = []
+        over_budget = 0
+        # Passages arrive most relevant first, so the least relevant are the ones cut
+        for passage in prompt_context["documents"]:
+            if passage in pinned:
+                continue
+            tokens = assembler.count_tokens(passage)
+            if tokens > remaining:
+                passage = assembler.truncate(passage, remaining) if remaining >= assembler.min_passage_tokens else ""
+                if not passage:
+                    over_budget += 1
+                    continue
+                tokens = assembler.count_tokens(passage)
+            fresh.append(passage)
+            remaining -= tokens
+        
+        document_tokens = pinned_tokens + sum(assembler.count_tokens(passage) for passage in fresh)
+        history_tokens = prompt_context["tokens"]["history"]
+        return {
+            **prompt_context,
+            "pinned_documents": pinned,
+            "documents": fresh,
+            "dropped_over_budget": prompt_context.get("dropped_over_budget", 0) + over_budget,
+            "tokens": {
+                "documents": document_tokens,
+                "pinned_documents": pinned_tokens,
+                "history": history_tokens,
+                "total": document_tokens + history_tokens
+            }
+        }
+
+    def _record_usage(self, usage: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+        """Add a reply's token usage, including prompt cache reads and writes, to the totals."""
+        if usage is None:
+            return None
+        recorded = {field: usage.get(field) or 0 for field in USAGE_FIELDS}
+        self.llm_usage["requests"] += 1
+        for field, value in recorded.items():
+            self.llm_usage[field] += value
+        return recorded
+
+    def _response_cache_scope(self, user_id: str, session_id: Optional[str], context: Dict[str, Any]) -> str:
+        """Pick the cache scope for a turn.
+        
+        General questions share one scope. Replies grounded in retrieved
+        documents that belong to a patient are kept per user, and replies that
+        follow earlier turns per conversation.
+        """
+        patient_documents = any((document.get('metadata') or {}).get('patient_id') for document in context["documents"])
+        if not patient_documents and not context["history"]:
+            return SHARED_SCOPE
+        scope = f"user:{user_id}"
+        if context["history"]:
+            scope += f":session:{session_id}"
+        return scope
+
+    async def _lookup_cached_reply(self,
+                                   user_message: str,
+                                   user_id: str,
+                                   session_id: Optional[str],
+                                   context: Dict[str, Any],
+                                   documents_version: int) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]], str]:
+        """Return a cached reply for the turn (or None) with the query embedding and scope used."""
+        scope = self._response_cache_scope(user_id, session_id, context)
+        if not self.response_cache or not self.llm:
+            return None, None, scope
+        # Retrieval has just embedded the same text, so this comes from the embedding cache
+        embedding = await self.vector_db.embed_text(user_message)
+        return self.response_cache.lookup(user_message, embedding, scope, documents_version), embedding, scope
+
+    def _store_reply(self,
+                     user_message: str,
+                     embedding: Optional[List[float]],
+                     scope: str,
+                     documents_version: int,
+                     context: Dict[str, Any],
+                     response: str,
+                     llm_ms: float):
+        """Cache a fresh reply, unless part of its context was missing."""
+        if embedding is None or context["degraded_sources"]:
+            return
+        self.response_cache.store(user_message, embedding, scope, documents_version, response, context["documents"], llm_ms)
+
     async def chat_with_medical_context(self, 
                                        user_message: str, 
                                        user_id: str, 
                                        session_id: Optional[str] = None,
-                                       patient_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                                       patient_context: Optional[Dict[str, Any]] = None,
+                                       patient_loader: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None) -> Dict[str, Any]:
         """Chat with medical context using vector database retrieval."""
         try:
-            # 1. Retrieve relevant docs from vector DB
-            docs = await self.vector_db.search_documents(user_message)
-            # 2. Retrieve chat history
-            history = await self.vector_db.get_chat_history(user_id, session_id)
-            # 3. Call Anthropic Claude API with context (stubbed for now)
-            response = await self._call_anthropic(user_message, docs, history)
-            # 4. Store chat in vector DB
-            await self.vector_db.add_chat_message(user_id, user_message, response, session_id)
-            return {"response": response, "relevant_documents": docs, "session_id": session_id, "timestamp": datetime.now().isoformat()}
+            started = time.perf_counter()
+            documents_version = self.vector_db.documents_version
+            # 1. Retrieve relevant docs, chat history and patient details concurrently
+            context = await self._gather_context(user_message, user_id, session_id, patient_context, patient_loader)
+            timings = context["timings"]
+            timings["context_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            # 2. Serve a cached reply to an equivalent question, or call Anthropic Claude API with context
+            llm_started = time.perf_counter()
+            cached, embedding, scope = await self._lookup_cached_reply(user_message, user_id, session_id, context, documents_version)
+            usage = None
+            if cached:
+                response = cached["response"]
+                cache = {"hit": True, "entry_id": cached["entry_id"], "similarity": round(cached["similarity"], 4)}
+            else:
+                try:
+                    response, usage = await self._create_chat_reply(user_message, context["prompt_context"])
+                    llm_ms = round((time.perf_counter() - llm_started) * 1000, 2)
+                    self._store_reply(user_message, embedding, scope, documents_version, context, response, llm_ms)
+                except Exception as e:
+                    logger.error(f"Error calling Anthropic API: {str(e)}")
+                    response = f"I'm sorry, I'm having trouble processing your request right now. Error: {str(e)}"
+                cache = {"hit": False}
+            timings["llm_ms"] = round((time.perf_counter() - llm_started) * 1000, 2)
+            # 3. Store chat in vector DB
+            persist_started = time.perf_counter()
+            await self.save_chat_message(user_id, user_message, response, session_id)
+            timings["persist_ms"] = round((time.perf_counter() - persist_started) * 1000, 2)
+            timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return {
+                "response": response,
+                "relevant_documents": context["documents"],
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat(),
+                "timings": timings,
+                "degraded_sources": context["degraded_sources"],
+                "context_tokens": context["prompt_context"]["tokens"],
+                "cache": cache,
+                "usage": usage
+            }
             
         except Exception as e:
             logger.error(f"Error in chat_with_medical_context: {str(e)}")
@@ -105,45 +349,139 @@ class AIService:
                 "error": str(e)
             }
 
-    async def _call_anthropic(self, user_message, docs, history):
-        """Call Anthropic Claude API with context and history."""
-        if not self.client:
-            return "Claude API is not configured. Please set your ANTHROPIC_API_KEY environment variable."
+    def _build_chat_prompt(self, user_message, prompt_context) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Build the system and user content blocks for a chat turn from the budgeted context.
         
+        The stable prefix comes first and is marked cacheable: the system prompt,
+        then the session's pinned passages. Everything that changes per turn
+        follows in a final block.
+        """
+        # Build context from relevant documents not already pinned for the session, most relevant first
+        context = ""
+        if prompt_context["documents"]:
+            context = "Relevant medical information:\n" + "\n\n".join(prompt_context["documents"])
+        
+        # Build conversation history, oldest turn first
+        conversation = ""
+        if prompt_context["history"]:
+            conversation = "Previous conversation:\n" + "\n".join([
+                f"User: {turn['message']}\nAssistant: {turn['response']}"
+                for turn in prompt_context["history"]
+            ])
+        
+        # Create the prompt
+        system = [{"type": "text", "text": CHAT_SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
+        
+        content = []
+        if prompt_context.get("pinned_documents"):
+            content.append({
+                "type": "text",
+                "text": "Relevant medical information:\n" + "\n\n".join(prompt_context["pinned_documents"]),
+                "cache_control": CACHE_CONTROL
+            })
+        content.append({
+            "type": "text",
+            "text": f"{context}\n\n{conversation}\n\nUser: {user_message}\n\nAssistant:"
+        })
+        return system, content
+
+    async def _create_chat_reply(self, user_message, prompt_context) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Request a chat reply from Claude and return it with its token usage; errors propagate to the caller."""
+        if not self.llm:
+            return "Claude API is not configured. Please set your ANTHROPIC_API_KEY environment variable.", None
+        
+        system, content = self._build_chat_prompt(user_message, prompt_context)
+        
+        # Call Claude API
+        response, usage = await self.llm.create(
+            system=system,
+            messages=[
+                {"role": "user", "content": content}
+            ],
+            max_tokens=1000,
+            timeout=self.chat_timeout
+        )
+        
+        return response, self._record_usage(usage)
+
+    async def _stream_anthropic(self, user_message, prompt_context,
+                                usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        """Stream Claude's reply as text deltas, filling `usage` once the reply is complete."""
+        if not self.llm:
+            yield "Claude API is not configured. Please set your ANTHROPIC_API_KEY environment variable."
+            return
+        
+        system, content = self._build_chat_prompt(user_message, prompt_context)
+        reply_usage = {}
+        async for text in self.llm.stream(
+            system=system,
+            messages=[
+                {"role": "user", "content": content}
+            ],
+            max_tokens=1000,
+            timeout=self.chat_timeout,
+            usage=reply_usage
+        ):
+            yield text
+        recorded = self._record_usage(reply_usage) if reply_usage else None
+        if usage is not None and recorded:
+            usage.update(recorded)
+
+    async def stream_chat_with_medical_context(self,
+                                               user_message: str,
+                                               user_id: str,
+                                               session_id: Optional[str] = None,
+                                               patient_context: Optional[Dict[str, Any]] = None,
+                                               patient_loader: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Chat with medical context, yielding events as the reply is generated.
+        
+        Yields a `documents` event as soon as retrieval finishes, a `token` event
+        per text delta, then `done` with the full response (or `error`). The
+        caller persists the finished exchange once the stream has closed.
+        """
         try:
-            # Build context from relevant documents
-            context = ""
-            if docs:
-                context = "Relevant medical information:\n" + "\n".join([doc.get('content', '') for doc in docs])
-            
-            # Build conversation history
-            conversation = ""
-            if history:
-                conversation = "Previous conversation:\n" + "\n".join([
-                    f"User: {msg.get('user_message', '')}\nAssistant: {msg.get('assistant_response', '')}"
-                    for msg in history[-5:]  # Last 5 messages for context
-                ])
-            
-            # Create the prompt
-            system_prompt = """You are a helpful medical assistant for a dermatology clinic. You can help answer questions about skin conditions, treatments, and general dermatological information. Always be professional, accurate, and encourage patients to consult with their healthcare provider for specific medical advice."""
-            
-            user_prompt = f"{context}\n\n{conversation}\n\nUser: {user_message}\n\nAssistant:"
+            documents_version = self.vector_db.documents_version
+            context = await self._gather_context(user_message, user_id, session_id, patient_context, patient_loader)
+            yield {"event": "documents", "data": {
+                "relevant_documents": context["documents"],
+                "session_id": session_id,
+                "timings": context["timings"],
+                "degraded_sources": context["degraded_sources"],
+                "context_tokens": context["prompt_context"]["tokens"]
+            }}
             
-            # Call Claude API
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",  # or "claude-3-haiku-20240307" for faster/cheaper
-                max_tokens=1000,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
+            llm_started = time.perf_counter()
+            cached, embedding, scope = await self._lookup_cached_reply(user_message, user_id, session_id, context, documents_version)
+            usage = {}
+            if cached:
+                # A cached reply is sent whole as a single token event
+                response = cached["response"]
+                yield {"event": "token", "data": {"text": response}}
+                cache = {"hit": True, "entry_id": cached["entry_id"], "similarity": round(cached["similarity"], 4)}
+            else:
+                parts = []
+                async for text in self._stream_anthropic(user_message, context["prompt_context"], usage=usage):
+                    parts.append(text)
+                    yield {"event": "token", "data": {"text": text}}
+                response = "".join(parts)
+                self._store_reply(user_message, embedding, scope, documents_version, context, response,
+                                  round((time.perf_counter() - llm_started) * 1000, 2))
+                cache = {"hit": False}
             
-            return response.content[0].text
+            yield {"event": "done", "data": {
+                "response": response,
+                "session_id": session_id,
+                "timestamp": datetime.now().isoformat(),
+                "cache": cache,
+                "usage": usage or None
+            }}
             
         except Exception as e:
-            logger.error(f"Error calling Anthropic API: {str(e)}")
-            return f"I'm sorry, I'm having trouble processing your request right now. Error: {str(e)}"
+            logger.error(f"Error in stream_chat_with_medical_context: {str(e)}")
+            yield {"event": "error", "data": {
+                "response": "I'm sorry, I'm having trouble processing your request right now. Please try again later or contact your healthcare provider for immediate assistance.",
+                "error": str(e)
+            }}
 
     async def analyze_medical_document(self, document_content: str, document_type: str = "report") -> Dict[str, Any]:
         """Analyze a medical document and extract key information."""
@@ -177,41 +515,38 @@ class AIService:
     async def get_vector_db_stats(self) -> Dict[str, Any]:
         """Get vector database statistics."""
         try:
-            return await self.vector_db.get_collection_stats()
+            stats = await self.vector_db.get_collection_stats()
+            if self.history_writer:
+                stats["chat_history_writer"] = self.history_writer.get_stats()
+            if self.response_cache:
+                stats["response_cache"] = self.response_cache.get_stats()
+            if self.summary_cache:
+                stats["summary_cache"] = self.summary_cache.get_stats()
+            stats["llm_usage"] = {"backend": self.llm.name if self.llm else None, **self.llm_usage}
+            return stats
         except Exception as e:
             logger.error(f"Error getting vector DB stats: {str(e)}")
             return {"error": str(e)} 
 
-    async def summarize_treatment_plan(self, plan: Dict[str, Any]) -> str:
-        """Generate a summary for a treatment plan using Claude API."""
-        if not self.client:
-            return "Claude API is not configured. Please set your ANTHROPIC_API_KEY environment variable."
-        
-        try:
-            # Extract treatment plan data
-            diagnosis = plan.get('diagnosis', 'No diagnosis provided')
-            treatments = plan.get('selectedTreatments', [])
-            medicines = plan.get('selectedMedicines', [])
-            next_appointment = plan.get('next_appointment', None)
-            notes = plan.get('additional_notes', None)
-
-            # Format the treatment plan data for Claude
-            treatment_data = {
-                "diagnosis": diagnosis,
-                "treatments": [t.get('name', 'Unknown') for t in treatments],
-                "medications": [m.get('name', 'Unknown') for m in medicines],
-                "next_appointment": next_appointment,
-                "additional_notes": notes
-            }
+    async def _generate_plan_summary(self, plan: Dict[str, Any]) -> str:
+        """Ask Claude for a treatment plan summary; errors propagate to the caller."""
+        # Extract treatment plan data
+        diagnosis = plan.get('diagnosis', 'No diagnosis provided')
+        treatments = plan.get('selectedTreatments', [])
+        medicines = plan.get('selectedMedicines', [])
+        next_appointment = plan.get('next_appointment', None)
+        notes = plan.get('additional_notes', None)
 
-            system_prompt = """You are a medical assistant helping to create clear, patient-friendly summaries of dermatology treatment plans. Your summaries should be:
-1. Easy to understand for patients
-2. Professional and accurate
-3. Include all important information
-4. Encourage follow-up with healthcare providers
-5. Written in a caring, supportive tone"""
+        # Format the treatment plan data for Claude
+        treatment_data = {
+            "diagnosis": diagnosis,
+            "treatments": [t.get('name', 'Unknown') for t in treatments],
+            "medications": [m.get('name', 'Unknown') for m in medicines],
+            "next_appointment": next_appointment,
+            "additional_notes": notes
+        }
 
-            user_prompt = f"""Please create a clear, patient-friendly summary of this dermatology treatment plan:
+        user_prompt = f"""Please create a clear, patient-friendly summary of this dermatology treatment plan:
 
 Diagnosis: {diagnosis}
 Prescribed Treatments: {', '.join(treatment_data['treatments']) if treatment_data['treatments'] else 'None'}
@@ -221,19 +556,31 @@ Additional Notes: {notes if notes else 'None'}
 
 Please provide a comprehensive but easy-to-understand summary that the patient can reference."""
 
-            # Call Claude API
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=500,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-            
-            summary = response.content[0].text.strip()
-            logger.info(f"Generated AI summary for treatment plan with diagnosis: {diagnosis}")
-            return summary
+        # Call Claude API
+        response, usage = await self.llm.create(
+            system=[{"type": "text", "text": SUMMARY_SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}],
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=500,
+            timeout=self.summary_timeout
+        )
+        
+        summary = response.strip()
+        usage = self._record_usage(usage)
+        logger.info(f"Generated AI summary for treatment plan with diagnosis: {diagnosis} (usage: {usage})")
+        return summary
+
+    async def summarize_treatment_plan(self, plan: Dict[str, Any]) -> str:
+        """Generate a summary for a treatment plan using Claude API."""
+        if not self.llm:
+            return "Claude API is not configured. Please set your ANTHROPIC_API_KEY environment variable."
+        
+        try:
+            # Identical plans are served from the cache; only the fallback below is never cached
+            if self.summary_cache:
+                return await self.summary_cache.get_or_create(plan, lambda: self._generate_plan_summary(plan))
+            return await self._generate_plan_summary(plan)
             
         except Exception as e:
             logger.error(f"Error generating treatment plan summary with Claude: {str(e)}")
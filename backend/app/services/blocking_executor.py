@@ -0,0 +1,74 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Model loaded once per encoder process by the pool initializer
+_process_model = None
+
+def _init_encoder_process(model_name: str):
+    global _process_model
+    from sentence_transformers import SentenceTransformer
+    _process_model = SentenceTransformer(model_name)
+
+def _encode_in_process(texts: List[str]) -> List[List[float]]:
+    return _process_model.encode(texts, batch_size=len(texts)).tolist()
+
+def _encoder_limits_in_process() -> Tuple[int, Any]:
+    return _process_model.max_seq_length, _process_model.tokenizer
+
+class BlockingExecutor:
+    """Run blocking and CPU-bound work off the asyncio event loop.
+
+    Chroma calls and, by default, embedding encodes go to a bounded thread
+    pool. With `use_process_pool` the encodes instead run in a separate
+    process pool that loads its own copy of the embedding model, and the
+    parent process does not need to load one.
+    """
+
+    def __init__(self,
+                 max_workers: int = 4,
+                 model_name: Optional[str] = None,
+                 use_process_pool: bool = False,
+                 process_workers: int = 1):
+        self.max_workers = max_workers
+        self.thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vector-db")
+        self.process_pool = None
+        if use_process_pool:
+            if not model_name:
+                raise ValueError("model_name is required when use_process_pool is enabled")
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=process_workers,
+                initializer=_init_encoder_process,
+                initargs=(model_name,)
+            )
+            logger.info(f"Embedding encodes will run in a process pool with {process_workers} worker(s)")
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking call in the thread pool and await its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.thread_pool, functools.partial(func, *args, **kwargs))
+
+    async def run_encode(self, encode: Callable[[List[str]], List[List[float]]], texts: List[str]) -> List[List[float]]:
+        """Encode texts in the process pool if enabled, otherwise with `encode` in the thread pool."""
+        if self.process_pool is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.process_pool, _encode_in_process, texts)
+        return await self.run(encode, texts)
+
+    def encoder_limits(self) -> Tuple[int, Any]:
+        """Return the process pool model's max sequence length and tokenizer; blocks until a worker has loaded it."""
+        if self.process_pool is None:
+            raise RuntimeError("encoder_limits needs use_process_pool")
+        return self.process_pool.submit(_encoder_limits_in_process).result()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pools."""
+        self.thread_pool.shutdown(wait=wait)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=wait)
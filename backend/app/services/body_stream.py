@@ -0,0 +1,36 @@
+import csv
+from typing import Any, AsyncIterable, AsyncIterator, Dict
+
+async def iter_body_lines(chunks: AsyncIterable[bytes], keep_blank: bool = False) -> AsyncIterator[bytes]:
+    """Yield the lines of a streamed body as they arrive, skipping blank ones unless keep_blank is set."""
+    buffer = b""
+    async for block in chunks:
+        buffer += block
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if keep_blank or line.strip():
+                yield line
+    if keep_blank or buffer.strip():
+        yield buffer
+
+async def iter_csv_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """Yield CSV rows as dicts keyed by the header row, parsing the body as it streams in."""
+    header = None
+    record = ""
+    # Blank lines are kept, since they can sit inside a quoted multi-line field
+    async for line in iter_body_lines(chunks, keep_blank=True):
+        record += line.decode("utf-8-sig" if header is None and not record else "utf-8")
+        # A quoted field can span lines; wait for its closing quote
+        if record.count('"') % 2:
+            record += "\n"
+            continue
+        values = next(csv.reader([record.rstrip("\r")]), [])
+        record = ""
+        # csv.reader reads a blank line between rows as an empty record
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield dict(zip(header, values))
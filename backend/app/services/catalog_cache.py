@@ -0,0 +1,96 @@
+import logging
+import os
+import re
+import tempfile
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.cache import LRUCache
+from app.services.single_flight import SingleFlight
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class CatalogCache:
+    """Read-through cache of whole catalog tables (treatments, medicines, doctors).
+
+    Each catalog is loaded once and indexed by ID, so list and single-item
+    reads are memory lookups until the TTL expires or the catalog is
+    invalidated. Invalidation replaces a stamp file per catalog; every worker
+    on the host compares the stamp before serving a cached catalog, so a
+    write in one worker is seen by the others on their next read.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = 300.0, stamp_dir: Optional[str] = None):
+        self._entries = LRUCache(max_entries=256, ttl_seconds=ttl_seconds)
+        self.single_flight = SingleFlight()
+        self.stamp_dir = stamp_dir or os.path.join(tempfile.gettempdir(), "derma-catalog-stamps")
+        self.loads = 0
+        self.invalidations = 0
+        os.makedirs(self.stamp_dir, exist_ok=True)
+
+    def _stamp_path(self, name: str) -> str:
+        return os.path.join(self.stamp_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".stamp")
+
+    def _stamp(self, name: str) -> Optional[Tuple[int, int]]:
+        """Identify the catalog's latest invalidation; each one replaces the file, changing its inode."""
+        try:
+            stat = os.stat(self._stamp_path(name))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    async def _entry(self, name: str, load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> Dict[str, Any]:
+        entry = self._entries.get(name)
+        if entry is not None and entry["stamp"] == self._stamp(name):
+            return entry
+        return await self.single_flight.do(name, lambda: self._load(name, load))
+
+    async def _load(self, name: str, load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> Dict[str, Any]:
+        # Read the stamp first, so an invalidation during the load forces the next read to reload
+        stamp = self._stamp(name)
+        rows = await load()
+        entry = {
+            "rows": rows,
+            "by_id": {row.get('id'): row for row in rows},
+            "stamp": stamp
+        }
+        self._entries.set(name, entry)
+        self.loads += 1
+        return entry
+
+    async def get_all(self, name: str, load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Return every row of a catalog, loading it on a miss."""
+        return (await self._entry(name, load))["rows"]
+
+    async def get_item(self, name: str, item_id: str, load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Return one row of a catalog by ID, or None if the cached catalog does not have it."""
+        return (await self._entry(name, load))["by_id"].get(item_id)
+
+    async def get_items(self, name: str, item_ids: List[str], load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> Dict[str, Dict[str, Any]]:
+        """Return the rows of a catalog for several IDs, keyed by ID; IDs it does not have are left out."""
+        by_id = (await self._entry(name, load))["by_id"]
+        return {item_id: by_id[item_id] for item_id in item_ids if item_id in by_id}
+
+    def invalidate(self, name: str):
+        """Drop a catalog here and signal every other worker on the host to reload it."""
+        self._entries.pop(name)
+        self.invalidations += 1
+        path = self._stamp_path(name)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w") as stamp:
+                stamp.write(uuid.uuid4().hex)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # Other workers still pick up the change when their TTL expires
+            logger.warning(f"Error writing catalog stamp for {name}: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit, load and invalidation counts."""
+        return {
+            **self._entries.get_stats(),
+            "loads": self.loads,
+            "invalidations": self.invalidations
+        }
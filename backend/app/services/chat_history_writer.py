@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ChatHistoryWriter:
+    """Write-behind queue that persists chat exchanges in batches.
+
+    `enqueue` returns the message ID immediately. A background worker groups
+    queued messages and writes each group with one grouped embedding and one
+    Chroma add, flushing when `max_batch_size` messages are queued, when
+    `flush_interval_ms` has passed since the first one, or on `stop()`. A
+    failed write is retried with exponential backoff; a batch that still
+    fails is appended to `dead_letter_path` as NDJSON so it can be replayed.
+    """
+
+    def __init__(self,
+                 vector_db,
+                 max_batch_size: int = 64,
+                 flush_interval_ms: float = 250.0,
+                 max_queue_size: int = 10000,
+                 max_retries: int = 3,
+                 retry_backoff_ms: float = 200.0,
+                 dead_letter_path: Optional[str] = None):
+        self.vector_db = vector_db
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000.0
+        self.dead_letter_path = dead_letter_path
+
+        # Created lazily on the running loop, like EmbeddingBatcher
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self._enqueued = 0
+        self._written = 0
+        self._failed = 0
+        self._retries = 0
+        self._dead_lettered = 0
+        self._batches = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def enqueue(self,
+                      user_id: str,
+                      message: str,
+                      response: str,
+                      session_id: Optional[str] = None) -> str:
+        """Queue a chat exchange for persistence and return its message ID."""
+        queue = self._ensure_worker()
+        message_id = str(uuid.uuid4())
+        # A full queue applies backpressure instead of dropping history
+        await queue.put({
+            "id": message_id,
+            "user_id": user_id,
+            "session_id": session_id or str(uuid.uuid4()),
+            "message": message,
+            "response": response,
+            "created_at": datetime.now().isoformat()
+        })
+        self._enqueued += 1
+        return message_id
+
+    async def _collect(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Gather one batch; the second value is True once the stop sentinel has been seen."""
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = self._loop.time() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.vector_db.add_chat_messages(batch)
+                self._written += len(batch)
+                self._batches += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Error writing {len(batch)} chat messages after {attempt + 1} attempts: {str(e)}")
+                    break
+                # Backoff doubles per attempt, capped so one outage cannot stall the queue for long
+                delay = min(self.retry_backoff * (2 ** attempt), 5.0)
+                logger.warning(f"Error writing {len(batch)} chat messages, retrying in {delay}s: {str(e)}")
+                self._retries += 1
+                await asyncio.sleep(delay)
+        self._failed += len(batch)
+        await self._dead_letter(batch)
+
+    async def _dead_letter(self, batch: List[Dict[str, Any]]):
+        """Append messages that could not be written to the dead-letter file."""
+        if not self.dead_letter_path:
+            return
+        lines = "".join(json.dumps(message) + "\n" for message in batch)
+        try:
+            await asyncio.to_thread(self._append, lines)
+            self._dead_lettered += len(batch)
+            logger.warning(f"Moved {len(batch)} chat messages to {self.dead_letter_path}")
+        except OSError as e:
+            logger.error(f"Error writing chat messages to {self.dead_letter_path}: {str(e)}")
+
+    def _append(self, lines: str):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letters:
+            dead_letters.write(lines)
+
+    async def _run(self):
+        while True:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._write(batch)
+            if stopping:
+                return
+
+    async def stop(self):
+        """Flush everything still queued, then stop the worker."""
+        if self._worker is None or self._worker.done():
+            return
+        # The sentinel sits behind every queued message, so they are all written first
+        await self._queue.put(None)
+        await self._worker
+        self._worker = None
+        logger.info("Chat history writer flushed and stopped")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return queue depth and write counters."""
+        return {
+            "enqueued": self._enqueued,
+            "written": self._written,
+            "failed": self._failed,
+            "retries": self._retries,
+            "dead_lettered": self._dead_lettered,
+            "batches": self._batches,
+            "avg_batch_size": round(self._written / self._batches, 2) if self._batches else 0.0,
+            "pending": self._queue.qsize() if self._queue is not None else 0
+        }
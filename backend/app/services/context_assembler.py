@@ -0,0 +1,140 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Sentence ends: terminal punctuation (optionally followed by a closing quote or bracket) then whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]?\s+")
+_WORD = re.compile(r"\w+")
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text at roughly four characters per token."""
+    return (len(text) + 3) // 4
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class ContextAssembler:
+    """Fit retrieved documents and chat history into a fixed token budget.
+
+    Documents are taken in order of relevance (smallest `distance` first);
+    passages that mostly repeat one already chosen are dropped, and the last
+    passage that fits is cut at a sentence boundary. History keeps the most
+    recent turns that fit their own budget. The result reports the tokens used.
+    """
+
+    def __init__(self,
+                 document_tokens: int = 1500,
+                 history_tokens: int = 500,
+                 history_turns: int = 5,
+                 duplicate_threshold: float = 0.8,
+                 min_passage_tokens: int = 24,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.document_tokens = document_tokens
+        self.history_tokens = history_tokens
+        self.history_turns = history_turns
+        self.duplicate_threshold = duplicate_threshold
+        self.min_passage_tokens = min_passage_tokens
+        self.count_tokens = count_tokens or estimate_tokens
+
+    def truncate(self, text: str, budget: int) -> str:
+        """Return the longest run of whole sentences from the start of text that fits the budget."""
+        if self.count_tokens(text) <= budget:
+            return text
+        kept = ""
+        for match in _SENTENCE_END.finditer(text):
+            candidate = text[:match.start() + len(match.group().rstrip())]
+            if self.count_tokens(candidate) > budget:
+                break
+            kept = candidate
+        if kept:
+            return kept
+        # A single sentence longer than the budget is cut at a word boundary instead
+        cut = []
+        for word in text.split():
+            if self.count_tokens(" ".join(cut + [word]) + " ...") > budget:
+                break
+            cut.append(word)
+        return " ".join(cut) + " ..." if cut else ""
+
+    def _select_documents(self, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ranked = sorted(docs, key=lambda doc: doc.get('distance') if doc.get('distance') is not None else float("inf"))
+        passages = []
+        chosen_shingles = []
+        used = 0
+        duplicates = 0
+        truncated = 0
+        over_budget = 0
+        for doc in ranked:
+            content = (doc.get('content') or "").strip()
+            if not content:
+                continue
+            shingles = _shingles(content)
+            if any(_jaccard(shingles, other) >= self.duplicate_threshold for other in chosen_shingles):
+                duplicates += 1
+                continue
+            remaining = self.document_tokens - used
+            tokens = self.count_tokens(content)
+            if tokens > remaining:
+                if remaining < self.min_passage_tokens:
+                    over_budget += 1
+                    continue
+                content = self.truncate(content, remaining)
+                if not content:
+                    over_budget += 1
+                    continue
+                tokens = self.count_tokens(content)
+                truncated += 1
+            passages.append(content)
+            chosen_shingles.append(shingles)
+            used += tokens
+        return {
+            "passages": passages,
+            "tokens": used,
+            "dropped_duplicates": duplicates,
+            "dropped_over_budget": over_budget,
+            "truncated": truncated
+        }
+
+    def _select_history(self, history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Keep the newest turns that fit, returned oldest first."""
+        newest_first = sorted(
+            history,
+            key=lambda entry: (entry.get('metadata') or {}).get('created_at', ''),
+            reverse=True
+        )
+        turns = []
+        used = 0
+        for entry in newest_first[:self.history_turns]:
+            metadata = entry.get('metadata') or {}
+            turn = {"message": metadata.get('message', ''), "response": metadata.get('response', '')}
+            tokens = self.count_tokens(f"User: {turn['message']}\nAssistant: {turn['response']}")
+            if used + tokens > self.history_tokens:
+                break
+            turns.append(turn)
+            used += tokens
+        turns.reverse()
+        return {"turns": turns, "tokens": used}
+
+    def assemble(self, docs: List[Dict[str, Any]], history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Select the passages and history turns for a prompt, with token usage."""
+        documents = self._select_documents(docs or [])
+        conversation = self._select_history(history or [])
+        return {
+            "documents": documents["passages"],
+            "history": conversation["turns"],
+            "tokens": {
+                "documents": documents["tokens"],
+                "history": conversation["tokens"],
+                "total": documents["tokens"] + conversation["tokens"]
+            },
+            "dropped_duplicates": documents["dropped_duplicates"],
+            "dropped_over_budget": documents["dropped_over_budget"],
+            "truncated": documents["truncated"]
+        }
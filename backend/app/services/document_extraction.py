@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+import aiofiles
+import aiofiles.os
+
+from app.services.upload_spool import iter_text
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DocumentExtractionError(Exception):
+    """Raised when text cannot be extracted from an uploaded file."""
+
+class ExtractionTimeoutError(DocumentExtractionError):
+    """Raised when extraction of a file exceeds its time limit."""
+
+# Parser functions run inside the worker processes, so they import their libraries lazily
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> str:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return "\n\n".join((reader.pages[i].extract_text() or "") for i in range(start, end))
+
+def _extract_docx(path: str) -> str:
+    import docx
+    document = docx.Document(path)
+    parts = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append("\t".join(cell.text for cell in row.cells))
+    return "\n".join(parts)
+
+def _extract_rtf(path: str) -> str:
+    from striprtf.striprtf import rtf_to_text
+    with open(path, "r", encoding="utf-8", errors="replace") as source:
+        return rtf_to_text(source.read())
+
+class ParseBudget:
+    """Seconds of worker time left for one file."""
+
+    def __init__(self, seconds: float):
+        self.remaining = seconds
+
+class DocumentExtractionService:
+    """Extract text from PDF, DOCX and RTF files in a process pool.
+
+    Parsing is CPU-bound, so it runs in worker processes with a per-file time
+    limit that counts only the time spent waiting on workers, not the time the
+    caller spends on text already yielded. A file that times out retires its
+    pool: new work goes to a fresh pool, and the old one is terminated once
+    the other jobs on it finish. PDFs are extracted a few pages per task and
+    yielded in page order as each batch completes. Extracted text is cached on
+    disk by file hash, so re-uploads of the same file skip parsing entirely;
+    the least recently used files are evicted past `cache_max_bytes`.
+    """
+
+    SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.rtf')
+
+    def __init__(self,
+                 max_workers: int = 2,
+                 timeout_seconds: float = 60.0,
+                 pages_per_task: int = 10,
+                 cache_dir: Optional[str] = "./extraction_cache",
+                 cache_max_bytes: int = 512 * 1024 * 1024):
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self.pages_per_task = pages_per_task
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Jobs still running on each pool, and the retired pools waiting for theirs to drain
+        self._pool_jobs: Dict[ProcessPoolExecutor, Set[asyncio.Future]] = {}
+        self._retiring: Dict[ProcessPoolExecutor, asyncio.Task] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timeouts = 0
+        self.cache_evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def supports(self, extension: str) -> bool:
+        """Return whether files with this extension can be extracted."""
+        return extension.lower() in self.SUPPORTED_EXTENSIONS
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Spawned workers avoid inheriting the parent's model and thread state
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _submit(self, func, *args):
+        """Start a job on the current pool and return (pool, future)."""
+        pool = self._get_pool()
+        future = asyncio.get_running_loop().run_in_executor(pool, func, *args)
+        jobs = self._pool_jobs.setdefault(pool, set())
+        jobs.add(future)
+        future.add_done_callback(jobs.discard)
+        return pool, future
+
+    async def _run(self, budget: ParseBudget, func, *args):
+        pool, future = self._submit(func, *args)
+        return await self._await(pool, future, budget)
+
+    async def _await(self, pool: ProcessPoolExecutor, future, budget: ParseBudget):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            return await asyncio.wait_for(future, max(budget.remaining, 0))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._retire_pool(pool)
+            raise ExtractionTimeoutError(f"Text extraction exceeded {self.timeout_seconds} seconds")
+        finally:
+            budget.remaining -= loop.time() - started
+
+    def _retire_pool(self, pool: ProcessPoolExecutor):
+        """Send new work to a fresh pool and recycle this one once its other jobs finish."""
+        if self._pool is pool:
+            self._pool = None
+        if pool in self._retiring:
+            return
+        task = asyncio.get_running_loop().create_task(self._recycle_pool(pool))
+        self._retiring[pool] = task
+        task.add_done_callback(lambda _: self._retiring.pop(pool, None))
+
+    async def _recycle_pool(self, pool: ProcessPoolExecutor):
+        # Timed-out jobs are already cancelled, so only other requests' extractions are waited for
+        jobs = self._pool_jobs.get(pool, set())
+        pending = {job for job in jobs if not job.done()}
+        while pending:
+            await asyncio.wait(pending)
+            pending = {job for job in jobs if not job.done()}
+        self._pool_jobs.pop(pool, None)
+        self._terminate_pool(pool)
+
+    def _terminate_pool(self, pool: ProcessPoolExecutor):
+        """Stop a pool, terminating workers still stuck on a file that timed out."""
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _iter_pdf(self, path: str, budget: ParseBudget) -> AsyncIterator[str]:
+        page_count = await self._run(budget, _pdf_page_count, path)
+        ranges = deque(
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        )
+        # Keep a few page batches in flight so workers stay busy while earlier text is consumed
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < self.max_workers:
+                    start, end = ranges.popleft()
+                    in_flight.append(self._submit(_extract_pdf_pages, path, start, end))
+                pool, future = in_flight.popleft()
+                text = await self._await(pool, future, budget)
+                if text:
+                    yield text + "\n\n"
+        finally:
+            # Batches of a file that failed or was abandoned are not worth finishing
+            for _, future in in_flight:
+                future.cancel()
+
+    async def _iter_parsed(self, path: str, extension: str) -> AsyncIterator[str]:
+        # The clock only runs while waiting on workers, so slow consumers do not eat into it
+        budget = ParseBudget(self.timeout_seconds)
+        try:
+            if extension == '.pdf':
+                async for text in self._iter_pdf(path, budget):
+                    yield text
+            elif extension == '.docx':
+                yield await self._run(budget, _extract_docx, path)
+            elif extension == '.rtf':
+                yield await self._run(budget, _extract_rtf, path)
+            else:
+                raise DocumentExtractionError(f"Text extraction is not supported for {extension} files")
+        except DocumentExtractionError:
+            raise
+        except Exception as e:
+            raise DocumentExtractionError(f"Could not extract text from {extension} file: {str(e)}") from e
+
+    async def extract(self, path: str, extension: str, file_hash: str) -> AsyncIterator[str]:
+        """Yield the text of a file in pieces, from the cache when this file was seen before."""
+        extension = extension.lower()
+        cache_path = os.path.join(self.cache_dir, f"{file_hash}.txt") if self.cache_dir else None
+
+        if cache_path and await aiofiles.os.path.exists(cache_path):
+            self.cache_hits += 1
+            # Eviction goes by modification time, so a hit marks the file as recently used
+            try:
+                await asyncio.to_thread(os.utime, cache_path)
+            except FileNotFoundError:
+                pass
+            async for text in iter_text(cache_path):
+                yield text
+            return
+
+        self.cache_misses += 1
+        if not cache_path:
+            async for text in self._iter_parsed(path, extension):
+                yield text
+            return
+
+        # Write through to a temp file and publish it only once extraction has fully succeeded
+        temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        completed = False
+        try:
+            async with aiofiles.open(temp_path, "w", encoding="utf-8") as cache_file:
+                async for text in self._iter_parsed(path, extension):
+                    await cache_file.write(text)
+                    yield text
+            completed = True
+            await aiofiles.os.replace(temp_path, cache_path)
+            await asyncio.to_thread(self._evict_cache)
+        finally:
+            if not completed:
+                try:
+                    await aiofiles.os.remove(temp_path)
+                except FileNotFoundError:
+                    pass
+
+    def _evict_cache(self):
+        """Delete the least recently used cached texts until the cache fits `cache_max_bytes`."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            # In-progress temp files belong to running extractions
+            if not entry.name.endswith(".txt"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.cache_max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.cache_evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache and timeout counters."""
+        return {
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_evictions": self.cache_evictions,
+            "timeouts": self.timeouts
+        }
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        for pool in list(self._retiring):
+            self._terminate_pool(pool)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Collect concurrent embedding requests and encode them in one batched call.
+
+    Callers await `embed(text)`. A background worker takes the first queued
+    request, keeps collecting until `max_batch_size` requests are queued or
+    `max_wait_ms` has passed, awaits a single `encode_batch` call for the whole
+    group and hands every caller its own vector. Requests that arrive while a
+    batch is being encoded queue up for the next one.
+    """
+
+    def __init__(self,
+                 encode_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+
+        # The queue and worker are bound to the running loop and created lazily,
+        # because the service is constructed at import time, before uvicorn starts its loop.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._errors = 0
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue a single text and wait for its embedding."""
+        queue = self._ensure_worker()
+        future = self._loop.create_future()
+        queue.put_nowait((text, future, time.perf_counter()))
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Queue several texts at once; they are batched with any concurrent requests."""
+        if not texts:
+            return []
+        queue = self._ensure_worker()
+        enqueued_at = time.perf_counter()
+        futures = []
+        for text in texts:
+            future = self._loop.create_future()
+            queue.put_nowait((text, future, enqueued_at))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, float]]:
+        """Wait for the first request, then gather more until the batch is full or the wait expires."""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (e.g. a cancelled request) do not need encoding
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            texts = [text for text, _, _ in batch]
+            try:
+                embeddings = await self.encode_batch(texts)
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Error encoding embedding batch of {len(texts)}: {str(e)}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._record_batch(batch, started)
+            for (_, future, _), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+    def _record_batch(self, batch: List[Tuple[str, asyncio.Future, float]], started: float):
+        self._batches += 1
+        self._items += len(batch)
+        self._max_batch_seen = max(self._max_batch_seen, len(batch))
+        for _, _, enqueued_at in batch:
+            wait = started - enqueued_at
+            self._total_wait += wait
+            self._max_wait_seen = max(self._max_wait_seen, wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return batch-size and queue-wait statistics."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._max_batch_seen,
+            "avg_queue_wait_ms": round(self._total_wait / self._items * 1000.0, 3) if self._items else 0.0,
+            "max_queue_wait_ms": round(self._max_wait_seen * 1000.0, 3),
+            "queued": self._queue.qsize() if self._queue is not None else 0
+        }
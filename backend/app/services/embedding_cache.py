@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.services.cache import LRUCache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different copies share a cache key."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an LRU memory tier and an optional SQLite tier.
+
+    Keys are a SHA-256 of the model name plus the normalized text, so a model
+    change never serves stale vectors. The SQLite tier survives restarts; its
+    reads and writes go through `run_blocking` to stay off the event loop.
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 max_entries: int = 10000,
+                 db_path: Optional[str] = None,
+                 run_blocking: Optional[Callable[..., Awaitable[Any]]] = None):
+        self.model_name = model_name
+        self.memory = LRUCache(max_entries=max_entries)
+        self.db_path = db_path
+        self.run_blocking = run_blocking or self._run_inline
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Embedding cache persistent tier enabled at {db_path}")
+
+    @staticmethod
+    async def _run_inline(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    def key_for(self, text: str) -> str:
+        """Return the cache key for a text under the current model."""
+        payload = f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    async def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for texts; missing entries are None."""
+        keys = [self.key_for(text) for text in texts]
+        results = [self.memory.get(key) for key in keys]
+
+        missing = list({key for key, result in zip(keys, results) if result is None})
+        if missing and self._db is not None:
+            found = await self.run_blocking(self._read_disk, missing)
+            self.disk_hits += len(found)
+            self.disk_misses += len(missing) - len(found)
+            for key, vector in found.items():
+                self.memory.set(key, vector)
+            results = [found.get(key) if result is None else result for key, result in zip(keys, results)]
+        return results
+
+    async def put_many(self, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for texts in both tiers."""
+        rows = {}
+        for text, embedding in zip(texts, embeddings):
+            key = self.key_for(text)
+            self.memory.set(key, embedding)
+            rows[key] = embedding
+        if rows and self._db is not None:
+            try:
+                await self.run_blocking(self._write_disk, rows)
+            except Exception as e:
+                # The memory tier already has the vectors, so a disk failure only costs warm restarts
+                logger.error(f"Error writing embedding cache to disk: {str(e)}")
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._db_lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def _write_disk(self, rows: Dict[str, List[float]]):
+        now = time.time()
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                [(key, self.model_name, array("f", vector).tobytes(), now) for key, vector in rows.items()]
+            )
+            self._db.commit()
+
+    def _count_disk(self) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Return hit rates and eviction counts for both tiers."""
+        memory_stats = self.memory.get_stats()
+        lookups = memory_stats["hits"] + memory_stats["misses"]
+        hits = memory_stats["hits"] + self.disk_hits
+        stats = {
+            "model": self.model_name,
+            "memory": memory_stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "persistent": self._db is not None
+        }
+        if self._db is not None:
+            stats["disk"] = {
+                "path": self.db_path,
+                "entries": await self.run_blocking(self._count_disk),
+                "hits": self.disk_hits,
+                "misses": self.disk_misses
+            }
+        return stats
+
+    def close(self):
+        """Close the persistent tier."""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
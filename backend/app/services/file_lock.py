@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LockTimeoutError(Exception):
+    """Raised when a lock is not acquired within its timeout."""
+
+class KeyedFileLock:
+    """Per-key exclusive lock shared by every process on the host.
+
+    Each key maps to a lock file under `lock_dir`, locked with flock, so
+    uvicorn workers on one machine serialise work for the same key. Where
+    flock is unavailable only an in-process lock is taken.
+    """
+
+    def __init__(self, lock_dir: Optional[str] = None, timeout_seconds: float = 30.0, poll_interval_ms: float = 50.0):
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), "derma-locks")
+        self.timeout_seconds = timeout_seconds
+        self.poll_interval = poll_interval_ms / 1000.0
+        # In-process lock and holder count per key, so coroutines in this worker queue without polling;
+        # an entry is dropped when its last holder or waiter leaves
+        self._local_locks = {}
+        os.makedirs(self.lock_dir, exist_ok=True)
+        if fcntl is None:
+            logger.warning("fcntl is unavailable; KeyedFileLock only serialises within this process")
+
+    def _path(self, key: str) -> str:
+        # Hash the key so any string makes a safe file name
+        return os.path.join(self.lock_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + ".lock")
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Hold the lock for key for the duration of the block."""
+        entry = self._local_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            local = entry[0]
+            try:
+                await asyncio.wait_for(local.acquire(), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                raise LockTimeoutError(f"Timed out waiting for lock on {key}")
+            fd = None
+            try:
+                if fcntl is not None:
+                    fd = os.open(self._path(key), os.O_CREAT | os.O_RDWR, 0o644)
+                    # Poll with a non-blocking flock so waiting never blocks the event loop
+                    deadline = time.monotonic() + self.timeout_seconds
+                    while not self._try_lock(fd):
+                        if time.monotonic() >= deadline:
+                            raise LockTimeoutError(f"Timed out waiting for lock on {key}")
+                        await asyncio.sleep(self.poll_interval)
+                yield
+            finally:
+                if fd is not None:
+                    # Closing the descriptor releases the flock
+                    os.close(fd)
+                local.release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._local_locks[key]
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import anthropic
+try:
+    # Newer Anthropic SDKs are built on httpx2; pool settings must come from the same package
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+from app.services.cache import LRUCache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "claude-3-sonnet-20240229"
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+# A prompt is a plain string or a list of Messages API content blocks
+Prompt = Union[str, List[Dict[str, Any]]]
+
+class LLMBackendError(Exception):
+    """Raised when the model backend fails to produce a reply."""
+
+class LLMRateLimitError(LLMBackendError):
+    """Raised when the model backend rejects a request for exceeding its rate limit."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class LLMBackend(ABC):
+    """Interface for the model provider behind AIService.
+
+    `create` returns the reply text with its token usage (a dict of
+    USAGE_FIELDS, or None). `stream` yields text deltas and fills the given
+    usage dict once the reply is complete.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def create(self, system: Prompt, messages: List[Dict[str, Any]], max_tokens: int,
+                     timeout: float) -> Tuple[str, Optional[Dict[str, int]]]:
+        """Return the full reply text and its token usage."""
+
+    @abstractmethod
+    def stream(self, system: Prompt, messages: List[Dict[str, Any]], max_tokens: int, timeout: float,
+               usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        """Yield the reply as text deltas, filling usage once it is complete."""
+
+    async def close(self):
+        """Release any connections held by the backend."""
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, int]]:
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+
+def _backend_error(error: anthropic.APIStatusError) -> LLMBackendError:
+    """Translate an Anthropic API error into the backend's own error types."""
+    if isinstance(error, anthropic.RateLimitError):
+        retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+        return LLMRateLimitError(str(error), float(retry_after) if retry_after else None)
+    return LLMBackendError(str(error))
+
+class AnthropicBackend(LLMBackend):
+    """Claude through the Anthropic Messages API, on one pooled keep-alive HTTP client."""
+
+    name = "anthropic"
+
+    def __init__(self,
+                 api_key: str,
+                 model: str = DEFAULT_MODEL,
+                 base_url: Optional[str] = None,
+                 timeout: float = 60.0,
+                 http_client: Optional[Any] = None):
+        self.model = model
+        # One pooled keep-alive HTTP client shared by every in-flight Claude call
+        self.http_client = http_client or anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                keepalive_expiry=float(os.getenv("ANTHROPIC_KEEPALIVE_EXPIRY_SECONDS", "30"))
+            ),
+            timeout=httpx.Timeout(
+                timeout,
+                connect=float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT_SECONDS", "5"))
+            )
+        )
+        self.client = anthropic.AsyncAnthropic(
+            api_key=api_key or "local-stub",
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=int(os.getenv("ANTHROPIC_MAX_RETRIES", "2"))
+        )
+
+    async def create(self, system, messages, max_tokens, timeout):
+        try:
+            response = await self.client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                system=system,
+                messages=messages,
+                timeout=timeout
+            )
+        except anthropic.APIStatusError as e:
+            raise _backend_error(e) from e
+        return response.content[0].text, _usage_dict(response.usage)
+
+    async def stream(self, system, messages, max_tokens, timeout, usage=None):
+        try:
+            async with self.client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                system=system,
+                messages=messages,
+                timeout=timeout
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                message = await stream.get_final_message()
+        except anthropic.APIStatusError as e:
+            raise _backend_error(e) from e
+        if usage is not None:
+            usage.update(_usage_dict(message.usage) or {})
+
+    async def close(self):
+        await self.client.close()
+
+def _prompt_blocks(system: Prompt, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    blocks = [{"type": "text", "text": system}] if isinstance(system, str) else list(system)
+    for message in messages:
+        content = message["content"]
+        blocks.extend([{"type": "text", "text": content}] if isinstance(content, str) else content)
+    return blocks
+
+_STUB_WORDS = (
+    "Please keep the affected skin clean and moisturised, use a gentle cleanser, apply sunscreen "
+    "every morning, avoid picking or scratching, and follow the treatment plan your dermatologist "
+    "prescribed. Contact the clinic if irritation, swelling or pain gets worse."
+).split()
+
+class StubLLMBackend(LLMBackend):
+    """Deterministic offline stand-in for Claude, for load tests and benchmarks.
+
+    Replies are canned text chosen by a hash of the prompt, so the same
+    prompt always gets the same reply. Latency follows `first_token_ms` and
+    `tokens_per_second`; errors and rate limits are injected at the given
+    rates from a seeded RNG. Usage reports cache reads and writes for
+    cache_control prefixes the way the provider does.
+    """
+
+    name = "stub"
+
+    def __init__(self,
+                 first_token_ms: float = 400.0,
+                 tokens_per_second: float = 60.0,
+                 reply_tokens: int = 80,
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 retry_after_seconds: float = 1.0,
+                 seed: int = 0,
+                 max_cached_prefixes: int = 1024):
+        self.first_token_ms = first_token_ms
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self._random = random.Random(seed)
+        # Bounded like the provider's cache, which also forgets prefixes
+        self._cached_prefixes = LRUCache(max_entries=max_cached_prefixes)
+
+    def _check_failure(self):
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise LLMRateLimitError("Stub LLM rate limit exceeded", self.retry_after_seconds)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise LLMBackendError("Stub LLM injected error")
+
+    def _reply_words(self, blocks: List[Dict[str, Any]], max_tokens: int) -> List[str]:
+        digest = hashlib.sha256("".join(block["text"] for block in blocks).encode("utf-8")).digest()
+        offset = digest[0] % len(_STUB_WORDS)
+        count = min(self.reply_tokens, max_tokens)
+        return [_STUB_WORDS[(offset + i) % len(_STUB_WORDS)] for i in range(count)]
+
+    def _usage(self, blocks: List[Dict[str, Any]], output_tokens: int) -> Dict[str, int]:
+        """Count input tokens at four characters each, split into cache reads, cache writes and uncached input."""
+        prefix = ""
+        read = written = cached = 0
+        for block in blocks:
+            prefix += block["text"]
+            if "cache_control" in block:
+                cached = len(prefix) // 4
+                key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+                if self._cached_prefixes.get(key) is not None:
+                    read = cached
+                else:
+                    self._cached_prefixes.set(key, True)
+                    written = cached
+        return {
+            "input_tokens": len(prefix) // 4 - cached,
+            "output_tokens": output_tokens,
+            "cache_creation_input_tokens": max(written - read, 0),
+            "cache_read_input_tokens": read
+        }
+
+    async def _deltas(self, words: List[str], timeout: float) -> AsyncIterator[str]:
+        deadline = time.monotonic() + timeout
+        await asyncio.sleep(self.first_token_ms / 1000.0)
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        for i, word in enumerate(words):
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError("Stub LLM reply exceeded its timeout")
+            if i:
+                await asyncio.sleep(interval)
+            yield word if i == 0 else " " + word
+
+    async def create(self, system, messages, max_tokens, timeout):
+        self._check_failure()
+        blocks = _prompt_blocks(system, messages)
+        words = self._reply_words(blocks, max_tokens)
+        text = "".join([delta async for delta in self._deltas(words, timeout)])
+        return text, self._usage(blocks, len(words))
+
+    async def stream(self, system, messages, max_tokens, timeout, usage=None):
+        self._check_failure()
+        blocks = _prompt_blocks(system, messages)
+        words = self._reply_words(blocks, max_tokens)
+        async for delta in self._deltas(words, timeout):
+            yield delta
+        if usage is not None:
+            usage.update(self._usage(blocks, len(words)))
+
+def create_llm_backend(api_key: str, timeout: float = 60.0) -> Optional[LLMBackend]:
+    """Build the backend selected by LLM_BACKEND, or None when Claude is not configured."""
+    backend = os.getenv("LLM_BACKEND", "anthropic").lower()
+    if backend == "stub":
+        logger.info("Using the local stub LLM backend")
+        return StubLLMBackend(
+            first_token_ms=float(os.getenv("STUB_LLM_FIRST_TOKEN_MS", "400")),
+            tokens_per_second=float(os.getenv("STUB_LLM_TOKENS_PER_SECOND", "60")),
+            reply_tokens=int(os.getenv("STUB_LLM_REPLY_TOKENS", "80")),
+            error_rate=float(os.getenv("STUB_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("STUB_LLM_RATE_LIMIT_RATE", "0")),
+            retry_after_seconds=float(os.getenv("STUB_LLM_RETRY_AFTER_SECONDS", "1")),
+            seed=int(os.getenv("STUB_LLM_SEED", "0"))
+        )
+    if backend != "anthropic":
+        raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+
+    # ANTHROPIC_BASE_URL points the client at another server, e.g. a local stub for load tests
+    base_url = os.getenv("ANTHROPIC_BASE_URL") or None
+    if not api_key and not base_url:
+        return None
+    return AnthropicBackend(
+        api_key=api_key,
+        model=os.getenv("ANTHROPIC_MODEL", DEFAULT_MODEL),
+        base_url=base_url,
+        timeout=timeout
+    )
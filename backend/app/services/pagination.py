@@ -0,0 +1,27 @@
+import base64
+import json
+from typing import Any, Dict, Tuple
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Encode the (created_at, id) position of a row as an opaque URL-safe cursor."""
+    position = json.dumps([str(row.get('created_at')), str(row.get('id'))], separators=(",", ":"))
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor back to (created_at, id); raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def keyset_filter(created_at: str, row_id: str) -> str:
+    """PostgREST `or` filter for rows after (created_at, id) in descending order."""
+    # Values are quoted because timestamps contain PostgREST's reserved characters
+    created_at = _quote(created_at)
+    row_id = _quote(row_id)
+    return f"created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id})"
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
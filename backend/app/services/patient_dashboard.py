@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.services.cache import LRUCache
+from app.services.single_flight import SingleFlight
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sections a dashboard can be projected to; recentVisits and upcomingAppointment are derived from reports
+DASHBOARD_SECTIONS = ("profile", "reports", "treatment_info", "chat_history", "recentVisits", "upcomingAppointment")
+REPORT_SECTIONS = ("reports", "treatment_info", "recentVisits", "upcomingAppointment")
+
+class PatientDashboardService:
+    """Builds everything a patient's screen needs in one call.
+
+    The profile, reports and chat history are fetched concurrently, then the
+    catalog items and treatment info the reports reference are resolved
+    together. Only the requested sections are gathered, and each result is
+    cached per patient for a few seconds. A build that overlaps an
+    invalidation of its patient is returned but not cached.
+    """
+
+    def __init__(self, supabase_service, vector_db_service, ttl_seconds: float = 15.0,
+                 max_entries: int = 1024, chat_history_limit: int = 20, recent_visits: int = 5):
+        self.supabase_service = supabase_service
+        self.vector_db_service = vector_db_service
+        self.chat_history_limit = chat_history_limit
+        self.recent_visits = recent_visits
+        self._cache = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        # Bumped per patient by invalidate(); only needs to outlive a build, so it is bounded like the cache
+        self._generations = LRUCache(max_entries=max_entries)
+        self.single_flight = SingleFlight()
+
+    def _fields(self, fields: Optional[List[str]]) -> tuple:
+        if not fields:
+            return DASHBOARD_SECTIONS
+        unknown = [field for field in fields if field not in DASHBOARD_SECTIONS]
+        if unknown:
+            raise ValueError(f"Unknown dashboard fields: {', '.join(unknown)}")
+        return tuple(field for field in DASHBOARD_SECTIONS if field in fields)
+
+    async def get_dashboard(self, patient_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Return the requested dashboard sections, or None if the profile was requested and the patient does not exist."""
+        fields = self._fields(fields)
+        key = (patient_id, fields)
+        dashboard = self._cache.get(key)
+        if dashboard is not None:
+            return dashboard
+        generation = self._generations.get(patient_id, 0)
+        # Requests after an invalidation start a fresh build instead of joining one that may be stale
+        return await self.single_flight.do(key + (generation,), lambda: self._build(patient_id, fields, key, generation))
+
+    async def _build(self, patient_id: str, fields: tuple, key: tuple, generation: int) -> Optional[Dict[str, Any]]:
+        sources = {}
+        if "profile" in fields:
+            sources["profile"] = self.supabase_service.get_patient(patient_id)
+        if any(field in fields for field in REPORT_SECTIONS):
+            sources["reports"] = self.supabase_service.get_patient_reports(patient_id)
+        if "chat_history" in fields:
+            sources["chat_history"] = self.vector_db_service.get_chat_history(patient_id, limit=self.chat_history_limit)
+        loaded = dict(zip(sources, await asyncio.gather(*sources.values())))
+
+        if "profile" in fields and not loaded["profile"]:
+            return None
+
+        reports = loaded.get("reports") or []
+        # Everything the reports reference is resolved in one concurrent pass
+        follow_ups = {}
+        if "reports" in fields:
+            follow_ups["reports"] = self.supabase_service.expand_report_items(reports)
+        if "treatment_info" in fields:
+            follow_ups["treatment_info"] = self.supabase_service.get_treatment_infos(
+                self.supabase_service.referenced_items(reports)
+            )
+        loaded.update(zip(follow_ups, await asyncio.gather(*follow_ups.values())))
+
+        if "recentVisits" in fields:
+            loaded["recentVisits"] = [self._visit(report) for report in reports[:self.recent_visits]]
+        if "upcomingAppointment" in fields:
+            loaded["upcomingAppointment"] = self._upcoming_appointment(reports)
+
+        dashboard = {field: loaded.get(field) for field in fields}
+        # A write landed while this was built, so the data may predate it
+        if self._generations.get(patient_id, 0) == generation:
+            self._cache.set(key, dashboard)
+        return dashboard
+
+    def _visit(self, report: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": report.get('id'),
+            "date": report.get('created_at'),
+            "type": report.get('diagnosis') or "Consultation",
+            "doctor": report.get('doctor'),
+            "status": "completed"
+        }
+
+    def _upcoming_appointment(self, reports: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # Reports come newest first, so the first one with a next appointment is the latest plan
+        for report in reports:
+            if report.get('next_appointment'):
+                return {
+                    "reportId": report.get('id'),
+                    "date": report['next_appointment'],
+                    "type": "Follow-up",
+                    "doctor": report.get('doctor')
+                }
+        return None
+
+    def invalidate(self, patient_id: str):
+        """Drop every cached dashboard for a patient, and keep builds already running from caching theirs."""
+        self._generations.set(patient_id, self._generations.get(patient_id, 0) + 1)
+        for key in self._cache.keys():
+            if key[0] == patient_id:
+                self._cache.pop(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache hit and miss counts."""
+        return self._cache.get_stats()
@@ -0,0 +1,57 @@
+import logging
+import math
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Async PostgREST client whose queries share one bounded connection pool.
+
+    Every query is a non-blocking HTTP round trip, so concurrent requests in a
+    worker overlap instead of holding the event loop. Each request also asks
+    PostgREST to cap its statement at `statement_timeout_seconds`; servers that
+    predate the timeout preference ignore it, and the read timeout still bounds
+    the wait.
+    """
+
+    def __init__(self, supabase_url: str, api_key: str, pool_size: int = 20,
+                 statement_timeout_seconds: float = 10.0, connect_timeout_seconds: float = 5.0):
+        self.pool_size = pool_size
+        self.statement_timeout_seconds = statement_timeout_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        super().__init__(
+            f"{supabase_url.rstrip('/')}/rest/v1",
+            headers={
+                **DEFAULT_POSTGREST_CLIENT_HEADERS,
+                "apikey": api_key,
+                "Authorization": f"Bearer {api_key}"
+            },
+            http_client=self._create_http_client()
+        )
+
+    def _create_http_client(self) -> httpx.AsyncClient:
+        """Build the shared HTTP session with pool limits and the statement timeout hook."""
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size
+            ),
+            # Leave room for PostgREST to report the cancelled statement before the client gives up
+            timeout=httpx.Timeout(
+                self.statement_timeout_seconds + self.connect_timeout_seconds,
+                connect=self.connect_timeout_seconds
+            ),
+            event_hooks={"request": [self._prefer_statement_timeout]},
+            follow_redirects=True
+        )
+
+    async def _prefer_statement_timeout(self, request: httpx.Request):
+        # Builders set their own Prefer header (e.g. return=representation), so append to it
+        preference = f"timeout={max(1, math.ceil(self.statement_timeout_seconds))}"
+        prefer = request.headers.get("Prefer")
+        request.headers["Prefer"] = f"{prefer},{preference}" if prefer else preference
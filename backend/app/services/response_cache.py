@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.cache import LRUCache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Scope for replies that depend only on the question and the document collection
+SHARED_SCOPE = "shared"
+
+class SemanticResponseCache:
+    """Cache of chatbot replies looked up by query-embedding similarity.
+
+    Entries live in an LRUCache (TTL and LRU eviction) and are partitioned by
+    scope: replies built from patient details or a user's conversation are
+    stored under that user's scope and never served to anyone else. Each
+    entry records the documents version it was answered against, and any
+    change to the document collection invalidates every entry.
+    """
+
+    def __init__(self,
+                 similarity_threshold: float = 0.92,
+                 max_entries: int = 2048,
+                 ttl_seconds: Optional[float] = 3600.0,
+                 audit_size: int = 200):
+        self.similarity_threshold = similarity_threshold
+        self._entries = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        # Per-scope index of entry ID -> normalised query embedding; stale IDs are pruned lazily
+        self._index: Dict[str, Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._documents_version: Optional[int] = None
+
+        self.lookups = 0
+        self.hits = 0
+        self.invalidations = 0
+        self.saved_llm_ms = 0.0
+        self.false_hits = 0
+        self._audit = deque(maxlen=audit_size)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, documents_version: int):
+        """Drop every entry when the document collection has changed since they were stored."""
+        if self._documents_version != documents_version:
+            if self._documents_version is not None:
+                self._entries.clear()
+                self._index.clear()
+                self.invalidations += 1
+                logger.info(f"Response cache invalidated for documents version {documents_version}")
+            self._documents_version = documents_version
+
+    def _indexed(self) -> int:
+        return sum(len(scoped) for scoped in self._index.values())
+
+    def _prune_index(self):
+        """Drop index entries whose cache entry has been evicted or has expired."""
+        live = set(self._entries.keys())
+        for scope in list(self._index):
+            scoped = {entry_id: vector for entry_id, vector in self._index[scope].items() if entry_id in live}
+            if scoped:
+                self._index[scope] = scoped
+            else:
+                del self._index[scope]
+
+    def lookup(self, query: str, embedding: List[float], scope: str, documents_version: int) -> Optional[Dict[str, Any]]:
+        """Return the closest cached reply in scope when it clears the similarity threshold."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(documents_version)
+            self.lookups += 1
+            scoped = self._index.get(scope)
+            if not scoped:
+                return None
+            entry_ids = list(scoped)
+            similarities = np.stack([scoped[entry_id] for entry_id in entry_ids]) @ vector
+            for position in np.argsort(-similarities):
+                similarity = float(similarities[position])
+                if similarity < self.similarity_threshold:
+                    return None
+                entry_id = entry_ids[position]
+                entry = self._entries.get(entry_id)
+                if entry is None:
+                    # Evicted or expired since it was indexed
+                    del scoped[entry_id]
+                    continue
+                self.hits += 1
+                self.saved_llm_ms += entry["llm_ms"]
+                # Query text is only kept for shared entries; user-scoped ones may carry patient details
+                shared = scope == SHARED_SCOPE
+                self._audit.append({
+                    "entry_id": entry_id,
+                    "scope": "shared" if shared else "user",
+                    "query": query if shared else None,
+                    "cached_query": entry["query"] if shared else None,
+                    "similarity": round(similarity, 4),
+                    "served_at": time.time()
+                })
+                return {**entry, "entry_id": entry_id, "similarity": similarity}
+            return None
+
+    def store(self,
+              query: str,
+              embedding: List[float],
+              scope: str,
+              documents_version: int,
+              response: str,
+              documents: List[Dict[str, Any]],
+              llm_ms: float) -> Optional[str]:
+        """Cache a reply; replies answered against an outdated documents version are skipped."""
+        with self._lock:
+            if self._documents_version is not None and documents_version < self._documents_version:
+                return None
+            self._check_version(documents_version)
+            if self._indexed() >= 2 * self._entries.max_entries:
+                self._prune_index()
+            entry_id = str(uuid.uuid4())
+            self._entries.set(entry_id, {
+                "query": query,
+                "scope": scope,
+                "response": response,
+                "documents": documents,
+                "llm_ms": llm_ms
+            })
+            self._index.setdefault(scope, {})[entry_id] = self._normalize(embedding)
+            return entry_id
+
+    def report_false_hit(self, entry_id: str) -> bool:
+        """Record that a served entry did not answer the question, and evict it."""
+        with self._lock:
+            entry = self._entries.pop(entry_id)
+            if entry is None:
+                return False
+            self._index.get(entry["scope"], {}).pop(entry_id, None)
+            self.false_hits += 1
+            return True
+
+    def get_audit(self) -> List[Dict[str, Any]]:
+        """Return recent hits, newest first, for reviewing matches near the threshold."""
+        with self._lock:
+            return list(reversed(self._audit))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit ratio, saved LLM time and false-hit counts."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_ratio": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "saved_llm_ms": round(self.saved_llm_ms, 2),
+                "false_hits": self.false_hits,
+                "false_hit_ratio": round(self.false_hits / self.hits, 4) if self.hits else 0.0,
+                "invalidations": self.invalidations,
+                "similarity_threshold": self.similarity_threshold,
+                "evictions": self._entries.evictions,
+                "expirations": self._entries.expirations
+            }
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.services.cache import LRUCache
+from app.services.single_flight import SingleFlight
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when the summary prompt or model changes, so older summaries stop matching
+SUMMARY_FORMAT_VERSION = "1"
+
+def _clean(value: Any) -> Optional[str]:
+    """Trim and collapse whitespace; empty values count as missing."""
+    if value is None:
+        return None
+    text = " ".join(str(value).split())
+    return text or None
+
+def _names(items: Optional[List[Any]]) -> List[str]:
+    names = []
+    for item in items or []:
+        name = _clean(item.get('name') if isinstance(item, dict) else item)
+        if name:
+            names.append(name)
+    return sorted(names)
+
+def plan_hash(plan: Dict[str, Any]) -> str:
+    """Return a stable hash of the parts of a treatment plan that shape its summary.
+
+    Only the diagnosis, treatment and medicine names, next appointment and
+    notes are included; whitespace and list order do not change the hash, so
+    UI-only fields and re-ordering reuse the same summary.
+    """
+    canonical = {
+        "version": SUMMARY_FORMAT_VERSION,
+        "diagnosis": _clean(plan.get('diagnosis')),
+        "treatments": _names(plan.get('selectedTreatments')),
+        "medicines": _names(plan.get('selectedMedicines')),
+        "next_appointment": _clean(plan.get('next_appointment')),
+        "additional_notes": _clean(plan.get('additional_notes'))
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class SummaryCache:
+    """Two-tier cache of treatment-plan summaries keyed by plan_hash.
+
+    Lookups hit an in-process LRU first, then the persisted tier through
+    `load_persisted`, and only then generate. Only summaries produced by
+    `generate` are written back with `save_persisted`, so the persisted tier
+    never holds client-supplied or fallback text. Concurrent requests for the
+    same plan share one generation.
+    """
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 load_persisted: Optional[Callable[[str], Awaitable[Optional[str]]]] = None,
+                 save_persisted: Optional[Callable[[str, str], Awaitable[None]]] = None):
+        self.memory = LRUCache(max_entries=max_entries)
+        self.load_persisted = load_persisted
+        self.save_persisted = save_persisted
+        self.single_flight = SingleFlight()
+        self.persisted_hits = 0
+        self.generated = 0
+
+    async def get_or_create(self, plan: Dict[str, Any], generate: Callable[[], Awaitable[str]]) -> str:
+        """Return the summary for a plan, generating it only when no tier has it."""
+        key = plan_hash(plan)
+        summary = self.memory.get(key)
+        if summary is not None:
+            return summary
+        return await self.single_flight.do(key, lambda: self._load_or_generate(key, generate))
+
+    async def _load_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> str:
+        if self.load_persisted:
+            try:
+                summary = await self.load_persisted(key)
+            except Exception as e:
+                # The persisted tier is an optimisation; fall through to generating
+                logger.warning(f"Error loading persisted summary: {str(e)}")
+                summary = None
+            if summary:
+                self.persisted_hits += 1
+                self.memory.set(key, summary)
+                return summary
+
+        summary = await generate()
+        self.generated += 1
+        self.memory.set(key, summary)
+        if self.save_persisted:
+            try:
+                await self.save_persisted(key, summary)
+            except Exception as e:
+                logger.warning(f"Error saving persisted summary: {str(e)}")
+        return summary
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit counts for each tier and how many summaries were generated."""
+        return {
+            "memory": self.memory.get_stats(),
+            "persisted_hits": self.persisted_hits,
+            "generated": self.generated,
+            "single_flight": self.single_flight.get_stats()
+        }
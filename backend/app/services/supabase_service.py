@@ -1,11 +1,16 @@
 import os
-from typing import Dict, Any, List, Optional
+import asyncio
+import uuid
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
-from supabase import create_client
 import json
 from fastapi import HTTPException
+from postgrest.exceptions import APIError
+from app.services.catalog_cache import CatalogCache
+from app.services.postgrest_pool import PooledPostgrestClient
+from app.services.pagination import encode_cursor, decode_cursor, keyset_filter
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +19,39 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+def _referenced_ids(report: Dict[str, Any], field: str) -> List[str]:
+    """IDs of the catalog items a report's selectedTreatments/selectedMedicines field refers to."""
+    # Unquoted columns come back lower-cased from Postgres
+    items = report.get(field, report.get(field.lower())) or []
+    if isinstance(items, str):
+        try:
+            items = json.loads(items)
+        except ValueError:
+            return []
+    ids = []
+    for item in items if isinstance(items, list) else []:
+        item_id = item.get('id') if isinstance(item, dict) else item
+        if item_id is not None:
+            ids.append(str(item_id))
+    return ids
+
+# SQLSTATEs the stock adjustment functions in supabase_setup.sql raise
+MEDICINE_NOT_FOUND_CODE = 'P0002'
+INSUFFICIENT_STOCK_CODE = '23514'
+
+class StockAdjustmentError(Exception):
+    """Raised when a stock adjustment would take a medicine's stock below zero."""
+
+class MedicineNotFoundError(StockAdjustmentError):
+    """Raised when a stock adjustment names a medicine that does not exist."""
+
+def _raise_stock_adjustment_error(error: APIError):
+    """Re-raise the stock functions' own rejections; other database errors are left to the caller."""
+    if error.code == MEDICINE_NOT_FOUND_CODE:
+        raise MedicineNotFoundError(error.message)
+    if error.code == INSUFFICIENT_STOCK_CODE:
+        raise StockAdjustmentError(error.message)
+
 class SupabaseService:
     def __init__(self):
         try:
@@ -25,28 +63,42 @@ class SupabaseService:
             if not supabase_url or not supabase_key:
                 raise ValueError("Missing Supabase credentials. Check environment variables.")
             
-            # Simplified initialization without proxy parameter
-            self.supabase = create_client(supabase_url, supabase_key)
+            # Async PostgREST client on a shared connection pool, so queries never block the event loop
+            self.db = PooledPostgrestClient(
+                supabase_url,
+                supabase_key,
+                pool_size=int(os.getenv("SUPABASE_POOL_SIZE", "20")),
+                statement_timeout_seconds=float(os.getenv("SUPABASE_STATEMENT_TIMEOUT_SECONDS", "10")),
+                connect_timeout_seconds=float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "5"))
+            )
             logger.info("Supabase client initialized successfully with service role")
             
             # Default hospital ID
             self.hospital_id = 'hospital_dermai_01'
             
+            # Treatment, medicine and doctor catalogs change rarely, so reads are served from memory
+            self.catalog_cache = CatalogCache(
+                ttl_seconds=float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300")),
+                stamp_dir=os.getenv("CATALOG_CACHE_STAMP_DIR") or None
+            )
+            
         except Exception as e:
             logger.error(f"Error initializing Supabase: {str(e)}")
             raise e
 
+    async def close(self):
+        """Close the pooled database connections."""
+        await self.db.aclose()
+
     # Patient Methods
     async def create_patient(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a new patient in the database, or return existing if email exists."""
-        try:
-            # Check for existing patient by email
-            email = patient_data.get('email')
-            if email:
-                existing = self.supabase.table('patients').select('*').eq('email', email).eq('hospital_id', self.hospital_id).execute()
-                if existing.data and len(existing.data) > 0:
-                    return existing.data[0]  # Return existing patient
+        """Create a new patient in the database, or return existing if email exists.
 
+        A new patient costs one upsert. When the email is already taken the
+        upsert returns nothing, so the existing patient is read with a second
+        select; the insert itself stays race-free either way.
+        """
+        try:
             # Prepare the data
             current_time = datetime.now().isoformat()
             new_patient = {
@@ -56,7 +108,21 @@ class SupabaseService:
                 'updated_at': current_time,
                 'status': 'active'
             }
-            result = self.supabase.table('patients').insert(new_patient).execute()
+            # Insert unless (hospital_id, email) already exists, in one statement that concurrent sign-ups cannot race
+            result = await self.db.table('patients')\
+                .upsert(new_patient, on_conflict='hospital_id,email', ignore_duplicates=True)\
+                .execute()
+                
+            if len(result.data) == 0 and patient_data.get('email'):
+                existing = await self.db.table('patients')\
+                    .select('*')\
+                    .eq('email', patient_data['email'])\
+                    .eq('hospital_id', self.hospital_id)\
+                    .execute()
+                    
+                if existing.data:
+                    return existing.data[0]  # Return existing patient
+                    
             if len(result.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to create patient")
             return result.data[0]
@@ -64,10 +130,43 @@ class SupabaseService:
             logger.error(f"Error creating patient: {str(e)}")
             return {"error": str(e)}
 
+    async def import_patients(self, patients: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Insert a batch of patients in one multi-row statement.
+
+        Returns the created record for each input row, in order, or None where a
+        patient with the same email already exists in the hospital.
+        """
+        try:
+            current_time = datetime.now().isoformat()
+            # Every row carries the same columns, as multi-row inserts take their column list from the rows
+            rows = [
+                {
+                    'id': str(uuid.uuid4()),
+                    'name': patient['name'],
+                    'email': patient.get('email'),
+                    'phone': patient.get('phone'),
+                    'hospital_id': self.hospital_id,
+                    'created_at': current_time,
+                    'updated_at': current_time,
+                    'status': 'active'
+                }
+                for patient in patients
+            ]
+            
+            result = await self.db.table('patients')\
+                .upsert(rows, on_conflict='hospital_id,email', ignore_duplicates=True)\
+                .execute()
+                
+            created = {row['id']: row for row in result.data}
+            return [created.get(row['id']) for row in rows]
+        except Exception as e:
+            logger.error(f"Error importing patients: {str(e)}")
+            raise e
+
     async def get_patient(self, patient_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve a patient by ID."""
         try:
-            result = self.supabase.table('patients')\
+            result = await self.db.table('patients')\
                 .select('*')\
                 .eq('id', patient_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -81,31 +180,41 @@ class SupabaseService:
             logger.error(f"Error getting patient: {str(e)}")
             return None
 
-    async def get_all_patients(self) -> List[Dict[str, Any]]:
-        """Retrieve all patients."""
+    async def get_patients_page(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get one page of patients, newest first, and the cursor for the next page (None on the last)."""
         try:
-            logger.info("Fetching all patients from Supabase")
-            logger.info(f"Using hospital_id: {self.hospital_id}")
-            
-            # Build and print the query
-            query = self.supabase.table('patients').select('*').eq('hospital_id', self.hospital_id)
-            logger.info(f"Executing query against Supabase...")
-            
-            # Execute the query
-            result = query.execute()
-            
-            logger.info(f"Query complete. Retrieved {len(result.data)} patients.")
-            
-            # Log each patient ID for debugging
-            for patient in result.data:
-                logger.info(f"Patient found: ID={patient.get('id')}, Name={patient.get('name')}")
+            query = self.db.table('patients')\
+                .select('*')\
+                .eq('hospital_id', self.hospital_id)
                 
-            return result.data
+            if cursor:
+                # Keyset pagination: seek past the last row seen instead of counting an offset
+                query = query.or_(keyset_filter(*decode_cursor(cursor)))
+                
+            # Fetch one extra row to learn whether another page follows
+            result = await query\
+                .order('created_at', desc=True)\
+                .order('id', desc=True)\
+                .limit(limit + 1)\
+                .execute()
+                
+            patients = result.data[:limit]
+            next_cursor = encode_cursor(patients[-1]) if len(result.data) > limit else None
+            return patients, next_cursor
+        except ValueError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting all patients: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            return []
+            logger.error(f"Error getting patients page: {str(e)}")
+            raise e
+
+    async def iter_patients(self, page_size: int = 500, cursor: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every patient, newest first, one keyset page at a time."""
+        while True:
+            patients, cursor = await self.get_patients_page(page_size, cursor)
+            for patient in patients:
+                yield patient
+            if not cursor:
+                return
 
     async def update_patient(self, patient_id: str, patient_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update a patient record."""
@@ -114,7 +223,7 @@ class SupabaseService:
             update_data = {k: v for k, v in patient_data.items() if v is not None}
             update_data['updated_at'] = datetime.now().isoformat()
             
-            result = self.supabase.table('patients')\
+            result = await self.db.table('patients')\
                 .update(update_data)\
                 .eq('id', patient_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -133,7 +242,7 @@ class SupabaseService:
         try:
             logger.info(f"Deleting patient with ID: {patient_id}")
             
-            result = self.supabase.table('patients')\
+            result = await self.db.table('patients')\
                 .delete()\
                 .eq('id', patient_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -160,7 +269,7 @@ class SupabaseService:
             if 'patientId' in new_report:
                 new_report['patientid'] = new_report.pop('patientId')
             # ai_summary and ai_explanation are included if present in report_data
-            result = self.supabase.table('reports').insert(new_report).execute()
+            result = await self.db.table('reports').insert(new_report).execute()
             if len(result.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to create report")
             return result.data[0]['id']
@@ -171,7 +280,7 @@ class SupabaseService:
     async def get_report(self, report_id: str) -> Optional[Dict[str, Any]]:
         """Get a report by ID."""
         try:
-            result = self.supabase.table('reports')\
+            result = await self.db.table('reports')\
                 .select('*')\
                 .eq('id', report_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -185,10 +294,43 @@ class SupabaseService:
             logger.error(f"Error getting report: {str(e)}")
             return None
 
+    async def get_plan_summary(self, summary_hash: str) -> Optional[str]:
+        """Get a summary this server generated for a treatment plan, by its plan hash."""
+        try:
+            result = await self.db.table('plan_summaries')\
+                .select('summary')\
+                .eq('summary_hash', summary_hash)\
+                .eq('hospital_id', self.hospital_id)\
+                .limit(1)\
+                .execute()
+                
+            if len(result.data) == 0:
+                return None
+                
+            return result.data[0].get('summary')
+        except Exception as e:
+            logger.error(f"Error getting plan summary: {str(e)}")
+            return None
+
+    async def save_plan_summary(self, summary_hash: str, summary: str):
+        """Save a generated treatment plan summary under its plan hash."""
+        try:
+            await self.db.table('plan_summaries')\
+                .upsert({
+                    'summary_hash': summary_hash,
+                    'hospital_id': self.hospital_id,
+                    'summary': summary,
+                    'created_at': datetime.now().isoformat()
+                }, on_conflict='hospital_id,summary_hash')\
+                .execute()
+        except Exception as e:
+            logger.error(f"Error saving plan summary: {str(e)}")
+            raise e
+
     async def get_patient_reports(self, patient_id: str) -> List[Dict[str, Any]]:
         """Get all reports for a specific patient."""
         try:
-            result = self.supabase.table('reports')\
+            result = await self.db.table('reports')\
                 .select('*')\
                 .eq('patientid', patient_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -215,21 +357,32 @@ class SupabaseService:
                 'updated_at': current_time
             }
             
-            result = self.supabase.table('treatments').insert(new_treatment).execute()
+            result = await self.db.table('treatments').insert(new_treatment).execute()
             
             if len(result.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to create treatment")
                 
             logger.info(f"Treatment created with ID: {result.data[0]['id']}")
+            self.catalog_cache.invalidate('treatments')
             return result.data[0]
         except Exception as e:
             logger.error(f"Error creating treatment: {str(e)}")
             raise e
 
     async def get_treatment(self, treatment_id: str) -> Optional[Dict[str, Any]]:
-        """Get a treatment by ID."""
+        """Get a treatment by ID, from the cached catalog when it is there."""
+        try:
+            treatment = await self.catalog_cache.get_item('treatments', treatment_id, self._fetch_all_treatments)
+            if treatment:
+                return treatment
+        except Exception as e:
+            logger.warning(f"Error reading treatment catalog: {str(e)}")
+        return await self._fetch_treatment(treatment_id)
+
+    async def _fetch_treatment(self, treatment_id: str) -> Optional[Dict[str, Any]]:
+        """Get a treatment by ID from the database."""
         try:
-            result = self.supabase.table('treatments')\
+            result = await self.db.table('treatments')\
                 .select('*')\
                 .eq('id', treatment_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -244,11 +397,15 @@ class SupabaseService:
             return None
 
     async def get_all_treatments(self) -> List[Dict[str, Any]]:
-        """Get all treatments."""
+        """Get all treatments, through the catalog cache."""
+        return await self.catalog_cache.get_all('treatments', self._fetch_all_treatments)
+
+    async def _fetch_all_treatments(self) -> List[Dict[str, Any]]:
+        """Get all treatments from the database."""
         try:
             logger.info("Fetching all treatments")
             
-            result = self.supabase.table('treatments')\
+            result = await self.db.table('treatments')\
                 .select('*')\
                 .eq('hospital_id', self.hospital_id)\
                 .execute()
@@ -266,7 +423,7 @@ class SupabaseService:
             update_data = {k: v for k, v in treatment_data.items() if v is not None}
             update_data['updated_at'] = datetime.now().isoformat()
             
-            result = self.supabase.table('treatments')\
+            result = await self.db.table('treatments')\
                 .update(update_data)\
                 .eq('id', treatment_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -275,6 +432,7 @@ class SupabaseService:
             if len(result.data) == 0:
                 return None
                 
+            self.catalog_cache.invalidate('treatments')
             return result.data[0]
         except Exception as e:
             logger.error(f"Error updating treatment: {str(e)}")
@@ -283,12 +441,13 @@ class SupabaseService:
     async def delete_treatment(self, treatment_id: str) -> bool:
         """Delete a treatment from the database."""
         try:
-            result = self.supabase.table('treatments')\
+            result = await self.db.table('treatments')\
                 .delete()\
                 .eq('id', treatment_id)\
                 .eq('hospital_id', self.hospital_id)\
                 .execute()
                 
+            self.catalog_cache.invalidate('treatments')
             return True
         except Exception as e:
             logger.error(f"Error deleting treatment: {str(e)}")
@@ -309,21 +468,32 @@ class SupabaseService:
                 'updated_at': current_time
             }
             
-            result = self.supabase.table('medicines').insert(new_medicine).execute()
+            result = await self.db.table('medicines').insert(new_medicine).execute()
             
             if len(result.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to create medicine")
                 
             logger.info(f"Medicine created with ID: {result.data[0]['id']}")
+            self.catalog_cache.invalidate('medicines')
             return result.data[0]
         except Exception as e:
             logger.error(f"Error creating medicine: {str(e)}")
             raise e
 
     async def get_medicine(self, medicine_id: str) -> Optional[Dict[str, Any]]:
-        """Get a medicine by ID."""
+        """Get a medicine by ID, from the cached catalog when it is there."""
+        try:
+            medicine = await self.catalog_cache.get_item('medicines', medicine_id, self._fetch_all_medicines)
+            if medicine:
+                return medicine
+        except Exception as e:
+            logger.warning(f"Error reading medicine catalog: {str(e)}")
+        return await self._fetch_medicine(medicine_id)
+
+    async def _fetch_medicine(self, medicine_id: str) -> Optional[Dict[str, Any]]:
+        """Get a medicine by ID from the database."""
         try:
-            result = self.supabase.table('medicines')\
+            result = await self.db.table('medicines')\
                 .select('*')\
                 .eq('id', medicine_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -338,11 +508,15 @@ class SupabaseService:
             return None
 
     async def get_all_medicines(self) -> List[Dict[str, Any]]:
-        """Get all medicines."""
+        """Get all medicines, through the catalog cache."""
+        return await self.catalog_cache.get_all('medicines', self._fetch_all_medicines)
+
+    async def _fetch_all_medicines(self) -> List[Dict[str, Any]]:
+        """Get all medicines from the database."""
         try:
             logger.info("Fetching all medicines")
             
-            result = self.supabase.table('medicines')\
+            result = await self.db.table('medicines')\
                 .select('*')\
                 .eq('hospital_id', self.hospital_id)\
                 .execute()
@@ -360,7 +534,7 @@ class SupabaseService:
             update_data = {k: v for k, v in medicine_data.items() if v is not None}
             update_data['updated_at'] = datetime.now().isoformat()
             
-            result = self.supabase.table('medicines')\
+            result = await self.db.table('medicines')\
                 .update(update_data)\
                 .eq('id', medicine_id)\
                 .eq('hospital_id', self.hospital_id)\
@@ -369,6 +543,7 @@ class SupabaseService:
             if len(result.data) == 0:
                 return None
                 
+            self.catalog_cache.invalidate('medicines')
             return result.data[0]
         except Exception as e:
             logger.error(f"Error updating medicine: {str(e)}")
@@ -377,40 +552,122 @@ class SupabaseService:
     async def delete_medicine(self, medicine_id: str) -> bool:
         """Delete a medicine from the database."""
         try:
-            result = self.supabase.table('medicines')\
+            result = await self.db.table('medicines')\
                 .delete()\
                 .eq('id', medicine_id)\
                 .eq('hospital_id', self.hospital_id)\
                 .execute()
                 
+            self.catalog_cache.invalidate('medicines')
             return True
         except Exception as e:
             logger.error(f"Error deleting medicine: {str(e)}")
             return False
 
-    async def update_medicine_stock(self, medicine_id: str, quantity: int) -> bool:
-        """Update medicine stock quantity."""
+    async def update_medicine_stock(self, medicine_id: str, quantity: int) -> int:
+        """Adjust medicine stock by quantity and return the new stock.
+
+        Raises MedicineNotFoundError if the medicine does not exist, and
+        StockAdjustmentError if the stock would go negative.
+        """
         try:
-            medicine = await self.get_medicine(medicine_id)
-            if not medicine:
-                return False
-                
-            current_stock = medicine.get('stock', 0)
-            new_stock = current_stock + quantity
+            # A single conditional UPDATE on the server, so concurrent adjustments never lose updates
+            result = await self.db.rpc('adjust_medicine_stock', {
+                'p_hospital_id': self.hospital_id,
+                'p_medicine_id': medicine_id,
+                'p_quantity': quantity
+            }).execute()
+        except APIError as e:
+            _raise_stock_adjustment_error(e)
+            logger.error(f"Error updating medicine stock: {str(e)}")
+            raise e
             
-            if new_stock < 0:
-                return False
-                
-            result = self.supabase.table('medicines')\
-                .update({'stock': new_stock, 'updated_at': datetime.now().isoformat()})\
-                .eq('id', medicine_id)\
-                .eq('hospital_id', self.hospital_id)\
-                .execute()
-                
-            return len(result.data) > 0
+        self.catalog_cache.invalidate('medicines')
+        return result.data
+
+    async def update_medicine_stock_batch(self, adjustments: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Apply many stock adjustments in one transaction; returns the new stock per medicine ID.
+
+        Nothing is applied if any medicine is missing (MedicineNotFoundError) or
+        would go negative (StockAdjustmentError).
+        """
+        try:
+            result = await self.db.rpc('adjust_medicine_stock_batch', {
+                'p_hospital_id': self.hospital_id,
+                'p_adjustments': [
+                    {'medicine_id': adjustment['medicine_id'], 'quantity': adjustment['quantity']}
+                    for adjustment in adjustments
+                ]
+            }).execute()
+        except APIError as e:
+            _raise_stock_adjustment_error(e)
+            logger.error(f"Error updating medicine stock batch: {str(e)}")
+            raise e
+            
+        self.catalog_cache.invalidate('medicines')
+        return {row['medicine_id']: row['new_stock'] for row in result.data}
+
+    # Batch Methods
+    async def get_treatments_by_ids(self, treatment_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get several treatments by ID, in request order; unknown IDs are left out."""
+        return await self._get_catalog_items('treatments', treatment_ids, self._fetch_all_treatments)
+
+    async def get_medicines_by_ids(self, medicine_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get several medicines by ID, in request order; unknown IDs are left out."""
+        return await self._get_catalog_items('medicines', medicine_ids, self._fetch_all_medicines)
+
+    async def _get_catalog_items(self, table: str, item_ids: List[str], load_all) -> List[Dict[str, Any]]:
+        """Serve IDs from the cached catalog and fetch any it lacks with a single `in` query."""
+        item_ids = list(dict.fromkeys(str(item_id) for item_id in item_ids))
+        found = {}
+        try:
+            found = await self.catalog_cache.get_items(table, item_ids, load_all)
         except Exception as e:
-            logger.error(f"Error updating medicine stock: {str(e)}")
-            return False
+            logger.warning(f"Error reading {table} catalog: {str(e)}")
+            
+        missing = [item_id for item_id in item_ids if item_id not in found]
+        if missing:
+            try:
+                result = await self.db.table(table)\
+                    .select('*')\
+                    .in_('id', missing)\
+                    .eq('hospital_id', self.hospital_id)\
+                    .execute()
+                    
+                found.update({row['id']: row for row in result.data})
+            except Exception as e:
+                logger.error(f"Error batch getting {table}: {str(e)}")
+                raise e
+                
+        return [found[item_id] for item_id in item_ids if item_id in found]
+
+    async def expand_report_items(self, reports: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Attach the full treatment and medicine records each report references, looking every ID up once."""
+        treatment_ids = [item_id for report in reports for item_id in _referenced_ids(report, 'selectedTreatments')]
+        medicine_ids = [item_id for report in reports for item_id in _referenced_ids(report, 'selectedMedicines')]
+        treatments, medicines = await asyncio.gather(
+            self.get_treatments_by_ids(treatment_ids),
+            self.get_medicines_by_ids(medicine_ids)
+        )
+        treatments_by_id = {treatment['id']: treatment for treatment in treatments}
+        medicines_by_id = {medicine['id']: medicine for medicine in medicines}
+        
+        for report in reports:
+            report['treatments'] = [
+                treatments_by_id[item_id] for item_id in _referenced_ids(report, 'selectedTreatments')
+                if item_id in treatments_by_id
+            ]
+            report['medicines'] = [
+                medicines_by_id[item_id] for item_id in _referenced_ids(report, 'selectedMedicines')
+                if item_id in medicines_by_id
+            ]
+        return reports
+
+    def referenced_items(self, reports: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """(item_type, item_id) of every catalog item the reports reference, without duplicates."""
+        items = [('treatment', item_id) for report in reports for item_id in _referenced_ids(report, 'selectedTreatments')]
+        items += [('medicine', item_id) for report in reports for item_id in _referenced_ids(report, 'selectedMedicines')]
+        return list(dict.fromkeys(items))
 
     # Doctor Methods
     async def create_doctor(self, hospital_id: str, doctor_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -425,34 +682,39 @@ class SupabaseService:
                 'updated_at': current_time
             }
             
-            result = self.supabase.table('doctors').insert(new_doctor).execute()
+            result = await self.db.table('doctors').insert(new_doctor).execute()
             
             if len(result.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to create doctor")
                 
+            self.catalog_cache.invalidate(f'doctors:{hospital_id}')
             return result.data[0]
         except Exception as e:
             logger.error(f"Error creating doctor: {str(e)}")
             raise e
 
     async def get_all_doctors(self, hospital_id: str) -> List[Dict[str, Any]]:
-        """Get all doctors for a hospital."""
+        """Get all doctors for a hospital, through the catalog cache."""
         try:
-            result = self.supabase.table('doctors')\
-                .select('*')\
-                .eq('hospital_id', hospital_id)\
-                .execute()
-                
-            return result.data
+            return await self.catalog_cache.get_all(f'doctors:{hospital_id}', lambda: self._fetch_all_doctors(hospital_id))
         except Exception as e:
             logger.error(f"Error getting doctors: {str(e)}")
             return []
 
+    async def _fetch_all_doctors(self, hospital_id: str) -> List[Dict[str, Any]]:
+        """Get all doctors for a hospital from the database; errors propagate so they are never cached."""
+        result = await self.db.table('doctors')\
+            .select('*')\
+            .eq('hospital_id', hospital_id)\
+            .execute()
+            
+        return result.data
+
     # Treatment Info Methods
     async def get_treatment_info(self, item_type: str, item_id: str) -> Optional[Dict[str, Any]]:
         """Get treatment info by item type and ID."""
         try:
-            result = self.supabase.table('treatment_info')\
+            result = await self.db.table('treatment_info')\
                 .select('*')\
                 .eq('item_type', item_type)\
                 .eq('item_id', item_id)\
@@ -467,6 +729,23 @@ class SupabaseService:
             logger.error(f"Error getting treatment info: {str(e)}")
             return None
 
+    async def get_treatment_infos(self, items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Get the treatment info for several (item_type, item_id) pairs with one `in` query."""
+        if not items:
+            return []
+        try:
+            result = await self.db.table('treatment_info')\
+                .select('*')\
+                .in_('item_id', list({item_id for _, item_id in items}))\
+                .eq('hospital_id', self.hospital_id)\
+                .execute()
+                
+            wanted = set(items)
+            return [row for row in result.data if (row.get('item_type'), str(row.get('item_id'))) in wanted]
+        except Exception as e:
+            logger.error(f"Error getting treatment infos: {str(e)}")
+            return []
+
     async def create_treatment_info(self, treatment_info_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new treatment info entry."""
         try:
@@ -479,7 +758,7 @@ class SupabaseService:
                 'updated_at': current_time
             }
             
-            result = self.supabase.table('treatment_info').insert(new_treatment_info).execute()
+            result = await self.db.table('treatment_info').insert(new_treatment_info).execute()
             
             if len(result.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to create treatment info")
@@ -489,6 +768,27 @@ class SupabaseService:
             logger.error(f"Error creating treatment info: {str(e)}")
             raise e
 
+    async def upsert_treatment_info(self, treatment_info_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create or replace the treatment info for an item in a single round trip."""
+        try:
+            row = {
+                **treatment_info_data,
+                'hospital_id': self.hospital_id,
+                'updated_at': datetime.now().isoformat()
+            }
+            
+            result = await self.db.table('treatment_info')\
+                .upsert(row, on_conflict='item_type,item_id')\
+                .execute()
+            
+            if len(result.data) == 0:
+                raise HTTPException(status_code=500, detail="Failed to save treatment info")
+                
+            return result.data[0]
+        except Exception as e:
+            logger.error(f"Error upserting treatment info: {str(e)}")
+            raise e
+
     async def update_treatment_info(self, item_type: str, item_id: str, explanation: str) -> Optional[Dict[str, Any]]:
         """Update treatment info explanation."""
         try:
@@ -497,7 +797,7 @@ class SupabaseService:
                 'updated_at': datetime.now().isoformat()
             }
             
-            result = self.supabase.table('treatment_info')\
+            result = await self.db.table('treatment_info')\
                 .update(update_data)\
                 .eq('item_type', item_type)\
                 .eq('item_id', item_id)\
@@ -510,4 +810,23 @@ class SupabaseService:
             return result.data[0]
         except Exception as e:
             logger.error(f"Error updating treatment info: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+    # Reminder Methods
+    async def create_reminder(self, reminder_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a scheduled reminder."""
+        try:
+            reminder = {
+                **reminder_data,
+                'created_at': datetime.now().isoformat()
+            }
+            
+            result = await self.db.table('reminders').insert(reminder).execute()
+            
+            if len(result.data) == 0:
+                raise HTTPException(status_code=500, detail="Failed to create reminder")
+                
+            return result.data[0]
+        except Exception as e:
+            logger.error(f"Error creating reminder: {str(e)}")
+            raise e
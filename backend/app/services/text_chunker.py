@@ -0,0 +1,167 @@
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Whitespace-delimited words; very long runs without whitespace are split so buffers stay bounded
+_WORD = re.compile(r"\S{1,256}")
+
+class TextChunker:
+    """Token-aware splitter that cuts text into overlapping chunks on word boundaries.
+
+    Token counts come from the embedding model's tokenizer when one is given
+    (a word-piece tokenizer counts each whitespace-delimited word
+    independently), otherwise from a characters-per-token estimate.
+    """
+
+    def __init__(self, chunk_tokens: int = 200, overlap_tokens: int = 40, tokenizer: Optional[Any] = None):
+        if chunk_tokens < 1:
+            raise ValueError("chunk_tokens must be at least 1")
+        if not 0 <= overlap_tokens < chunk_tokens:
+            raise ValueError("overlap_tokens must be between 0 and chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = tokenizer
+
+    def count_tokens(self, words: List[str]) -> List[int]:
+        """Return the token count of each word."""
+        if not words:
+            return []
+        if self.tokenizer is not None:
+            encoded = self.tokenizer(words, add_special_tokens=False)["input_ids"]
+            return [max(1, len(ids)) for ids in encoded]
+        return [max(1, (len(word) + 3) // 4) for word in words]
+
+    def chunk(self, text: str) -> List[Dict[str, Any]]:
+        """Split a complete text into chunks."""
+        return list(self.iter_chunks([text]))
+
+    def iter_chunks(self, pieces: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Split text arriving as successive pieces, yielding chunks as soon as they are complete."""
+        stream = self.stream()
+        for piece in pieces:
+            yield from stream.feed(piece)
+        yield from stream.finish()
+
+    def stream(self) -> "ChunkStream":
+        """Start an incremental chunking session."""
+        return ChunkStream(self)
+
+class ChunkStream:
+    """Incremental state for TextChunker; holds only the current window and a partial word."""
+
+    def __init__(self, chunker: TextChunker):
+        self.chunker = chunker
+        self._pending = ""
+        self._pending_start = 0
+        self._scan = 0
+        self._window = deque()
+        self._window_tokens = 0
+        self._window_has_new = False
+        self._index = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add text and return any chunks completed by it."""
+        self._pending += text
+        return self._consume(final=False)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Flush the remaining text as the final chunk."""
+        chunks = self._consume(final=True)
+        if self._window_has_new:
+            chunks.append(self._emit())
+        self._window.clear()
+        self._window_tokens = 0
+        self._window_has_new = False
+        return chunks
+
+    def _consume(self, final: bool) -> List[Dict[str, Any]]:
+        matches = list(_WORD.finditer(self._pending, self._scan))
+        # A word touching the end of the buffer may continue in the next piece
+        if not final and matches and matches[-1].end() == len(self._pending):
+            matches.pop()
+
+        chunks = []
+        token_counts = self.chunker.count_tokens([match.group() for match in matches])
+        for match, tokens in zip(matches, token_counts):
+            start = self._pending_start + match.start()
+            end = self._pending_start + match.end()
+            if self._window and self._window_tokens + tokens > self.chunker.chunk_tokens:
+                if self._window_has_new:
+                    # Whatever separated the chunk from the next word, so merging can restore it
+                    separator = self._pending[self._window[-1][1] - self._pending_start:match.start()]
+                    chunks.append(self._emit(separator))
+                self._retain_overlap(tokens)
+            self._window.append((start, end, tokens))
+            self._window_tokens += tokens
+            self._window_has_new = True
+
+        if matches:
+            self._scan = matches[-1].end()
+        self._trim()
+        return chunks
+
+    def _retain_overlap(self, incoming_tokens: int):
+        """Keep the trailing words of the emitted chunk as overlap for the next one."""
+        while self._window and (self._window_tokens > self.chunker.overlap_tokens
+                                or self._window_tokens + incoming_tokens > self.chunker.chunk_tokens):
+            _, _, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+        self._window_has_new = False
+
+    def _emit(self, separator: str = "") -> Dict[str, Any]:
+        start = self._window[0][0]
+        end = self._window[-1][1]
+        chunk = {
+            "index": self._index,
+            "text": self._pending[start - self._pending_start:end - self._pending_start],
+            "start_char": start,
+            "end_char": end,
+            "token_count": self._window_tokens,
+            "separator": separator
+        }
+        self._index += 1
+        return chunk
+
+    def _trim(self):
+        """Drop buffered text that no longer belongs to the window or a partial word."""
+        keep_from = self._scan
+        if self._window:
+            keep_from = min(keep_from, self._window[0][0] - self._pending_start)
+        if keep_from > 0:
+            self._pending = self._pending[keep_from:]
+            self._pending_start += keep_from
+            self._scan -= keep_from
+
+def merge_chunks(chunks: List[Dict[str, Any]]) -> str:
+    """Join chunks of one document in order, removing the overlap between neighbours.
+
+    Each chunk needs `content` and `metadata` with `chunk_index`, `start_char`
+    and `end_char`. Neighbours that do not overlap are joined with the
+    `separator` the chunker recorded after the first of them (a space for
+    chunks stored without one). Gaps between non-consecutive chunks become an
+    ellipsis line.
+    """
+    ordered = sorted(chunks, key=lambda chunk: chunk["metadata"].get("chunk_index", 0))
+    parts = []
+    previous_index = None
+    previous_separator = " "
+    covered_to = 0
+    for chunk in ordered:
+        index = chunk["metadata"].get("chunk_index", 0)
+        start = chunk["metadata"].get("start_char", 0)
+        end = chunk["metadata"].get("end_char", start + len(chunk["content"]))
+        text = chunk["content"]
+        if previous_index is not None:
+            if end <= covered_to:
+                continue
+            if start < covered_to:
+                text = text[covered_to - start:]
+            elif index == previous_index + 1:
+                parts.append(previous_separator)
+            else:
+                parts.append("\n...\n")
+        parts.append(text)
+        previous_index = index
+        previous_separator = chunk["metadata"].get("separator", " ")
+        covered_to = end
+    return "".join(parts)
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import jwt
+from jwt import PyJWKClient
+
+from app.services.cache import LRUCache
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Asymmetric algorithms Supabase signs access tokens with
+JWKS_ALGORITHMS = ("RS256", "ES256")
+
+class TokenVerifier:
+    """Verifies Supabase access tokens and remembers the claims until each token expires.
+
+    Tokens signed with the project's shared secret (HS256) are checked against
+    `jwt_secret`; asymmetrically signed tokens are checked against the project's
+    JWKS, whose keys PyJWKClient caches locally. A token seen before costs a
+    dictionary lookup until its `exp`.
+    """
+
+    def __init__(self, jwt_secret: Optional[str] = None, jwks_url: Optional[str] = None,
+                 audience: Optional[str] = "authenticated", max_entries: int = 10000,
+                 leeway_seconds: float = 30.0, jwks_cache_seconds: int = 3600):
+        if not jwt_secret and not jwks_url:
+            raise ValueError("TokenVerifier needs a JWT secret or a JWKS URL")
+        if jwks_url and not jwks_url.startswith(("https://", "http://")):
+            raise ValueError(f"JWKS URL must be absolute: {jwks_url}")
+        self.jwt_secret = jwt_secret
+        self.audience = audience
+        self.leeway_seconds = leeway_seconds
+        self.jwks_client = PyJWKClient(jwks_url, cache_keys=True, lifespan=jwks_cache_seconds) if jwks_url else None
+        self._claims = LRUCache(max_entries=max_entries)
+        self.verifications = 0
+
+    def _token_key(self, token: str) -> str:
+        # Cache by digest so raw tokens are not kept in memory
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Return the token's claims.
+
+        Raises jwt.PyJWKClientError if the signing keys cannot be fetched, and
+        another jwt.PyJWTError if the token is invalid or expired.
+        """
+        key = self._token_key(token)
+        claims = self._claims.get(key)
+        if claims is not None:
+            if claims["exp"] > time.time():
+                return claims
+            self._claims.pop(key)
+
+        claims = await self._decode(token)
+        self.verifications += 1
+        self._claims.set(key, claims, ttl_seconds=max(0.0, claims["exp"] - time.time()))
+        return claims
+
+    async def _decode(self, token: str) -> Dict[str, Any]:
+        algorithm = jwt.get_unverified_header(token).get("alg")
+        if algorithm == "HS256":
+            if not self.jwt_secret:
+                raise jwt.InvalidTokenError("HS256 tokens are not accepted without a JWT secret")
+            signing_key = self.jwt_secret
+        elif algorithm in JWKS_ALGORITHMS and self.jwks_client:
+            # The key fetch is blocking I/O on a cold cache, so keep it off the event loop
+            signing_key = (await asyncio.to_thread(self.jwks_client.get_signing_key_from_jwt, token)).key
+        else:
+            raise jwt.InvalidTokenError(f"Unsupported token algorithm: {algorithm}")
+
+        return jwt.decode(
+            token,
+            signing_key,
+            algorithms=[algorithm],
+            audience=self.audience,
+            leeway=self.leeway_seconds,
+            options={"require": ["exp", "sub"], "verify_aud": self.audience is not None}
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return claims cache hit and miss counts."""
+        return {**self._claims.get_stats(), "verifications": self.verifications}
@@ -0,0 +1,81 @@
+import codecs
+import hashlib
+import logging
+import os
+import tempfile
+from typing import AsyncIterator
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", str(64 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+class SpooledUpload:
+    """An upload copied to a temporary file, with its size and content hash."""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    async def remove(self):
+        """Delete the spooled file."""
+        try:
+            await aiofiles.os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+async def spool_upload(file: UploadFile,
+                       max_bytes: int = UPLOAD_MAX_BYTES,
+                       block_size: int = UPLOAD_BLOCK_SIZE) -> SpooledUpload:
+    """Copy an upload to disk in fixed-size blocks, enforcing the size limit as it streams."""
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=UPLOAD_SPOOL_DIR)
+    os.close(fd)
+
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        async with aiofiles.open(path, "wb") as spool:
+            while True:
+                block = await file.read(block_size)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum size is {max_bytes} bytes"
+                    )
+                digest.update(block)
+                await spool.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return SpooledUpload(path, size, digest.hexdigest())
+
+async def iter_text(path: str,
+                    encoding: str = "utf-8",
+                    block_size: int = UPLOAD_BLOCK_SIZE,
+                    errors: str = "strict") -> AsyncIterator[str]:
+    """Read a file in blocks and decode it incrementally, so multi-byte characters may span blocks."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    async with aiofiles.open(path, "rb") as source:
+        while True:
+            block = await source.read(block_size)
+            if not block:
+                break
+            text = decoder.decode(block)
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
@@ -1,12 +1,23 @@
 import os
 import logging
 import uuid
-from typing import List, Dict, Any, Optional
+import tempfile
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 import json
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.blocking_executor import BlockingExecutor
+from app.services.embedding_cache import EmbeddingCache
+from app.services.text_chunker import TextChunker, merge_chunks
+from app.services.version_stamp import VersionStamp
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Metadata keys that describe a chunk rather than its parent document
+CHUNK_METADATA_KEYS = ("parent_id", "chunk_index", "start_char", "end_char", "separator")
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -24,8 +35,55 @@ class VectorDBService:
                 )
             )
             
-            # Initialize sentence transformer for embeddings
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            # Encodes and Chroma calls block, so they run on a bounded executor instead of the event loop
+            self.executor = BlockingExecutor(
+                max_workers=int(os.getenv("VECTOR_DB_EXECUTOR_WORKERS", "4")),
+                model_name=EMBEDDING_MODEL_NAME,
+                use_process_pool=os.getenv("EMBEDDING_PROCESS_POOL", "false").lower() == "true",
+                process_workers=int(os.getenv("EMBEDDING_PROCESS_WORKERS", "1"))
+            )
+            
+            # Initialize sentence transformer for embeddings, unless encoder processes hold the only copies
+            if self.executor.process_pool is None:
+                self.embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                max_seq_length, tokenizer = self.embedding_model.max_seq_length, self.embedding_model.tokenizer
+            else:
+                self.embedding_model = None
+                max_seq_length, tokenizer = self.executor.encoder_limits()
+            
+            # Concurrent embedding requests are grouped into batched encode calls
+            self.embedding_batcher = EmbeddingBatcher(
+                self._encode_batch,
+                max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32")),
+                max_wait_ms=float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+            )
+            
+            # Repeated texts are served from the cache instead of being re-encoded
+            self.embedding_cache = EmbeddingCache(
+                EMBEDDING_MODEL_NAME,
+                max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000")),
+                db_path=os.getenv("EMBEDDING_CACHE_DB_PATH") or None,
+                run_blocking=self.executor.run
+            )
+            
+            # Documents are stored as overlapping chunks that fit the model's input window
+            max_chunk_tokens = max_seq_length - 2
+            self.chunker = TextChunker(
+                chunk_tokens=min(int(os.getenv("DOCUMENT_CHUNK_TOKENS", "200")), max_chunk_tokens),
+                overlap_tokens=int(os.getenv("DOCUMENT_CHUNK_OVERLAP_TOKENS", "40")),
+                tokenizer=tokenizer
+            )
+            
+            # Maximum rows per Chroma add call for bulk writes
+            self.write_batch_size = int(os.getenv("VECTOR_DB_WRITE_BATCH_SIZE", "1000"))
+            
+            # Bumped on every document write or delete so caches of answers, in any worker, can tell they are stale
+            self.documents_stamp = VersionStamp(
+                os.getenv("DOCUMENTS_VERSION_STAMP_PATH") or os.path.join(tempfile.gettempdir(), "derma-documents-version.stamp")
+            )
+            
+            # Chunk hits fetched per requested document when collapsing search results
+            self.collapse_overfetch = int(os.getenv("SEARCH_COLLAPSE_OVERFETCH", "4"))
             
             # Get or create collections
             self.documents_collection = self.client.get_or_create_collection(
@@ -44,76 +102,222 @@ class VectorDBService:
             logger.error(f"Error initializing VectorDBService: {str(e)}")
             raise e
 
-    def _generate_embedding(self, text: str) -> List[float]:
+    @property
+    def documents_version(self) -> int:
+        """Version of the document collection, shared by every worker on the host."""
+        return self.documents_stamp.current()
+
+    def _encode_batch_sync(self, texts: List[str]) -> List[List[float]]:
+        """Encode a batch of texts in a single sentence transformer call."""
+        embeddings = self.embedding_model.encode(texts, batch_size=len(texts))
+        return embeddings.tolist()
+
+    async def _encode_batch(self, texts: List[str]) -> List[List[float]]:
+        """Encode a batch of texts on the executor."""
+        return await self.executor.run_encode(self._encode_batch_sync, texts)
+
+    async def _generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for text using sentence transformer."""
+        return (await self._generate_embeddings([text]))[0]
+
+    async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts, serving repeats from the cache."""
         try:
-            embedding = self.embedding_model.encode(text)
-            return embedding.tolist()
+            embeddings = await self.embedding_cache.get_many(texts)
+            
+            # Encode each distinct uncached text once, batched with any concurrent requests
+            missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+            if missing:
+                encoded = await self.embedding_batcher.embed_many(missing)
+                await self.embedding_cache.put_many(missing, encoded)
+                by_text = dict(zip(missing, encoded))
+                embeddings = [by_text[text] if embedding is None else embedding
+                              for text, embedding in zip(texts, embeddings)]
+            
+            return embeddings
         except Exception as e:
-            logger.error(f"Error generating embedding: {str(e)}")
+            logger.error(f"Error generating embeddings: {str(e)}")
             raise e
 
+    async def embed_text(self, text: str) -> List[float]:
+        """Return the embedding of a text, from the cache when it was embedded recently."""
+        return await self._generate_embedding(text)
+
+    def _chunk_rows(self,
+                    parent_id: str,
+                    chunks: List[Dict[str, Any]],
+                    metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Build Chroma rows for a document's chunks, each linked back to its parent."""
+        return [{
+            "id": f"{parent_id}#{chunk['index']}",
+            "content": chunk['text'],
+            "metadata": {
+                **metadata,
+                "parent_id": parent_id,
+                "chunk_index": chunk['index'],
+                "start_char": chunk['start_char'],
+                "end_char": chunk['end_char'],
+                "separator": chunk.get('separator', "")
+            }
+        } for chunk in chunks]
+
+    async def _write_rows(self, rows: List[Dict[str, Any]]):
+        """Embed rows and add them to the documents collection in chunked add calls."""
+        for start in range(0, len(rows), self.write_batch_size):
+            window = rows[start:start + self.write_batch_size]
+            embeddings = await self._generate_embeddings([row['content'] for row in window])
+            await self.executor.run(
+                self.documents_collection.add,
+                embeddings=embeddings,
+                documents=[row['content'] for row in window],
+                metadatas=[row['metadata'] for row in window],
+                ids=[row['id'] for row in window]
+            )
+            self.documents_stamp.bump()
+
+    def _document_rows(self, content: str, metadata: Dict[str, Any], document_type: str, created_at: str) -> tuple:
+        """Chunk a document and return its new parent ID with the rows to store."""
+        doc_id = str(uuid.uuid4())
+        chunks = self.chunker.chunk(content) or [
+            {"index": 0, "text": content, "start_char": 0, "end_char": len(content)}
+        ]
+        doc_metadata = {
+            **metadata,
+            "document_type": document_type,
+            "created_at": created_at,
+            "content_length": len(content)
+        }
+        return doc_id, self._chunk_rows(doc_id, chunks, doc_metadata)
+
     async def add_document(self, 
                           content: str, 
                           metadata: Dict[str, Any], 
                           document_type: str = "medical_document") -> str:
-        """Add a document to the vector database."""
+        """Add a document to the vector database as embedded chunks under one parent ID."""
         try:
-            # Generate unique ID
-            doc_id = str(uuid.uuid4())
+            doc_id, rows = self._document_rows(content, metadata, document_type, datetime.now().isoformat())
+            await self._write_rows(rows)
             
-            # Generate embedding
-            embedding = self._generate_embedding(content)
+            logger.info(f"Document added successfully with ID: {doc_id} ({len(rows)} chunks)")
+            return doc_id
             
-            # Prepare metadata
-            doc_metadata = {
-                **metadata,
-                "document_type": document_type,
-                "created_at": datetime.now().isoformat(),
-                "content_length": len(content)
-            }
+        except Exception as e:
+            logger.error(f"Error adding document: {str(e)}")
+            raise e
+
+    async def add_document_stream(self,
+                                  pieces: AsyncIterator[str],
+                                  metadata: Dict[str, Any],
+                                  document_type: str = "medical_document") -> str:
+        """Add a document whose text arrives incrementally.
+        
+        Text is chunked as it streams in and chunks are embedded and stored in
+        windows, so memory use does not grow with document size. If the stream
+        fails, chunks already written are removed.
+        """
+        doc_id = str(uuid.uuid4())
+        doc_metadata = {
+            **metadata,
+            "document_type": document_type,
+            "created_at": datetime.now().isoformat()
+        }
+        stream = self.chunker.stream()
+        rows = []
+        chunk_count = 0
+        try:
+            async for piece in pieces:
+                rows.extend(self._chunk_rows(doc_id, stream.feed(piece), doc_metadata))
+                if len(rows) >= self.write_batch_size:
+                    await self._write_rows(rows)
+                    chunk_count += len(rows)
+                    rows = []
             
-            # Add to collection
-            self.documents_collection.add(
-                embeddings=[embedding],
-                documents=[content],
-                metadatas=[doc_metadata],
-                ids=[doc_id]
-            )
+            rows.extend(self._chunk_rows(doc_id, stream.finish(), doc_metadata))
+            if not rows and chunk_count == 0:
+                rows = self._chunk_rows(doc_id, [{"index": 0, "text": "", "start_char": 0, "end_char": 0}], doc_metadata)
+            await self._write_rows(rows)
+            chunk_count += len(rows)
             
-            logger.info(f"Document added successfully with ID: {doc_id}")
+            logger.info(f"Document streamed successfully with ID: {doc_id} ({chunk_count} chunks)")
             return doc_id
             
         except Exception as e:
-            logger.error(f"Error adding document: {str(e)}")
+            logger.error(f"Error adding streamed document: {str(e)}")
+            await self.delete_document(doc_id)
+            raise e
+
+    async def add_documents(self, documents: List[Dict[str, Any]]) -> List[str]:
+        """Add many documents, embedding their chunks together and writing in chunked add calls.
+        
+        Each item needs `content` and may carry `metadata` and `document_type`.
+        Returns the new parent document IDs in input order.
+        """
+        try:
+            if not documents:
+                return []
+            
+            created_at = datetime.now().isoformat()
+            doc_ids = []
+            rows = []
+            for doc in documents:
+                doc_id, doc_rows = self._document_rows(
+                    doc['content'],
+                    doc.get('metadata') or {},
+                    doc.get('document_type') or "medical_document",
+                    created_at
+                )
+                doc_ids.append(doc_id)
+                rows.extend(doc_rows)
+            
+            await self._write_rows(rows)
+            
+            logger.info(f"Added {len(doc_ids)} documents in bulk ({len(rows)} chunks)")
+            return doc_ids
+            
+        except Exception as e:
+            logger.error(f"Error adding documents in bulk: {str(e)}")
             raise e
 
     async def search_documents(self, 
                               query: str, 
                               n_results: int = 5, 
-                              filter_metadata: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """Search for relevant documents based on query."""
+                              filter_metadata: Optional[Dict[str, Any]] = None,
+                              collapse: bool = False) -> List[Dict[str, Any]]:
+        """Search for relevant documents based on query.
+        
+        Returns the best matching chunks, or with `collapse` one result per parent
+        document holding its matched chunks in document order.
+        """
         try:
             # Generate query embedding
-            query_embedding = self._generate_embedding(query)
+            query_embedding = await self._generate_embedding(query)
+            
+            # Over-fetch chunks when collapsing, since several may belong to the same parent
+            n_chunks = n_results * self.collapse_overfetch if collapse else n_results
             
             # Search in collection
-            results = self.documents_collection.query(
+            results = await self.executor.run(
+                self.documents_collection.query,
                 query_embeddings=[query_embedding],
-                n_results=n_results,
+                n_results=n_chunks,
                 where=filter_metadata
             )
             
             # Format results
             formatted_results = []
             for i in range(len(results['ids'][0])):
+                metadata = results['metadatas'][0][i]
                 formatted_results.append({
                     'id': results['ids'][0][i],
+                    'parent_id': metadata.get('parent_id', results['ids'][0][i]),
                     'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
+                    'metadata': metadata,
                     'distance': results['distances'][0][i] if 'distances' in results else None
                 })
             
+            if collapse:
+                formatted_results = self._collapse_chunks(formatted_results)[:n_results]
+            
             logger.info(f"Found {len(formatted_results)} relevant documents")
             return formatted_results
             
@@ -121,6 +325,25 @@ class VectorDBService:
             logger.error(f"Error searching documents: {str(e)}")
             raise e
 
+    def _collapse_chunks(self, chunk_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group chunk hits by parent document, ordered by each parent's best distance."""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for result in chunk_results:
+            grouped.setdefault(result['parent_id'], []).append(result)
+        
+        collapsed = []
+        for parent_id, chunks in grouped.items():
+            best = chunks[0]
+            collapsed.append({
+                'id': parent_id,
+                'parent_id': parent_id,
+                'content': merge_chunks(chunks),
+                'metadata': {k: v for k, v in best['metadata'].items() if k not in CHUNK_METADATA_KEYS},
+                'distance': best['distance'],
+                'matched_chunks': len(chunks)
+            })
+        return collapsed
+
     async def add_chat_message(self, 
                               user_id: str, 
                               message: str, 
@@ -133,7 +356,7 @@ class VectorDBService:
             
             # Combine message and response for embedding
             combined_text = f"User: {message}\nAssistant: {response}"
-            embedding = self._generate_embedding(combined_text)
+            embedding = await self._generate_embedding(combined_text)
             
             # Prepare metadata
             metadata = {
@@ -146,7 +369,8 @@ class VectorDBService:
             }
             
             # Add to chat history collection
-            self.chat_history_collection.add(
+            await self.executor.run(
+                self.chat_history_collection.add,
                 embeddings=[embedding],
                 documents=[combined_text],
                 metadatas=[metadata],
@@ -160,6 +384,42 @@ class VectorDBService:
             logger.error(f"Error adding chat message: {str(e)}")
             raise e
 
+    async def add_chat_messages(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """Add several chat exchanges with one grouped embedding and one add call.
+        
+        Each message needs `id`, `user_id`, `session_id`, `message`, `response`
+        and `created_at`. Exchanges are embedded by their user message, which
+        retrieval has already embedded for the same turn, so those vectors come
+        from the embedding cache instead of a new encode.
+        """
+        try:
+            if not messages:
+                return []
+            
+            embeddings = await self._generate_embeddings([msg['message'] for msg in messages])
+            
+            await self.executor.run(
+                self.chat_history_collection.add,
+                embeddings=embeddings,
+                documents=[f"User: {msg['message']}\nAssistant: {msg['response']}" for msg in messages],
+                metadatas=[{
+                    "user_id": msg['user_id'],
+                    "session_id": msg['session_id'],
+                    "message": msg['message'],
+                    "response": msg['response'],
+                    "created_at": msg['created_at'],
+                    "message_type": "chat"
+                } for msg in messages],
+                ids=[msg['id'] for msg in messages]
+            )
+            
+            logger.info(f"Added {len(messages)} chat messages")
+            return [msg['id'] for msg in messages]
+            
+        except Exception as e:
+            logger.error(f"Error adding chat messages: {str(e)}")
+            raise e
+
     async def get_chat_history(self, 
                               user_id: str, 
                               session_id: Optional[str] = None, 
@@ -172,7 +432,8 @@ class VectorDBService:
                 where_filter["session_id"] = session_id
             
             # Get chat history
-            results = self.chat_history_collection.get(
+            results = await self.executor.run(
+                self.chat_history_collection.get,
                 where=where_filter,
                 limit=limit
             )
@@ -197,9 +458,16 @@ class VectorDBService:
             raise e
 
     async def delete_document(self, document_id: str) -> bool:
-        """Delete a document from the vector database."""
+        """Delete a document and all of its chunks, given the document's ID or the ID of any of its chunks."""
         try:
-            self.documents_collection.delete(ids=[document_id])
+            # Search results name chunks by default, so resolve a chunk ID to its parent document
+            stored = await self.executor.run(self.documents_collection.get, ids=[document_id], include=["metadatas"])
+            if stored['ids']:
+                document_id = (stored['metadatas'][0] or {}).get('parent_id') or document_id
+            # Documents stored before chunking are a single row keyed by their own ID
+            await self.executor.run(self.documents_collection.delete, ids=[document_id])
+            await self.executor.run(self.documents_collection.delete, where={"parent_id": document_id})
+            self.documents_stamp.bump()
             logger.info(f"Document deleted successfully: {document_id}")
             return True
         except Exception as e:
@@ -207,17 +475,31 @@ class VectorDBService:
             return False
 
     async def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
-        """Get a specific document by ID."""
+        """Get a specific document by ID, reassembled from its chunks."""
         try:
-            results = self.documents_collection.get(ids=[document_id])
+            results = await self.executor.run(self.documents_collection.get, ids=[document_id])
+            
+            if results['ids']:
+                return {
+                    'id': results['ids'][0],
+                    'content': results['documents'][0],
+                    'metadata': results['metadatas'][0]
+                }
+            
+            results = await self.executor.run(self.documents_collection.get, where={"parent_id": document_id})
             
             if not results['ids']:
                 return None
             
+            chunks = [
+                {'content': content, 'metadata': metadata}
+                for content, metadata in zip(results['documents'], results['metadatas'])
+            ]
             return {
-                'id': results['ids'][0],
-                'content': results['documents'][0],
-                'metadata': results['metadatas'][0]
+                'id': document_id,
+                'content': merge_chunks(chunks),
+                'metadata': {k: v for k, v in chunks[0]['metadata'].items() if k not in CHUNK_METADATA_KEYS},
+                'chunk_count': len(chunks)
             }
             
         except Exception as e:
@@ -227,13 +509,15 @@ class VectorDBService:
     async def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the collections."""
         try:
-            doc_count = self.documents_collection.count()
-            chat_count = self.chat_history_collection.count()
+            doc_count = await self.executor.run(self.documents_collection.count)
+            chat_count = await self.executor.run(self.chat_history_collection.count)
             
             return {
                 "documents_count": doc_count,
                 "chat_messages_count": chat_count,
-                "total_items": doc_count + chat_count
+                "total_items": doc_count + chat_count,
+                "embedding_batcher": self.embedding_batcher.get_stats(),
+                "embedding_cache": await self.embedding_cache.get_stats()
             }
             
         except Exception as e:
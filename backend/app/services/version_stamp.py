@@ -0,0 +1,54 @@
+import logging
+import os
+import time
+import uuid
+from typing import Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class VersionStamp:
+    """Increasing version number kept in a file, shared by every worker on the host.
+
+    `bump` writes a new, larger number with an atomic replace; `current`
+    reads it back, so a change made in one worker is seen by the others on
+    their next read. The value is kept in memory and the file is only read
+    again when a stat shows it was replaced, like CatalogCache's stamps.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._stat: Optional[Tuple[int, int]] = None
+        self._version = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def current(self) -> int:
+        """Return the latest version, or 0 if it was never bumped."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        # Each bump replaces the file, changing its inode
+        key = (stat.st_ino, stat.st_mtime_ns)
+        if key != self._stat:
+            try:
+                with open(self.path) as stamp:
+                    self._version = int(stamp.read() or 0)
+            except (FileNotFoundError, ValueError):
+                return 0
+            self._stat = key
+        return self._version
+
+    def bump(self) -> int:
+        """Move to a new version larger than the current one and return it."""
+        # Nanosecond clock keeps versions increasing across workers without a lock
+        version = max(time.time_ns(), self.current() + 1)
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w") as stamp:
+                stamp.write(str(version))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Error writing version stamp {self.path}: {str(e)}")
+        return version
@@ -31,11 +31,17 @@ CREATE TABLE IF NOT EXISTS reports (
     selectedTreatments JSONB,
     selectedMedicines JSONB,
     doctor TEXT,
+    ai_summary TEXT,
+    ai_explanation TEXT,
     isActive BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Summary columns for reports tables created before they were added to the definition above
+ALTER TABLE reports ADD COLUMN IF NOT EXISTS ai_summary TEXT;
+ALTER TABLE reports ADD COLUMN IF NOT EXISTS ai_explanation TEXT;
+
 -- Create treatments table
 CREATE TABLE IF NOT EXISTS treatments (
     id TEXT PRIMARY KEY,
@@ -93,8 +99,42 @@ CREATE TABLE IF NOT EXISTS doctors (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Treatment plan summaries generated by the server, keyed by plan hash. Only the
+-- server writes here, so summaries a client sent or a doctor edited are never reused.
+CREATE TABLE IF NOT EXISTS plan_summaries (
+    hospital_id TEXT NOT NULL,
+    summary_hash TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (hospital_id, summary_hash)
+);
+
 -- Create indexes for better query performance
 CREATE INDEX IF NOT EXISTS idx_patients_hospital_id ON patients(hospital_id);
+-- Databases created before the unique index may hold duplicate emails (the old select-then-insert
+-- could race), which would make the index fail. Keep the oldest patient per (hospital_id, email),
+-- move the duplicates' reports onto it, then delete the duplicates. Both steps are no-ops once clean.
+WITH ranked AS (
+    SELECT id, FIRST_VALUE(id) OVER (PARTITION BY hospital_id, email ORDER BY created_at, id) AS keep_id
+    FROM patients
+    WHERE email IS NOT NULL
+)
+UPDATE reports SET patientId = ranked.keep_id
+FROM ranked
+WHERE reports.patientId = ranked.id AND ranked.id <> ranked.keep_id;
+
+WITH ranked AS (
+    SELECT id, FIRST_VALUE(id) OVER (PARTITION BY hospital_id, email ORDER BY created_at, id) AS keep_id
+    FROM patients
+    WHERE email IS NOT NULL
+)
+DELETE FROM patients
+USING ranked
+WHERE patients.id = ranked.id AND ranked.id <> ranked.keep_id;
+
+-- One patient per email within a hospital; also the conflict target for patient upserts
+CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_hospital_email ON patients(hospital_id, email);
+CREATE INDEX IF NOT EXISTS idx_patients_hospital_created ON patients(hospital_id, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_reports_patient_id ON reports(patientId);
 CREATE INDEX IF NOT EXISTS idx_reports_hospital_id ON reports(hospital_id);
 CREATE INDEX IF NOT EXISTS idx_treatments_hospital_id ON treatments(hospital_id);
@@ -110,6 +150,8 @@ ALTER TABLE treatments ENABLE ROW LEVEL SECURITY;
 ALTER TABLE medicines ENABLE ROW LEVEL SECURITY;
 ALTER TABLE treatment_info ENABLE ROW LEVEL SECURITY;
 ALTER TABLE doctors ENABLE ROW LEVEL SECURITY;
+-- plan_summaries has no policies: only the service role reads and writes it
+ALTER TABLE plan_summaries ENABLE ROW LEVEL SECURITY;
 
 -- Create policies that allow full access when authenticated
 CREATE POLICY "Allow full access to authenticated users" ON patients FOR ALL USING (true);
@@ -136,6 +178,60 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Adjust one medicine's stock in a single statement and return the new stock. Raises
+-- P0002 when the medicine does not exist and 23514 when the stock would go below zero.
+CREATE OR REPLACE FUNCTION adjust_medicine_stock(p_hospital_id TEXT, p_medicine_id TEXT, p_quantity INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    new_stock INTEGER;
+BEGIN
+    UPDATE medicines
+    SET stock = COALESCE(stock, 0) + p_quantity
+    WHERE id = p_medicine_id
+      AND hospital_id = p_hospital_id
+    RETURNING stock INTO new_stock;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Medicine % not found', p_medicine_id USING ERRCODE = 'P0002';
+    END IF;
+    IF new_stock < 0 THEN
+        RAISE EXCEPTION 'Insufficient stock for medicine %', p_medicine_id USING ERRCODE = '23514';
+    END IF;
+    RETURN new_stock;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Apply a batch of stock adjustments ([{"medicine_id": ..., "quantity": ...}]) in one
+-- transaction. A missing medicine (P0002) or negative result (23514) rolls back the whole batch.
+CREATE OR REPLACE FUNCTION adjust_medicine_stock_batch(p_hospital_id TEXT, p_adjustments JSONB)
+RETURNS TABLE(medicine_id TEXT, new_stock INTEGER) AS $$
+DECLARE
+    adjustment RECORD;
+BEGIN
+    -- Net the adjustments per medicine and lock rows in ID order so concurrent batches cannot deadlock
+    FOR adjustment IN
+        SELECT a.medicine_id AS id, SUM(a.quantity)::INTEGER AS quantity
+        FROM jsonb_to_recordset(p_adjustments) AS a(medicine_id TEXT, quantity INTEGER)
+        GROUP BY a.medicine_id
+        ORDER BY a.medicine_id
+    LOOP
+        UPDATE medicines AS m
+        SET stock = COALESCE(m.stock, 0) + adjustment.quantity
+        WHERE m.id = adjustment.id
+          AND m.hospital_id = p_hospital_id
+        RETURNING m.id, m.stock INTO medicine_id, new_stock;
+
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Medicine % not found', adjustment.id USING ERRCODE = 'P0002';
+        END IF;
+        IF new_stock < 0 THEN
+            RAISE EXCEPTION 'Insufficient stock for medicine %', adjustment.id USING ERRCODE = '23514';
+        END IF;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Create triggers to automatically update the updated_at timestamp
 CREATE TRIGGER update_patients_updated_at
 BEFORE UPDATE ON patients
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk document ingestion: JSON array and NDJSON bodies, per-item
+IDs and errors, and windowed, chunked writes to the vector database.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+from app.services.blocking_executor import BlockingExecutor
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
+from app.services.text_chunker import TextChunker
+from app.services.vector_db_service import VectorDBService
+from app.services.version_stamp import VersionStamp
+
+class RecordingCollection:
+    """Records every add call the service makes."""
+
+    def __init__(self):
+        self.adds = []
+
+    def add(self, embeddings, documents, metadatas, ids):
+        assert len(embeddings) == len(documents) == len(metadatas) == len(ids)
+        self.adds.append({"ids": ids, "metadatas": metadatas})
+
+async def fake_encode(texts):
+    return [[float(len(text)), 1.0] for text in texts]
+
+def make_vector_db(stamp_dir, write_batch_size=64):
+    service = VectorDBService.__new__(VectorDBService)
+    service.executor = BlockingExecutor()
+    service.chunker = TextChunker(chunk_tokens=50, overlap_tokens=10)
+    service.embedding_cache = EmbeddingCache("test-model")
+    service.embedding_batcher = EmbeddingBatcher(fake_encode)
+    service.write_batch_size = write_batch_size
+    service.documents_stamp = VersionStamp(os.path.join(stamp_dir, "documents.stamp"))
+    service.documents_collection = RecordingCollection()
+    return service
+
+def document(i, words=10):
+    return {"content": " ".join(f"word{i}-{n}" for n in range(words)), "document_type": "guide", "metadata": {"source": i}}
+
+async def test_add_documents_chunks_and_writes_in_batches():
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        service = make_vector_db(stamp_dir, write_batch_size=4)
+
+        doc_ids = await service.add_documents([document(0, words=200), document(1), document(2)])
+
+        collection = service.documents_collection
+        stored = [metadata for add in collection.adds for metadata in add["metadatas"]]
+        assert len(doc_ids) == len(set(doc_ids)) == 3
+        assert all(len(add["ids"]) <= 4 for add in collection.adds)
+        assert len(collection.adds) == -(-len(stored) // 4)
+        # Every chunk points back to its parent, in input order
+        assert [metadata["parent_id"] for metadata in stored if metadata["chunk_index"] == 0] == doc_ids
+        assert sum(1 for metadata in stored if metadata["parent_id"] == doc_ids[0]) > 1
+        assert {metadata["document_type"] for metadata in stored} == {"guide"}
+
+def test_bulk_endpoint_reports_each_item():
+    from fastapi.testclient import TestClient
+    from app import main
+
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        vector_db = make_vector_db(stamp_dir)
+        main.ai_service.vector_db = vector_db
+        main.BULK_INGEST_WINDOW = 2
+        client = TestClient(main.app)
+
+        # Five valid items in windows of two make three add calls; the invalid ones are reported in place
+        items = [document(0), {"document_type": "guide"}, document(1), document(2), "not an object", document(3), document(4)]
+        response = client.post("/api/documents/bulk", json=items)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "partial"
+        assert body["total"] == 7 and body["succeeded"] == 5 and body["failed"] == 2
+        assert [result["index"] for result in body["results"]] == list(range(7))
+        assert "Invalid document" in body["results"][1]["error"] and "Invalid document" in body["results"][4]["error"]
+        assert len({result["document_id"] for result in body["results"] if "document_id" in result}) == 5
+        assert len(vector_db.documents_collection.adds) == 3
+
+        ndjson = "\n".join(json.dumps(document(i)) for i in range(3)) + "\n\nnot json\n"
+        response = client.post("/api/documents/bulk", content=ndjson, headers={"content-type": "application/x-ndjson"})
+        body = response.json()
+        assert body["total"] == 4 and body["succeeded"] == 3 and body["failed"] == 1
+        assert "error" in body["results"][3]
+        assert len(vector_db.documents_collection.adds) == 5
+
+        wrapped = client.post("/api/documents/bulk", json={"documents": [document(5)]})
+        assert wrapped.json()["status"] == "success"
+        assert client.post("/api/documents/bulk", json={"items": []}).status_code == 400
+        assert client.post("/api/documents/bulk", content="[not json", headers={"content-type": "application/json"}).status_code == 400
+
+if __name__ == "__main__":
+    asyncio.run(test_add_documents_chunks_and_writes_in_batches())
+    test_bulk_endpoint_reports_each_item()
+    print("✅ All bulk document tests passed")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for the read-through catalog cache and its cross-worker invalidation.
+"""
+
+import asyncio
+import tempfile
+
+from app.services.catalog_cache import CatalogCache
+
+class FakeTable:
+    """Stands in for a Supabase table and counts full-table fetches."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetches = 0
+
+    async def fetch(self):
+        self.fetches += 1
+        await asyncio.sleep(0.01)
+        return [dict(row) for row in self.rows]
+
+async def test_reads_are_served_from_memory():
+    table = FakeTable([{"id": "t1", "name": "Chemical peel"}, {"id": "t2", "name": "Microneedling"}])
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        cache = CatalogCache(stamp_dir=stamp_dir)
+
+        lists = await asyncio.gather(*[cache.get_all("treatments", table.fetch) for _ in range(20)])
+        item = await cache.get_item("treatments", "t2", table.fetch)
+        missing = await cache.get_item("treatments", "t9", table.fetch)
+        batch = await cache.get_items("treatments", ["t2", "t9", "t1"], table.fetch)
+
+        assert table.fetches == 1
+        assert all(len(rows) == 2 for rows in lists)
+        assert item["name"] == "Microneedling"
+        assert missing is None
+        assert sorted(batch) == ["t1", "t2"]
+
+async def test_invalidation_reaches_other_workers():
+    table = FakeTable([{"id": "m1", "name": "Tretinoin", "stock": 10}])
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        # Two caches sharing a stamp directory behave like two uvicorn workers
+        worker_a = CatalogCache(stamp_dir=stamp_dir)
+        worker_b = CatalogCache(stamp_dir=stamp_dir)
+        await worker_a.get_all("medicines", table.fetch)
+        await worker_b.get_all("medicines", table.fetch)
+
+        table.rows[0]["stock"] = 4
+        worker_a.invalidate("medicines")
+
+        assert (await worker_b.get_item("medicines", "m1", table.fetch))["stock"] == 4
+        assert (await worker_a.get_item("medicines", "m1", table.fetch))["stock"] == 4
+        assert table.fetches == 4
+
+async def test_entries_expire_after_ttl():
+    table = FakeTable([{"id": "d1", "name": "Dr. Rao"}])
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        cache = CatalogCache(ttl_seconds=0.05, stamp_dir=stamp_dir)
+
+        await cache.get_all("doctors:hospital_dermai_01", table.fetch)
+        await asyncio.sleep(0.06)
+        await cache.get_all("doctors:hospital_dermai_01", table.fetch)
+
+        assert table.fetches == 2
+
+if __name__ == "__main__":
+    asyncio.run(test_reads_are_served_from_memory())
+    asyncio.run(test_invalidation_reaches_other_workers())
+    asyncio.run(test_entries_expire_after_ttl())
+    print("✅ All catalog cache tests passed")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind chat history queue: ordering, flushing on
+shutdown, backpressure when the queue is full, and retried and
+dead-lettered writes.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+from app.services.chat_history_writer import ChatHistoryWriter
+
+class RecordingVectorDB:
+    """Records each batch it is asked to write, optionally failing or stalling."""
+
+    def __init__(self, fail_batches=0):
+        self.batches = []
+        self.fail_batches = fail_batches
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def add_chat_messages(self, batch):
+        await self.release.wait()
+        if self.fail_batches:
+            self.fail_batches -= 1
+            raise RuntimeError("Chroma unavailable")
+        self.batches.append([message["message"] for message in batch])
+
+async def test_messages_are_written_in_order_and_batched():
+    vector_db = RecordingVectorDB()
+    writer = ChatHistoryWriter(vector_db, max_batch_size=4, flush_interval_ms=20)
+
+    ids = [await writer.enqueue("patient-1", f"question {i}", f"answer {i}", "session-1") for i in range(10)]
+    await asyncio.sleep(0.1)
+
+    assert len(set(ids)) == 10
+    assert [message for batch in vector_db.batches for message in batch] == [f"question {i}" for i in range(10)]
+    assert all(len(batch) <= 4 for batch in vector_db.batches)
+    await writer.stop()
+
+async def test_stop_flushes_everything_queued():
+    vector_db = RecordingVectorDB()
+    # An interval far longer than the test, so only stop() can trigger the write
+    writer = ChatHistoryWriter(vector_db, max_batch_size=64, flush_interval_ms=60000)
+
+    for i in range(5):
+        await writer.enqueue("patient-1", f"question {i}", f"answer {i}")
+    await asyncio.sleep(0.05)
+    assert vector_db.batches == []
+
+    await writer.stop()
+    assert vector_db.batches == [[f"question {i}" for i in range(5)]]
+    assert writer.get_stats()["written"] == 5 and writer.get_stats()["pending"] == 0
+
+async def test_full_queue_applies_backpressure_without_dropping():
+    vector_db = RecordingVectorDB()
+    vector_db.release.clear()
+    writer = ChatHistoryWriter(vector_db, max_batch_size=2, flush_interval_ms=1, max_queue_size=2)
+
+    # The worker holds one batch while the write stalls, then the queue fills
+    for i in range(4):
+        await writer.enqueue("patient-1", f"question {i}", f"answer {i}")
+    blocked = asyncio.create_task(writer.enqueue("patient-1", "question 4", "answer 4"))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+    assert writer.get_stats()["pending"] == 2
+
+    vector_db.release.set()
+    await blocked
+    await writer.stop()
+    assert [message for batch in vector_db.batches for message in batch] == [f"question {i}" for i in range(5)]
+
+async def test_transient_failures_are_retried():
+    vector_db = RecordingVectorDB(fail_batches=2)
+    writer = ChatHistoryWriter(vector_db, max_batch_size=3, flush_interval_ms=10, max_retries=3, retry_backoff_ms=5)
+
+    for i in range(3):
+        await writer.enqueue("patient-1", f"question {i}", "answer")
+    await writer.stop()
+
+    stats = writer.get_stats()
+    assert stats["retries"] == 2 and stats["failed"] == 0 and stats["written"] == 3
+    assert vector_db.batches == [[f"question {i}" for i in range(3)]]
+
+async def test_batches_that_keep_failing_go_to_the_dead_letter_file():
+    with tempfile.TemporaryDirectory() as workdir:
+        dead_letter_path = os.path.join(workdir, "dead_letter.ndjson")
+        vector_db = RecordingVectorDB(fail_batches=3)
+        writer = ChatHistoryWriter(vector_db, max_batch_size=3, flush_interval_ms=10, max_retries=2,
+                                   retry_backoff_ms=5, dead_letter_path=dead_letter_path)
+
+        for i in range(3):
+            await writer.enqueue("patient-1", f"lost {i}", "answer", "session-1")
+        await asyncio.sleep(0.1)
+        await writer.enqueue("patient-1", "kept", "answer")
+        await writer.stop()
+
+        stats = writer.get_stats()
+        assert stats["failed"] == 3 and stats["dead_lettered"] == 3 and stats["written"] == 1
+        assert vector_db.batches == [["kept"]]
+        with open(dead_letter_path) as dead_letters:
+            saved = [json.loads(line) for line in dead_letters]
+        assert [message["message"] for message in saved] == ["lost 0", "lost 1", "lost 2"]
+        assert all(message["session_id"] == "session-1" for message in saved)
+
+if __name__ == "__main__":
+    asyncio.run(test_messages_are_written_in_order_and_batched())
+    asyncio.run(test_stop_flushes_everything_queued())
+    asyncio.run(test_full_queue_applies_backpressure_without_dropping())
+    asyncio.run(test_transient_failures_are_retried())
+    asyncio.run(test_batches_that_keep_failing_go_to_the_dead_letter_file())
+    print("✅ All chat history writer tests passed")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for token-budgeted prompt context assembly.
+"""
+
+from app.services.context_assembler import ContextAssembler
+
+PEEL = ("Redness after a chemical peel is expected for two to three days. "
+        "Apply a bland moisturiser and avoid retinoids until the skin settles. "
+        "Contact the clinic if blistering or crusting appears.")
+TRETINOIN = ("Tretinoin is applied at night to clean, dry skin. "
+             "Use a pea-sized amount for the whole face. "
+             "Expect some dryness and peeling in the first weeks.")
+
+def doc(content, distance):
+    return {"content": content, "distance": distance}
+
+def turn(message, response, created_at):
+    return {"metadata": {"message": message, "response": response, "created_at": created_at}}
+
+def test_documents_fill_budget_by_relevance():
+    assembler = ContextAssembler(document_tokens=60, min_passage_tokens=8)
+    result = assembler.assemble([doc(TRETINOIN * 3, 0.9), doc(PEEL, 0.2)], [])
+
+    assert result["documents"][0] == PEEL
+    assert result["tokens"]["documents"] <= 60
+    assert result["truncated"] == 1
+    # The truncated passage ends on a sentence boundary
+    assert result["documents"][1].endswith(".")
+
+def test_near_duplicate_passages_are_dropped():
+    assembler = ContextAssembler()
+    result = assembler.assemble([doc(PEEL, 0.1), doc(PEEL + " Call us any time.", 0.15), doc(TRETINOIN, 0.3)], [])
+
+    assert result["documents"] == [PEEL, TRETINOIN]
+    assert result["dropped_duplicates"] == 1
+
+def test_prompt_size_is_bounded_for_large_corpora():
+    assembler = ContextAssembler(document_tokens=200, history_tokens=100)
+    docs = [doc(f"Passage {i}. " + TRETINOIN.replace("night", f"night {i}") * 20, i / 100) for i in range(50)]
+    history = [turn(f"question {i}", PEEL, f"2024-01-01T00:00:{i:02d}") for i in range(30)]
+
+    result = assembler.assemble(docs, history)
+
+    assert result["tokens"]["documents"] <= 200
+    assert result["tokens"]["history"] <= 100
+    assert result["tokens"]["total"] == result["tokens"]["documents"] + result["tokens"]["history"]
+
+def test_history_keeps_newest_turns_in_order():
+    assembler = ContextAssembler(history_turns=2)
+    history = [
+        turn("third", "c", "2024-01-03T00:00:00"),
+        turn("first", "a", "2024-01-01T00:00:00"),
+        turn("second", "b", "2024-01-02T00:00:00")
+    ]
+
+    result = assembler.assemble([], history)
+
+    assert [t["message"] for t in result["history"]] == ["second", "third"]
+
+if __name__ == "__main__":
+    test_documents_fill_budget_by_relevance()
+    test_near_duplicate_passages_are_dropped()
+    test_prompt_size_is_bounded_for_large_corpora()
+    test_history_keeps_newest_turns_in_order()
+    print("✅ All context assembler tests passed")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for deleting chunked documents by document or chunk ID.
+"""
+
+import asyncio
+import tempfile
+
+from app.services.blocking_executor import BlockingExecutor
+from app.services.vector_db_service import VectorDBService
+from app.services.version_stamp import VersionStamp
+
+class InMemoryCollection:
+    """Keeps rows in a dict and answers the get/delete calls the service makes."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def _matches(self, row_id, ids=None, where=None):
+        if ids is not None and row_id not in ids:
+            return False
+        if where is not None:
+            return all(self.rows[row_id].get(key) == value for key, value in where.items())
+        return True
+
+    def get(self, ids=None, where=None, include=None):
+        matched = [row_id for row_id in self.rows if self._matches(row_id, ids, where)]
+        return {"ids": matched, "metadatas": [self.rows[row_id] for row_id in matched]}
+
+    def delete(self, ids=None, where=None):
+        for row_id in [row_id for row_id in self.rows if self._matches(row_id, ids, where)]:
+            del self.rows[row_id]
+
+def make_service(stamp_dir):
+    service = VectorDBService.__new__(VectorDBService)
+    service.executor = BlockingExecutor()
+    service.documents_stamp = VersionStamp(f"{stamp_dir}/documents.stamp")
+    service.documents_collection = InMemoryCollection({
+        "report#0": {"parent_id": "report", "chunk_index": 0},
+        "report#1": {"parent_id": "report", "chunk_index": 1},
+        "report#2": {"parent_id": "report", "chunk_index": 2},
+        "leaflet#0": {"parent_id": "leaflet", "chunk_index": 0},
+        "legacy": {"document_type": "guide"}
+    })
+    return service
+
+async def test_deleting_a_chunk_id_removes_the_whole_document():
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        service = make_service(stamp_dir)
+
+        assert await service.delete_document("report#1")
+        assert sorted(service.documents_collection.rows) == ["leaflet#0", "legacy"]
+        assert service.documents_version > 0
+
+async def test_deleting_by_document_id_and_unchunked_rows():
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        service = make_service(stamp_dir)
+
+        assert await service.delete_document("leaflet")
+        assert await service.delete_document("legacy")
+        assert sorted(service.documents_collection.rows) == ["report#0", "report#1", "report#2"]
+
+if __name__ == "__main__":
+    asyncio.run(test_deleting_a_chunk_id_removes_the_whole_document())
+    asyncio.run(test_deleting_by_document_id_and_unchunked_rows())
+    print("✅ All document delete tests passed")
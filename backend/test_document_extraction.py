@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for process-pool text extraction: caching, and time limits that
+only fail the file that ran over.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from app.services.document_extraction import DocumentExtractionService, ExtractionTimeoutError, ParseBudget
+
+RTF = r"{\rtf1\ansi{\fonttbl\f0\fswiss Helvetica;}\f0 Apply hydrocortisone 1% cream twice daily.\par}"
+
+async def collect(pieces):
+    return "".join([piece async for piece in pieces])
+
+async def test_extracts_text_and_serves_repeats_from_cache():
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "plan.rtf")
+        with open(path, "w") as source:
+            source.write(RTF)
+        service = DocumentExtractionService(max_workers=1, cache_dir=os.path.join(workdir, "cache"))
+        try:
+            first = await collect(service.extract(path, ".RTF", "plan-hash"))
+            second = await collect(service.extract(path, ".rtf", "plan-hash"))
+        finally:
+            service.shutdown()
+
+        assert "hydrocortisone 1% cream" in first
+        assert second == first
+        assert service.get_stats() == {"cache_hits": 1, "cache_misses": 1, "cache_evictions": 0, "timeouts": 0}
+
+async def test_timeout_fails_only_the_slow_file():
+    service = DocumentExtractionService(max_workers=2, cache_dir=None)
+    try:
+        # Another request's extraction shares the pool with a file that hangs
+        other = asyncio.create_task(service._run(ParseBudget(30), time.sleep, 2))
+        await asyncio.sleep(0)
+        stuck_pool = service._pool
+        try:
+            await service._run(ParseBudget(0.5), time.sleep, 60)
+            assert False, "expected a timeout"
+        except ExtractionTimeoutError:
+            pass
+
+        assert service.timeouts == 1
+        assert service._pool is None and stuck_pool in service._retiring
+        recycling = service._retiring[stuck_pool]
+        workers = list(stuck_pool._processes.values())
+        # New work goes to a fresh pool while the old one drains
+        assert await service._run(ParseBudget(30), abs, -3) == 3
+        assert service._pool is not stuck_pool
+
+        assert not recycling.done()
+        assert await other is None
+        await asyncio.wait_for(recycling, 10)
+        await asyncio.sleep(0.5)
+        assert workers and not any(process.is_alive() for process in workers)
+    finally:
+        service.shutdown()
+
+async def test_time_spent_by_the_consumer_does_not_count():
+    service = DocumentExtractionService(max_workers=1, cache_dir=None)
+    try:
+        # Start the worker first, so spawning it is not charged to the file
+        await service._run(ParseBudget(30), abs, -1)
+
+        budget = ParseBudget(1.0)
+        for _ in range(3):
+            await service._run(budget, time.sleep, 0.05)
+            # The caller chunks and embeds each piece before asking for the next
+            await asyncio.sleep(0.5)
+
+        assert service.timeouts == 0
+        assert 0 < budget.remaining < 1.0
+    finally:
+        service.shutdown()
+
+def test_cache_evicts_least_recently_used_files():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        service = DocumentExtractionService(cache_dir=cache_dir, cache_max_bytes=250)
+        now = time.time()
+        for age, name in enumerate(["newest", "middle", "oldest"]):
+            path = os.path.join(cache_dir, f"{name}.txt")
+            with open(path, "w") as cached:
+                cached.write("x" * 100)
+            os.utime(path, (now - age * 60, now - age * 60))
+        with open(os.path.join(cache_dir, "running.txt.abc.tmp"), "w") as in_progress:
+            in_progress.write("x" * 1000)
+
+        service._evict_cache()
+
+        assert sorted(os.listdir(cache_dir)) == ["middle.txt", "newest.txt", "running.txt.abc.tmp"]
+        assert service.get_stats()["cache_evictions"] == 1
+
+if __name__ == "__main__":
+    asyncio.run(test_extracts_text_and_serves_repeats_from_cache())
+    asyncio.run(test_timeout_fails_only_the_slow_file())
+    asyncio.run(test_time_spent_by_the_consumer_does_not_count())
+    test_cache_evicts_least_recently_used_files()
+    print("✅ All document extraction tests passed")
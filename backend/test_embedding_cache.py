@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the two-tier embedding cache: promotion from SQLite into the
+memory tier, and keys that never cross embedding models.
+"""
+
+import asyncio
+import os
+import tempfile
+
+from app.services.embedding_cache import EmbeddingCache
+
+VECTOR = [0.25, -0.5, 0.75]
+
+async def test_disk_hits_are_promoted_to_memory():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        db_path = os.path.join(cache_dir, "embeddings.sqlite3")
+        writer = EmbeddingCache("all-MiniLM-L6-v2", db_path=db_path)
+        await writer.put_many(["Apply tretinoin at night."], [VECTOR])
+        writer.close()
+
+        # A restarted worker starts with an empty memory tier
+        cache = EmbeddingCache("all-MiniLM-L6-v2", db_path=db_path)
+        first = await cache.get_many(["Apply  tretinoin at night. ", "Never embedded"])
+        assert first == [VECTOR, None]
+        assert cache.disk_hits == 1 and cache.disk_misses == 1
+
+        second = await cache.get_many(["Apply tretinoin at night."])
+        assert second == [VECTOR]
+        # Served from memory, so the disk counters did not move
+        assert cache.disk_hits == 1
+        assert cache.memory.get_stats()["hits"] == 1
+
+        stats = await cache.get_stats()
+        assert stats["disk"]["entries"] == 1
+        cache.close()
+
+async def test_vectors_from_another_model_are_never_returned():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        db_path = os.path.join(cache_dir, "embeddings.sqlite3")
+        old_model = EmbeddingCache("all-MiniLM-L6-v2", db_path=db_path)
+        await old_model.put_many(["Apply tretinoin at night."], [VECTOR])
+
+        new_model = EmbeddingCache("all-mpnet-base-v2", db_path=db_path)
+        assert new_model.key_for("Apply tretinoin at night.") != old_model.key_for("Apply tretinoin at night.")
+        assert await new_model.get_many(["Apply tretinoin at night."]) == [None]
+        assert new_model.disk_misses == 1
+
+        # Both models' vectors for the same text live side by side on disk
+        await new_model.put_many(["Apply tretinoin at night."], [[1.0, 0.0, 0.0]])
+        old_model.close()
+        new_model.close()
+        reopened = EmbeddingCache("all-MiniLM-L6-v2", db_path=db_path)
+        assert await reopened.get_many(["Apply tretinoin at night."]) == [VECTOR]
+        reopened.close()
+
+if __name__ == "__main__":
+    asyncio.run(test_disk_hits_are_promoted_to_memory())
+    asyncio.run(test_vectors_from_another_model_are_never_returned())
+    print("✅ All embedding cache tests passed")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Regression test: the event loop must stay responsive while a large document is embedded.
+"""
+
+import asyncio
+import time
+
+from app.services.blocking_executor import BlockingExecutor
+from app.services.embedding_batcher import EmbeddingBatcher
+
+def slow_encode(texts):
+    """Stand-in for SentenceTransformer.encode that blocks in proportion to input size."""
+    time.sleep(sum(len(text) for text in texts) / 1_000_000)
+    return [[float(len(text))] for text in texts]
+
+async def measure_max_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Tick on the event loop and record the worst delay between ticks."""
+    loop = asyncio.get_running_loop()
+    max_lag = 0.0
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, loop.time() - expected)
+    return max_lag
+
+async def test_event_loop_responsive_during_large_embedding():
+    """A ~0.5s encode must not stall other coroutines (e.g. /api/health)."""
+    executor = BlockingExecutor(max_workers=2)
+    batcher = EmbeddingBatcher(lambda texts: executor.run_encode(slow_encode, texts))
+    large_document = "eczema " * 70_000
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_max_loop_lag(stop))
+    try:
+        embedding = await batcher.embed(large_document)
+    finally:
+        stop.set()
+    max_lag = await ticker
+    executor.shutdown()
+
+    assert embedding == [float(len(large_document))]
+    print(f"✅ Max event loop lag while embedding: {max_lag * 1000:.1f} ms")
+    assert max_lag < 0.1
+
+async def test_concurrent_requests_share_one_encode_call():
+    """Concurrent embeds are grouped into a single batched encode."""
+    executor = BlockingExecutor(max_workers=1)
+    batch_sizes = []
+
+    def encode(texts):
+        batch_sizes.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(lambda texts: executor.run_encode(encode, texts), max_batch_size=16, max_wait_ms=20)
+    results = await asyncio.gather(*[batcher.embed("a" * i) for i in range(16)])
+    executor.shutdown()
+
+    assert results == [[float(i)] for i in range(16)]
+    assert batch_sizes == [16]
+    assert batcher.get_stats()["avg_batch_size"] == 16
+
+if __name__ == "__main__":
+    asyncio.run(test_event_loop_responsive_during_large_embedding())
+    asyncio.run(test_concurrent_requests_share_one_encode_call())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the cross-worker keyed file lock.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+from app.services.file_lock import KeyedFileLock, LockTimeoutError
+
+# Read-modify-write of a counter file with a pause in between, so unserialised workers lose updates
+WORKER = """
+import asyncio, sys
+from app.services.file_lock import KeyedFileLock
+
+async def main(lock_dir, counter_path):
+    lock = KeyedFileLock(lock_dir=lock_dir, poll_interval_ms=5)
+    for _ in range(5):
+        async with lock.hold("treatment-info:medicine:42"):
+            with open(counter_path) as counter:
+                value = int(counter.read())
+            await asyncio.sleep(0.01)
+            with open(counter_path, "w") as counter:
+                counter.write(str(value + 1))
+
+asyncio.run(main(sys.argv[1], sys.argv[2]))
+"""
+
+def test_lock_serialises_workers():
+    with tempfile.TemporaryDirectory() as lock_dir:
+        counter_path = os.path.join(lock_dir, "counter")
+        with open(counter_path, "w") as counter:
+            counter.write("0")
+
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        workers = [
+            subprocess.Popen([sys.executable, "-c", WORKER, lock_dir, counter_path], cwd=backend_dir)
+            for _ in range(3)
+        ]
+        assert all(worker.wait(timeout=60) == 0 for worker in workers)
+
+        with open(counter_path) as counter:
+            assert int(counter.read()) == 15
+
+async def test_lock_serialises_coroutines_and_times_out():
+    with tempfile.TemporaryDirectory() as lock_dir:
+        lock = KeyedFileLock(lock_dir=lock_dir, timeout_seconds=0.1)
+        order = []
+
+        async def hold(name, seconds):
+            async with lock.hold("item"):
+                order.append(f"{name} start")
+                await asyncio.sleep(seconds)
+                order.append(f"{name} end")
+
+        await asyncio.gather(hold("a", 0.02), hold("b", 0.02))
+        assert order == ["a start", "a end", "b start", "b end"]
+
+        holder = asyncio.create_task(hold("slow", 0.5))
+        await asyncio.sleep(0.01)
+        try:
+            async with lock.hold("item"):
+                assert False, "expected a timeout"
+        except LockTimeoutError:
+            pass
+        await holder
+        # Locks for keys nobody holds or waits on are dropped
+        assert lock._local_locks == {}
+
+async def test_local_locks_do_not_accumulate():
+    with tempfile.TemporaryDirectory() as lock_dir:
+        lock = KeyedFileLock(lock_dir=lock_dir)
+
+        async def hold(key):
+            async with lock.hold(key):
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(hold(f"patient-{i % 10}") for i in range(100)))
+        assert lock._local_locks == {}
+
+if __name__ == "__main__":
+    test_lock_serialises_workers()
+    asyncio.run(test_lock_serialises_coroutines_and_times_out())
+    asyncio.run(test_local_locks_do_not_accumulate())
+    print("✅ All file lock tests passed")
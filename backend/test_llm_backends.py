@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests for the local stub LLM backend and the chat pipeline running on it.
+"""
+
+import asyncio
+import time
+
+import anthropic
+try:
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+from app.services.ai_service import AIService
+from app.services.llm_backends import AnthropicBackend, LLMBackend, LLMBackendError, LLMRateLimitError, StubLLMBackend
+
+MESSAGES = [{"role": "user", "content": "How do I apply tretinoin?"}]
+
+class StubVectorDB:
+    documents_version = 0
+
+    async def search_documents(self, query):
+        return [{"content": "Tretinoin is applied at night to clean, dry skin.", "distance": 0.1}]
+
+    async def get_chat_history(self, user_id, session_id):
+        return []
+
+    async def add_chat_message(self, *args):
+        return "message-id"
+
+async def test_replies_are_deterministic_and_paced():
+    backend = StubLLMBackend(first_token_ms=50, tokens_per_second=200, reply_tokens=20)
+
+    started = time.perf_counter()
+    first, usage = await backend.create("You are helpful.", MESSAGES, max_tokens=100, timeout=5)
+    elapsed = time.perf_counter() - started
+    second, _ = await backend.create("You are helpful.", MESSAGES, max_tokens=100, timeout=5)
+
+    assert first == second
+    assert len(first.split()) == 20
+    assert usage["output_tokens"] == 20
+    # 50ms to the first token, then 19 more at 200 tokens per second
+    assert elapsed >= 0.05 + 19 / 200 * 0.9
+
+async def test_stream_yields_deltas_and_usage():
+    backend = StubLLMBackend(first_token_ms=0, tokens_per_second=0, reply_tokens=12)
+    usage = {}
+
+    deltas = [delta async for delta in backend.stream("You are helpful.", MESSAGES, 100, 5, usage)]
+    text, _ = await backend.create("You are helpful.", MESSAGES, 100, 5)
+
+    assert len(deltas) == 12
+    assert "".join(deltas) == text
+    assert usage["output_tokens"] == 12
+
+async def test_injected_errors_and_rate_limits():
+    always_limited = StubLLMBackend(first_token_ms=0, tokens_per_second=0, rate_limit_rate=1.0, retry_after_seconds=2)
+    always_failing = StubLLMBackend(first_token_ms=0, tokens_per_second=0, error_rate=1.0)
+
+    try:
+        await always_limited.create("You are helpful.", MESSAGES, 100, 5)
+        assert False, "expected a rate limit"
+    except LLMRateLimitError as e:
+        assert e.retry_after == 2
+
+    try:
+        await always_failing.create("You are helpful.", MESSAGES, 100, 5)
+        assert False, "expected an error"
+    except LLMBackendError:
+        pass
+
+async def test_chat_pipeline_runs_offline_on_stub():
+    service = AIService(StubVectorDB(), "", llm_backend=StubLLMBackend(first_token_ms=0, tokens_per_second=0))
+
+    reply = await service.chat_with_medical_context("How do I apply tretinoin?", "patient-1", "session-1")
+    events = [event async for event in service.stream_chat_with_medical_context("Any side effects?", "patient-1", "session-1")]
+    summary = await service.summarize_treatment_plan({
+        "diagnosis": "Acne",
+        "selectedTreatments": [{"name": "Chemical peel"}],
+        "selectedMedicines": [{"name": "Tretinoin"}]
+    })
+
+    assert "error" not in reply and reply["usage"]["output_tokens"] > 0
+    assert [event["event"] for event in events][0] == "documents"
+    assert events[-1]["event"] == "done" and events[-1]["data"]["usage"]["output_tokens"] > 0
+    assert summary and "Diagnosis:" not in summary
+    assert service.llm_usage["requests"] == 3
+
+def test_backend_interface_is_abstract():
+    class Incomplete(LLMBackend):
+        async def create(self, system, messages, max_tokens, timeout):
+            return "", None
+
+    try:
+        Incomplete()
+        assert False, "expected a backend without stream to be rejected"
+    except TypeError:
+        pass
+
+async def test_stub_prompt_cache_is_bounded():
+    backend = StubLLMBackend(first_token_ms=0, tokens_per_second=0, reply_tokens=1, max_cached_prefixes=2)
+    system = lambda i: [{"type": "text", "text": f"Prompt {i}", "cache_control": {"type": "ephemeral"}}]
+
+    for i in range(5):
+        await backend.create(system(i), MESSAGES, 10, 5)
+    _, evicted = await backend.create(system(0), MESSAGES, 10, 5)
+    _, recent = await backend.create(system(4), MESSAGES, 10, 5)
+
+    assert len(backend._cached_prefixes.keys()) == 2
+    assert evicted["cache_read_input_tokens"] == 0
+    assert recent["cache_read_input_tokens"] > 0
+
+async def test_anthropic_stream_maps_api_errors():
+    def handler(request):
+        if b"busy" in request.content:
+            return httpx.Response(429, headers={"retry-after": "3"}, json={
+                "type": "error", "error": {"type": "rate_limit_error", "message": "Slow down"}
+            })
+        return httpx.Response(500, json={"type": "error", "error": {"type": "api_error", "message": "Boom"}})
+
+    backend = AnthropicBackend(
+        api_key="test",
+        http_client=anthropic.DefaultAsyncHttpxClient(transport=httpx.MockTransport(handler))
+    )
+    backend.client = backend.client.with_options(max_retries=0)
+
+    try:
+        [delta async for delta in backend.stream("busy", MESSAGES, 100, 5)]
+        assert False, "expected a rate limit"
+    except LLMRateLimitError as e:
+        assert e.retry_after == 3
+
+    try:
+        [delta async for delta in backend.stream("You are helpful.", MESSAGES, 100, 5)]
+        assert False, "expected an error"
+    except LLMBackendError as e:
+        assert not isinstance(e, LLMRateLimitError)
+
+if __name__ == "__main__":
+    asyncio.run(test_replies_are_deterministic_and_paced())
+    asyncio.run(test_stream_yields_deltas_and_usage())
+    asyncio.run(test_injected_errors_and_rate_limits())
+    asyncio.run(test_chat_pipeline_runs_offline_on_stub())
+    test_backend_interface_is_abstract()
+    asyncio.run(test_stub_prompt_cache_is_bounded())
+    asyncio.run(test_anthropic_stream_maps_api_errors())
+    print("✅ All LLM backend tests passed")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for how atomic stock adjustment results and errors are surfaced.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+import httpx
+from postgrest.exceptions import APIError
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SECRET_KEY", "service-key")
+
+from app.services.supabase_service import SupabaseService, StockAdjustmentError, MedicineNotFoundError
+
+def make_service(handler):
+    os.environ["CATALOG_CACHE_STAMP_DIR"] = tempfile.mkdtemp()
+    service = SupabaseService()
+    service.db.session._transport = httpx.MockTransport(handler)
+    return service
+
+def rpc_error(code, message, status=400):
+    return httpx.Response(status, json={"code": code, "message": message, "details": None, "hint": None})
+
+async def expect(error_type, call):
+    try:
+        await call
+        assert False, f"expected {error_type.__name__}"
+    except error_type as e:
+        return e
+
+async def test_single_adjustment_errors_are_told_apart():
+    responses = {
+        "m1": httpx.Response(200, json=7),
+        "m404": rpc_error("P0002", "Medicine m404 not found"),
+        "m2": rpc_error("23514", "Insufficient stock for medicine m2"),
+        "m500": rpc_error("57014", "canceling statement due to statement timeout", status=500)
+    }
+    service = make_service(lambda request: responses[json.loads(request.content)["p_medicine_id"]])
+
+    assert await service.update_medicine_stock("m1", -3) == 7
+    not_found = await expect(MedicineNotFoundError, service.update_medicine_stock("m404", -1))
+    insufficient = await expect(StockAdjustmentError, service.update_medicine_stock("m2", -100))
+    database_error = await expect(APIError, service.update_medicine_stock("m500", 1))
+
+    assert "m404" in str(not_found)
+    assert not isinstance(insufficient, MedicineNotFoundError)
+    assert not isinstance(database_error, StockAdjustmentError)
+    await service.close()
+
+async def test_batch_maps_only_its_own_errors():
+    outcome = {}
+    service = make_service(lambda request: outcome["response"])
+    adjustments = [{"medicine_id": "m1", "quantity": -2}, {"medicine_id": "m2", "quantity": 5}]
+
+    outcome["response"] = httpx.Response(200, json=[{"medicine_id": "m1", "new_stock": 3}, {"medicine_id": "m2", "new_stock": 9}])
+    assert await service.update_medicine_stock_batch(adjustments) == {"m1": 3, "m2": 9}
+
+    outcome["response"] = rpc_error("23514", "Insufficient stock for medicine m1")
+    await expect(StockAdjustmentError, service.update_medicine_stock_batch(adjustments))
+    outcome["response"] = rpc_error("P0002", "Medicine m2 not found")
+    await expect(MedicineNotFoundError, service.update_medicine_stock_batch(adjustments))
+    outcome["response"] = rpc_error("42883", "function adjust_medicine_stock_batch does not exist", status=404)
+    error = await expect(APIError, service.update_medicine_stock_batch(adjustments))
+    assert not isinstance(error, StockAdjustmentError)
+    await service.close()
+
+if __name__ == "__main__":
+    asyncio.run(test_single_adjustment_errors_are_told_apart())
+    asyncio.run(test_batch_maps_only_its_own_errors())
+    print("✅ All medicine stock tests passed")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for keyset pagination cursors.
+"""
+
+from app.services.pagination import encode_cursor, decode_cursor, keyset_filter
+
+def test_cursor_round_trip():
+    row = {"id": "p_123", "created_at": "2024-05-01T09:30:00.123456+00:00", "name": "Asha"}
+    cursor = encode_cursor(row)
+
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == ("2024-05-01T09:30:00.123456+00:00", "p_123")
+
+def test_malformed_cursor_is_rejected():
+    for cursor in ["not-a-cursor", encode_cursor({"id": "p_1", "created_at": "x"})[:-3], ""]:
+        try:
+            decode_cursor(cursor)
+            assert False, f"expected {cursor!r} to be rejected"
+        except ValueError:
+            pass
+
+def test_keyset_filter_quotes_values():
+    assert keyset_filter("2024-05-01T09:30:00+00:00", 'p_"1') == (
+        'created_at.lt."2024-05-01T09:30:00+00:00",'
+        'and(created_at.eq."2024-05-01T09:30:00+00:00",id.lt."p_\\"1")'
+    )
+
+def test_invalid_cursor_is_rejected_before_streaming():
+    from fastapi.testclient import TestClient
+    from app import main
+
+    client = TestClient(main.app)
+    for format in ("json", "ndjson"):
+        response = client.get("/api/patients", params={"cursor": "not-a-cursor", "format": format})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    test_malformed_cursor_is_rejected()
+    test_keyset_filter_quotes_values()
+    test_invalid_cursor_is_rejected_before_streaming()
+    print("✅ All pagination tests passed")
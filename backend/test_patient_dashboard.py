@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-call patient dashboard aggregate.
+"""
+
+import asyncio
+import time
+
+from app.services.patient_dashboard import PatientDashboardService
+
+class FakeSupabase:
+    """Each lookup takes 50ms and is counted, like a database round trip."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def _round_trip(self, name):
+        self.calls.append(name)
+        await asyncio.sleep(0.05)
+
+    async def get_patient(self, patient_id):
+        await self._round_trip("patient")
+        return {"id": patient_id, "name": "Asha"} if patient_id == "p1" else None
+
+    async def get_patient_reports(self, patient_id):
+        await self._round_trip("reports")
+        return [
+            {"id": "r2", "created_at": "2024-05-02", "diagnosis": "Acne", "doctor": "Dr. Rao",
+             "next_appointment": "2024-06-01", "selectedtreatments": [{"id": "t1"}]},
+            {"id": "r1", "created_at": "2024-04-01", "diagnosis": None, "doctor": "Dr. Rao",
+             "selectedtreatments": [{"id": "t1"}], "selectedmedicines": ["m1"]}
+        ]
+
+    async def expand_report_items(self, reports):
+        await self._round_trip("expand")
+        for report in reports:
+            report["treatments"] = [{"id": "t1", "name": "Chemical peel"}]
+        return reports
+
+    def referenced_items(self, reports):
+        return [("treatment", "t1"), ("medicine", "m1")]
+
+    async def get_treatment_infos(self, items):
+        await self._round_trip("treatment_info")
+        return [{"item_type": item_type, "item_id": item_id} for item_type, item_id in items]
+
+class FakeVectorDB:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_chat_history(self, user_id, session_id=None, limit=10):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return [{"id": "c1", "content": "Is the peel painful?"}]
+
+async def test_dashboard_gathers_sources_concurrently():
+    supabase, vector_db = FakeSupabase(), FakeVectorDB()
+    service = PatientDashboardService(supabase, vector_db)
+
+    started = time.monotonic()
+    dashboard = await service.get_dashboard("p1")
+    elapsed = time.monotonic() - started
+
+    # Two concurrent stages of 50ms each, not six sequential round trips
+    assert elapsed < 0.2
+    assert dashboard["profile"]["name"] == "Asha"
+    assert dashboard["reports"][0]["treatments"][0]["name"] == "Chemical peel"
+    assert len(dashboard["treatment_info"]) == 2
+    assert dashboard["chat_history"][0]["id"] == "c1"
+    assert [visit["type"] for visit in dashboard["recentVisits"]] == ["Acne", "Consultation"]
+    assert dashboard["upcomingAppointment"]["date"] == "2024-06-01"
+
+async def test_projection_and_caching():
+    supabase, vector_db = FakeSupabase(), FakeVectorDB()
+    service = PatientDashboardService(supabase, vector_db)
+
+    dashboard = await service.get_dashboard("p1", ["profile", "recentVisits"])
+    assert set(dashboard) == {"profile", "recentVisits"}
+    assert sorted(supabase.calls) == ["patient", "reports"]
+    assert vector_db.calls == 0
+
+    await asyncio.gather(*[service.get_dashboard("p1", ["recentVisits", "profile"]) for _ in range(10)])
+    assert len(supabase.calls) == 2
+
+    service.invalidate("p1")
+    await service.get_dashboard("p1", ["profile", "recentVisits"])
+    assert len(supabase.calls) == 4
+
+    try:
+        await service.get_dashboard("p1", ["profile", "billing"])
+        assert False, "expected an unknown field to be rejected"
+    except ValueError:
+        pass
+
+async def test_missing_patient_is_not_found():
+    service = PatientDashboardService(FakeSupabase(), FakeVectorDB())
+    assert await service.get_dashboard("p404") is None
+
+async def test_invalidation_during_a_build_is_not_overwritten():
+    supabase, vector_db = FakeSupabase(), FakeVectorDB()
+    service = PatientDashboardService(supabase, vector_db)
+
+    # The patient is updated while a build is waiting on the database
+    stale = asyncio.create_task(service.get_dashboard("p1", ["profile"]))
+    await asyncio.sleep(0.01)
+    service.invalidate("p1")
+    # A request after the write does not join the build that predates it
+    fresh = asyncio.create_task(service.get_dashboard("p1", ["profile"]))
+    await asyncio.gather(stale, fresh)
+    assert supabase.calls == ["patient", "patient"]
+
+    stale = asyncio.create_task(service.get_dashboard("p1", ["reports"]))
+    await asyncio.sleep(0.01)
+    service.invalidate("p1")
+    await stale
+    # The stale build was not cached, so the next request reads again
+    await service.get_dashboard("p1", ["reports"])
+    assert supabase.calls.count("reports") == 2
+    await service.get_dashboard("p1", ["reports"])
+    assert supabase.calls.count("reports") == 2
+
+if __name__ == "__main__":
+    asyncio.run(test_dashboard_gathers_sources_concurrently())
+    asyncio.run(test_projection_and_caching())
+    asyncio.run(test_missing_patient_is_not_found())
+    asyncio.run(test_invalidation_during_a_build_is_not_overwritten())
+    print("✅ All patient dashboard tests passed")
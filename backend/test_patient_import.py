@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk patient import: streamed CSV and NDJSON parsing, the
+one-statement insert that skips existing emails, and the bulk endpoint.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+
+import httpx
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SECRET_KEY", "service-key")
+
+from app.services.body_stream import iter_body_lines, iter_csv_records
+from app.services.supabase_service import SupabaseService
+
+CSV = (
+    b'\xef\xbb\xbfname,email,phone\r\n'
+    b'Alice Smith,alice@example.com,555-0100\r\n'
+    b'\r\n'
+    b'"Bob ""Bobby"" Jones","bob@example.com","first line\n\nafter a blank line"\r\n'
+    b'Carol White,,\r\n'
+)
+
+async def chunked(body: bytes, size: int = 7):
+    """Yield a body in small blocks, splitting lines and quoted fields across reads."""
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+async def collect(rows):
+    return [row async for row in rows]
+
+class PatientTable:
+    """Answers the patients upsert like PostgREST with ignore-duplicates on (hospital_id, email)."""
+
+    def __init__(self, existing_emails=()):
+        self.emails = set(existing_emails)
+        self.statements = 0
+
+    def handle(self, request):
+        self.statements += 1
+        created = []
+        for row in json.loads(request.content):
+            if row["email"] and row["email"] in self.emails:
+                continue
+            self.emails.add(row["email"])
+            created.append(row)
+        return httpx.Response(201, json=created)
+
+def make_service(table):
+    os.environ["CATALOG_CACHE_STAMP_DIR"] = tempfile.mkdtemp()
+    service = SupabaseService()
+    service.db.session._transport = httpx.MockTransport(table.handle)
+    return service
+
+async def test_csv_keeps_blank_lines_inside_quoted_fields():
+    rows = await collect(iter_csv_records(chunked(CSV)))
+
+    assert [row["name"] for row in rows] == ["Alice Smith", 'Bob "Bobby" Jones', "Carol White"]
+    assert rows[1]["phone"] == "first line\n\nafter a blank line"
+    assert rows[2] == {"name": "Carol White", "email": "", "phone": ""}
+
+async def test_ndjson_lines_skip_blanks():
+    body = b'{"name": "Alice"}\n\n{"name": "Bob"}\n   \n{"name": "Carol"}'
+    lines = await collect(iter_body_lines(chunked(body)))
+    assert [json.loads(line)["name"] for line in lines] == ["Alice", "Bob", "Carol"]
+
+async def test_import_skips_existing_emails_in_one_statement():
+    table = PatientTable(existing_emails={"bob@example.com"})
+    service = make_service(table)
+
+    created = await service.import_patients([
+        {"name": "Alice", "email": "alice@example.com"},
+        {"name": "Bob", "email": "bob@example.com"},
+        {"name": "Carol"}
+    ])
+
+    assert table.statements == 1
+    assert created[0]["name"] == "Alice" and created[2]["name"] == "Carol"
+    assert created[1] is None
+    await service.close()
+
+def test_bulk_endpoint_reports_each_row():
+    from fastapi.testclient import TestClient
+    from app import main
+
+    table = PatientTable(existing_emails={"bob@example.com"})
+    main.supabase_service.db.session._transport = httpx.MockTransport(table.handle)
+    client = TestClient(main.app)
+
+    csv_response = client.post("/api/patients/bulk", content=CSV, headers={"content-type": "text/csv"})
+    assert csv_response.status_code == 200
+    csv_results = csv_response.json()
+    assert csv_results["total"] == 3 and csv_results["failed"] == 0
+    assert [result["status"] for result in csv_results["results"]] == ["created", "exists", "created"]
+
+    ndjson = b'{"name": "Dan", "email": "dan@example.com"}\n{"email": "no-name@example.com"}\nnot json\n'
+    ndjson_response = client.post("/api/patients/bulk", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    ndjson_results = ndjson_response.json()
+    assert ndjson_results["status"] == "partial"
+    assert ndjson_results["succeeded"] == 1 and ndjson_results["failed"] == 2
+    assert ndjson_results["results"][0]["status"] == "created"
+    assert all("Invalid patient" in result["error"] for result in ndjson_results["results"][1:])
+
+    unsupported = client.post("/api/patients/bulk", content=b"[]", headers={"content-type": "application/json"})
+    assert unsupported.status_code == 415
+
+if __name__ == "__main__":
+    asyncio.run(test_csv_keeps_blank_lines_inside_quoted_fields())
+    asyncio.run(test_ndjson_lines_skip_blanks())
+    asyncio.run(test_import_skips_existing_emails_in_one_statement())
+    test_bulk_endpoint_reports_each_row()
+    print("✅ All patient import tests passed")
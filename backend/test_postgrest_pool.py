@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for the pooled async PostgREST client.
+"""
+
+import asyncio
+
+import httpx
+
+from app.services.postgrest_pool import PooledPostgrestClient
+
+async def test_session_uses_pool_limits_and_timeout_hook():
+    client = PooledPostgrestClient("https://example.supabase.co", "service-key", pool_size=3, statement_timeout_seconds=2.5)
+    try:
+        pool = client.session._transport._pool
+        assert pool._max_connections == 3
+        assert pool._max_keepalive_connections == 3
+        assert client._prefer_statement_timeout in client.session.event_hooks["request"]
+    finally:
+        await client.aclose()
+
+async def test_requests_carry_auth_and_statement_timeout():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(201, json=[{"id": "p1"}])
+
+    client = PooledPostgrestClient("https://example.supabase.co/", "service-key", statement_timeout_seconds=2.5)
+    client.session._transport = httpx.MockTransport(handler)
+    try:
+        result = await client.table("patients").insert({"name": "Asha"}).execute()
+    finally:
+        await client.aclose()
+
+    assert result.data == [{"id": "p1"}]
+    request = seen[0]
+    assert str(request.url) == "https://example.supabase.co/rest/v1/patients"
+    assert request.headers["apikey"] == "service-key"
+    assert request.headers["Authorization"] == "Bearer service-key"
+    prefer = request.headers["Prefer"].split(",")
+    assert "return=representation" in prefer and "timeout=3" in prefer
+
+if __name__ == "__main__":
+    asyncio.run(test_session_uses_pool_limits_and_timeout_hook())
+    asyncio.run(test_requests_carry_auth_and_statement_timeout())
+    print("✅ All PostgREST pool tests passed")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Tests for provider prompt caching, against a local stub of the Messages API
+that reports cache reads and writes the way the real API does.
+"""
+
+import asyncio
+import json
+
+import anthropic
+try:
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+from app.services.ai_service import AIService
+from app.services.context_assembler import ContextAssembler
+from app.services.llm_backends import AnthropicBackend
+
+DOCUMENTS = [
+    {"content": "Redness after a chemical peel is expected for two to three days. " * 20, "distance": 0.1},
+    {"content": "Tretinoin is applied at night to clean, dry skin. " * 20, "distance": 0.2}
+]
+
+class StubMessagesAPI:
+    """Counts every cache_control prefix it has seen as cached, like the provider's prompt cache."""
+
+    def __init__(self):
+        self.cached_prefixes = set()
+        self.requests = []
+
+    def handle(self, request):
+        body = json.loads(request.content)
+        self.requests.append(body)
+        blocks = list(body["system"]) + [block for message in body["messages"] for block in message["content"]]
+
+        prefix = ""
+        read = written = 0
+        seen = 0
+        for block in blocks:
+            prefix += block["text"]
+            if "cache_control" in block:
+                tokens = len(prefix) // 4
+                if prefix in self.cached_prefixes:
+                    read = tokens
+                else:
+                    self.cached_prefixes.add(prefix)
+                    written = tokens
+                seen = tokens
+        written = max(written - read, 0)
+
+        return httpx.Response(200, json={
+            "id": f"msg_{len(self.requests)}",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [{"type": "text", "text": "Keep the skin moisturised."}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": len(prefix) // 4 - seen,
+                "output_tokens": 6,
+                "cache_creation_input_tokens": written,
+                "cache_read_input_tokens": read
+            }
+        })
+
+class StubVectorDB:
+    documents_version = 0
+
+    async def search_documents(self, query):
+        return DOCUMENTS
+
+    async def get_chat_history(self, user_id, session_id):
+        return []
+
+    async def add_chat_message(self, *args):
+        return "message-id"
+
+def make_service(stub):
+    backend = AnthropicBackend(
+        api_key="test",
+        http_client=anthropic.DefaultAsyncHttpxClient(transport=httpx.MockTransport(stub.handle))
+    )
+    return AIService(StubVectorDB(), "", llm_backend=backend)
+
+async def test_stable_prefix_is_marked_cacheable_and_goes_first():
+    stub = StubMessagesAPI()
+    service = make_service(stub)
+
+    await service.chat_with_medical_context("Is redness normal?", "patient-1", "session-1")
+
+    body = stub.requests[0]
+    assert body["system"][0]["cache_control"] == {"type": "ephemeral"}
+    content = body["messages"][0]["content"]
+    assert content[0]["cache_control"] == {"type": "ephemeral"}
+    assert "Redness after a chemical peel" in content[0]["text"]
+    assert "cache_control" not in content[-1]
+    assert content[-1]["text"].endswith("User: Is redness normal?\n\nAssistant:")
+
+async def test_later_turns_read_the_session_prefix_from_cache():
+    stub = StubMessagesAPI()
+    service = make_service(stub)
+
+    first = await service.chat_with_medical_context("Is redness normal?", "patient-1", "session-1")
+    second = await service.chat_with_medical_context("How long does it last?", "patient-1", "session-1")
+
+    assert first["usage"]["cache_creation_input_tokens"] > 0
+    assert first["usage"]["cache_read_input_tokens"] == 0
+    assert second["usage"]["cache_read_input_tokens"] == first["usage"]["cache_creation_input_tokens"]
+    assert second["usage"]["cache_creation_input_tokens"] == 0
+    assert service.llm_usage["requests"] == 2
+
+async def test_patient_details_stay_out_of_the_prompt():
+    stub = StubMessagesAPI()
+    service = make_service(stub)
+
+    await service.chat_with_medical_context(
+        "Is redness normal?", "patient-1", "session-1",
+        patient_context={"name": "Asha Rao", "condition": "Rosacea"}
+    )
+
+    prompt = json.dumps(stub.requests[0])
+    assert "Asha Rao" not in prompt and "Rosacea" not in prompt
+
+def test_pinned_passages_count_against_the_document_budget():
+    service = AIService(StubVectorDB(), "")
+    service.context_assembler = ContextAssembler(document_tokens=300)
+    assembler = service.context_assembler
+
+    first = service._pin_documents("patient-1", "session-1", assembler.assemble(DOCUMENTS[:1], []))
+    assert first["tokens"]["pinned_documents"] > 200
+
+    later_documents = [{"content": "Sunscreen goes on every morning, even indoors. " * 20, "distance": 0.1}]
+    later = service._pin_documents("patient-1", "session-1", assembler.assemble(DOCUMENTS[:1] + later_documents, []))
+    assert later["pinned_documents"] == first["pinned_documents"]
+    assert later["tokens"]["documents"] <= assembler.document_tokens
+    assert all(assembler.count_tokens(passage) < 100 for passage in later["documents"])
+
+if __name__ == "__main__":
+    asyncio.run(test_stable_prefix_is_marked_cacheable_and_goes_first())
+    asyncio.run(test_later_turns_read_the_session_prefix_from_cache())
+    asyncio.run(test_patient_details_stay_out_of_the_prompt())
+    test_pinned_passages_count_against_the_document_budget()
+    print("✅ All prompt caching tests passed")
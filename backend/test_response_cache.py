@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for the semantic chat response cache.
+"""
+
+import os
+import tempfile
+
+from app.services.ai_service import AIService
+from app.services.response_cache import SemanticResponseCache, SHARED_SCOPE
+from app.services import version_stamp
+from app.services.version_stamp import VersionStamp
+
+TRETINOIN = [0.9, 0.1, 0.0]
+TRETINOIN_REWORDED = [0.88, 0.12, 0.01]
+PEEL = [0.0, 0.2, 0.9]
+
+def store(cache, embedding, scope=SHARED_SCOPE, version=0, response="Apply a pea-sized amount at night."):
+    return cache.store("how do I apply tretinoin", embedding, scope, version, response, [], llm_ms=1200.0)
+
+def test_similar_question_hits_and_different_question_misses():
+    cache = SemanticResponseCache(similarity_threshold=0.95)
+    store(cache, TRETINOIN)
+
+    hit = cache.lookup("how should tretinoin be applied", TRETINOIN_REWORDED, SHARED_SCOPE, 0)
+    assert hit["response"] == "Apply a pea-sized amount at night."
+    assert cache.lookup("is redness normal after a peel", PEEL, SHARED_SCOPE, 0) is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["hit_ratio"] == 0.5
+    assert stats["saved_llm_ms"] == 1200.0
+
+def test_user_scoped_replies_are_not_shared():
+    cache = SemanticResponseCache(similarity_threshold=0.95)
+    store(cache, TRETINOIN, scope="user:alice", response="Alice, use it on your chin only.")
+
+    assert cache.lookup("how do I apply tretinoin", TRETINOIN, SHARED_SCOPE, 0) is None
+    assert cache.lookup("how do I apply tretinoin", TRETINOIN, "user:bob", 0) is None
+    assert cache.lookup("how do I apply tretinoin", TRETINOIN, "user:alice", 0) is not None
+    # Audit records for user-scoped hits never include the question text
+    assert cache.get_audit()[0]["query"] is None
+
+def test_document_changes_invalidate_entries():
+    cache = SemanticResponseCache(similarity_threshold=0.95)
+    store(cache, TRETINOIN, version=3)
+
+    assert cache.lookup("how do I apply tretinoin", TRETINOIN, SHARED_SCOPE, 4) is None
+    # A reply answered against the old documents is not cached after the change
+    assert store(cache, TRETINOIN, version=3) is None
+    assert cache.get_stats()["invalidations"] == 1
+
+def test_false_hit_report_evicts_entry():
+    cache = SemanticResponseCache(similarity_threshold=0.95)
+    entry_id = store(cache, TRETINOIN)
+
+    assert cache.report_false_hit(entry_id)
+    assert cache.lookup("how do I apply tretinoin", TRETINOIN, SHARED_SCOPE, 0) is None
+    assert cache.get_stats()["false_hits"] == 1
+    assert not cache.report_false_hit(entry_id)
+
+def test_patient_documents_keep_replies_per_user():
+    service = AIService(None, "")
+    general = {"content": "Tretinoin is applied at night.", "metadata": {"document_type": "guide"}}
+    patient = {"content": "Alice's biopsy was benign.", "metadata": {"patient_id": "alice"}}
+
+    def scope(documents):
+        return service._response_cache_scope("bob", None, {"patient_context": None, "history": [], "documents": documents})
+
+    assert scope([general]) == SHARED_SCOPE
+    assert scope([general, patient]) == "user:bob"
+
+def test_documents_version_is_shared_across_workers():
+    with tempfile.TemporaryDirectory() as stamp_dir:
+        path = os.path.join(stamp_dir, "documents.stamp")
+        # Two stamps on one path behave like two uvicorn workers
+        worker_a, worker_b = VersionStamp(path), VersionStamp(path)
+        assert worker_b.current() == 0
+
+        version = worker_a.bump()
+        assert worker_b.current() == version
+        assert worker_b.bump() > version
+
+        # Unchanged stamps are served from memory after a stat, without reopening the file
+        worker_b.current()
+        opened = []
+        version_stamp.open = lambda *args, **kwargs: opened.append(args) or open(*args, **kwargs)
+        try:
+            for _ in range(10):
+                assert worker_b.current() == worker_b.current()
+            assert opened == []
+        finally:
+            del version_stamp.open
+
+        cache = SemanticResponseCache(similarity_threshold=0.95)
+        store(cache, TRETINOIN, version=worker_b.current())
+        worker_a.bump()
+        assert cache.lookup("how do I apply tretinoin", TRETINOIN, SHARED_SCOPE, worker_b.current()) is None
+
+if __name__ == "__main__":
+    test_similar_question_hits_and_different_question_misses()
+    test_user_scoped_replies_are_not_shared()
+    test_document_changes_invalidate_entries()
+    test_false_hit_report_evicts_entry()
+    test_patient_documents_keep_replies_per_user()
+    test_documents_version_is_shared_across_workers()
+    print("✅ All response cache tests passed")
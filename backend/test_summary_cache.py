@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for memoized treatment-plan summaries.
+"""
+
+import asyncio
+
+from app.services.summary_cache import SummaryCache, plan_hash
+
+PLAN = {
+    "diagnosis": "Mild acne vulgaris",
+    "selectedTreatments": [{"id": "t1", "name": "Chemical peel"}, {"id": "t2", "name": "Blue light therapy"}],
+    "selectedMedicines": [{"id": "m1", "name": "Tretinoin 0.025%"}],
+    "next_appointment": "2024-07-01",
+    "additional_notes": "Use sunscreen daily."
+}
+
+def test_plan_hash_ignores_order_whitespace_and_ui_fields():
+    reordered = {
+        **PLAN,
+        "diagnosis": "  Mild   acne vulgaris ",
+        "selectedTreatments": list(reversed(PLAN["selectedTreatments"])),
+        "selectedMedicines": [{"id": "m1", "name": "Tretinoin 0.025%", "expanded": True}],
+        "activeTab": "summary"
+    }
+
+    assert plan_hash(reordered) == plan_hash(PLAN)
+    assert plan_hash({**PLAN, "additional_notes": "Avoid sunscreen."}) != plan_hash(PLAN)
+
+async def test_concurrent_requests_share_one_generation():
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "Your plan: a chemical peel and blue light therapy."
+
+    cache = SummaryCache()
+    summaries = await asyncio.gather(*[cache.get_or_create(PLAN, generate) for _ in range(10)])
+
+    assert len(calls) == 1
+    assert set(summaries) == {"Your plan: a chemical peel and blue light therapy."}
+    assert await cache.get_or_create(PLAN, generate) == summaries[0]
+    assert len(calls) == 1
+
+async def test_persisted_summary_is_used_before_generating():
+    saved = {plan_hash(PLAN): "Saved summary"}
+
+    async def load_persisted(key):
+        return saved.get(key)
+
+    async def generate():
+        raise AssertionError("should not generate when a saved summary exists")
+
+    cache = SummaryCache(load_persisted=load_persisted)
+
+    assert await cache.get_or_create(PLAN, generate) == "Saved summary"
+    assert cache.get_stats()["persisted_hits"] == 1
+
+async def test_failed_generation_is_not_cached():
+    async def failing():
+        raise RuntimeError("API unavailable")
+
+    async def generate():
+        return "Fresh summary"
+
+    cache = SummaryCache()
+    try:
+        await cache.get_or_create(PLAN, failing)
+    except RuntimeError:
+        pass
+
+    assert await cache.get_or_create(PLAN, generate) == "Fresh summary"
+
+async def test_only_generated_summaries_are_persisted():
+    saved = {}
+
+    async def load_persisted(key):
+        return saved.get(key)
+
+    async def save_persisted(key, summary):
+        saved[key] = summary
+
+    async def failing():
+        raise RuntimeError("API unavailable")
+
+    async def generate():
+        return "Generated summary"
+
+    cache = SummaryCache(load_persisted=load_persisted, save_persisted=save_persisted)
+    try:
+        await cache.get_or_create(PLAN, failing)
+    except RuntimeError:
+        pass
+    assert saved == {}
+
+    assert await cache.get_or_create(PLAN, generate) == "Generated summary"
+    assert saved == {plan_hash(PLAN): "Generated summary"}
+
+    # Another worker finds it in the persisted tier without generating
+    other_worker = SummaryCache(load_persisted=load_persisted, save_persisted=save_persisted)
+    assert await other_worker.get_or_create(PLAN, failing) == "Generated summary"
+
+if __name__ == "__main__":
+    test_plan_hash_ignores_order_whitespace_and_ui_fields()
+    asyncio.run(test_concurrent_requests_share_one_generation())
+    asyncio.run(test_persisted_summary_is_used_before_generating())
+    asyncio.run(test_failed_generation_is_not_cached())
+    asyncio.run(test_only_generated_summaries_are_persisted())
+    print("✅ All summary cache tests passed")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for token-aware document chunking and chunk reassembly.
+"""
+
+from app.services.text_chunker import TextChunker, merge_chunks
+
+REPORT = " ".join(
+    f"Visit {i}: mild erythema on the left cheek, continue hydrocortisone 1% cream twice daily."
+    for i in range(200)
+)
+
+def as_stored(chunks):
+    """Shape chunks like rows read back from the vector database."""
+    return [
+        {
+            "content": chunk["text"],
+            "metadata": {
+                "chunk_index": chunk["index"],
+                "start_char": chunk["start_char"],
+                "end_char": chunk["end_char"],
+                "separator": chunk["separator"]
+            }
+        }
+        for chunk in chunks
+    ]
+
+def test_chunks_respect_token_budget_and_overlap():
+    chunker = TextChunker(chunk_tokens=64, overlap_tokens=16)
+    chunks = chunker.chunk(REPORT)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["token_count"] <= 64
+        assert REPORT[chunk["start_char"]:chunk["end_char"]] == chunk["text"]
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current["start_char"] < previous["end_char"]
+
+def test_streamed_pieces_match_whole_text():
+    chunker = TextChunker(chunk_tokens=64, overlap_tokens=16)
+    pieces = [REPORT[i:i + 97] for i in range(0, len(REPORT), 97)]
+
+    streamed = list(chunker.iter_chunks(pieces))
+
+    assert [chunk["text"] for chunk in streamed] == [chunk["text"] for chunk in chunker.chunk(REPORT)]
+
+def test_merge_chunks_rebuilds_document():
+    chunks = TextChunker(chunk_tokens=64, overlap_tokens=16).chunk(REPORT)
+
+    assert merge_chunks(list(reversed(as_stored(chunks)))) == REPORT
+
+def test_merge_keeps_line_breaks_between_chunks():
+    paragraphs = "\n\n".join(
+        f"Visit {i}:\n- mild erythema on the left cheek\n- continue hydrocortisone 1% cream"
+        for i in range(40)
+    )
+    chunker = TextChunker(chunk_tokens=20, overlap_tokens=0)
+    chunks = chunker.chunk(paragraphs)
+    streamed = list(chunker.iter_chunks([paragraphs[i:i + 13] for i in range(0, len(paragraphs), 13)]))
+
+    assert any("\n" in chunk["separator"] for chunk in chunks)
+    assert merge_chunks(as_stored(chunks)) == paragraphs
+    assert merge_chunks(as_stored(streamed)) == paragraphs
+
+def test_short_and_empty_text():
+    chunker = TextChunker(chunk_tokens=64, overlap_tokens=16)
+
+    assert chunker.chunk("") == []
+    assert [chunk["text"] for chunk in chunker.chunk("  itchy rash  ")] == ["itchy rash"]
+
+if __name__ == "__main__":
+    test_chunks_respect_token_budget_and_overlap()
+    test_streamed_pieces_match_whole_text()
+    test_merge_chunks_rebuilds_document()
+    test_merge_keeps_line_breaks_between_chunks()
+    test_short_and_empty_text()
+    print("✅ All chunking tests passed")
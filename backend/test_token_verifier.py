@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for cached access token verification.
+"""
+
+import asyncio
+import base64
+import json
+import time
+
+import jwt
+
+from app.services.token_verifier import TokenVerifier
+
+SECRET = "test-jwt-secret-with-enough-length-for-hs256"
+
+def make_token(sub="patient-1", expires_in=3600, secret=SECRET, audience="authenticated"):
+    return jwt.encode({"sub": sub, "aud": audience, "exp": int(time.time() + expires_in)}, secret, algorithm="HS256")
+
+async def test_claims_are_cached_per_token():
+    verifier = TokenVerifier(jwt_secret=SECRET)
+    token = make_token()
+
+    claims = await asyncio.gather(*[verifier.verify(token) for _ in range(50)])
+
+    assert all(claim["sub"] == "patient-1" for claim in claims)
+    assert verifier.verifications == 1
+    await verifier.verify(make_token(sub="patient-2"))
+    assert verifier.verifications == 2
+
+async def test_invalid_tokens_are_rejected():
+    verifier = TokenVerifier(jwt_secret=SECRET, leeway_seconds=0)
+    for token in [
+        make_token(secret="some-other-secret-that-is-also-long-enough"),
+        make_token(expires_in=-10),
+        make_token(audience="anon"),
+        jwt.encode({"sub": "patient-1"}, SECRET, algorithm="HS256"),
+        jwt.encode({"sub": "patient-1", "exp": int(time.time() + 60)}, None, algorithm="none"),
+        "not-a-token"
+    ]:
+        try:
+            await verifier.verify(token)
+            assert False, f"expected {token!r} to be rejected"
+        except jwt.PyJWTError:
+            pass
+    assert verifier.verifications == 0
+
+async def test_cached_claims_expire_with_the_token():
+    verifier = TokenVerifier(jwt_secret=SECRET, leeway_seconds=0)
+    token = make_token(expires_in=1)
+
+    await verifier.verify(token)
+    await asyncio.sleep(1.1)
+    try:
+        await verifier.verify(token)
+        assert False, "expected the expired token to be rejected"
+    except jwt.ExpiredSignatureError:
+        pass
+
+def test_configuration_errors_fail_at_startup():
+    for kwargs in ({}, {"jwks_url": "/auth/v1/.well-known/jwks.json"}):
+        try:
+            TokenVerifier(**kwargs)
+            assert False, f"expected {kwargs!r} to be rejected"
+        except ValueError:
+            pass
+
+async def test_unreachable_keys_are_told_apart_from_bad_tokens():
+    def segment(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    # Nothing listens on the discard port, so the key fetch fails
+    verifier = TokenVerifier(jwks_url="http://127.0.0.1:9/auth/v1/.well-known/jwks.json")
+    token = f"{segment({'alg': 'RS256', 'kid': 'key-1'})}.{segment({'sub': 'patient-1', 'exp': int(time.time() + 60)})}.c2ln"
+    try:
+        await verifier.verify(token)
+        assert False, "expected the key fetch to fail"
+    except jwt.PyJWKClientError:
+        pass
+    assert verifier.verifications == 0
+
+if __name__ == "__main__":
+    asyncio.run(test_claims_are_cached_per_token())
+    asyncio.run(test_invalid_tokens_are_rejected())
+    asyncio.run(test_cached_claims_expire_with_the_token())
+    test_configuration_errors_fail_at_startup()
+    asyncio.run(test_unreachable_keys_are_told_apart_from_bad_tokens())
+    print("✅ All token verifier tests passed")